@@ -1,76 +1,32 @@
 import os
 import sys
-import math
 import json
-import pretty_midi
+import time
+import threading
+import math
+import multiprocessing
+from collections import OrderedDict
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QGridLayout, QLabel, QLineEdit, 
                              QPushButton, QCheckBox, QComboBox, QTextEdit, 
-                             QFileDialog, QMessageBox, QScrollArea, QFrame, QInputDialog,
-                             QSplitter, QTreeWidget, QTreeWidgetItem) 
-from PyQt6.QtCore import Qt, QPointF, QRectF
-from PyQt6.QtGui import QPalette, QColor, QPainter, QPen, QBrush, QPainterPath
-
-EffDict = {
-    "座標": [["X", 0.0], ["Y", 0.0], ["Z", 0.0]],
-    "拡大率": [["拡大率", 100.00], ["X", 100.00], ["Y", 100.00]],
-}
-
-XDict = {
-    "移動無し": "",
-    "直線移動": "直線移動",
-    "直線移動(時間制御)": "直線移動(時間制御)",
-    "補間移動": "補間移動",
-    "補間移動(時間制御)": "補間移動(時間制御)",
-}
-
-PLAY_SPEED_STEPS = (
-    float(100.0 * 0.5),
-    float(math.floor(100.0 * (2.0 / 3.0))),  
-    float(100.0 * 1.0),
-    float(100.0 * 2.0),
-    float(100.0 * 4.0),
-    float(100.0 * 8.0),
-)
-
-FRAME_SPEED_OVERRIDES = {
-    72: 66.0,  
-    96: 100.0, 
-}
-
-def _parse_midi(path):
-    midi = pretty_midi.PrettyMIDI(path)
-
-    items = []
-    track_names = []
-
-    for idx, inst in enumerate(midi.instruments, 1):
-        name = inst.name.strip() if inst.name else f"Track {idx}"
-        track_names.append(name)
-        seen = set()
-        for note in inst.notes:
-            if note.end <= note.start:
-                continue
-            s_tick = int(round(midi.time_to_tick(note.start)))
-            e_tick = int(round(midi.time_to_tick(note.end)))
-            if e_tick <= s_tick:
-                e_tick = s_tick + 1
-            key = (s_tick, e_tick)
-            if key in seen:
-                continue
-            seen.add(key)
-            s = float(midi.tick_to_time(s_tick))
-            e = float(midi.tick_to_time(e_tick))
-            items.append({
-                "pos": s,
-                "length": e - s,
-                "track": idx
-            })
-
-    if not track_names:
-        track_names = ["Track 1"]
-
-    return items, track_names
+                             QFileDialog, QMessageBox, QScrollArea, QFrame,
+                             QSplitter, QTreeView, QProgressBar) 
+from PyQt6.QtCore import (Qt, QPointF, QRectF, QObject, QThread, QTimer, QFileSystemWatcher, pyqtSignal,
+                          QAbstractItemModel, QModelIndex)
+from PyQt6.QtGui import QPalette, QColor, QPainter, QPen, QPainterPath, QPixmap, QImage
+from rpp_core import (EffDict, XDict, PLAY_SPEED_STEPS, BAKE_MAX_KEYS, ConvertError, ConvertCancelled, is_midi_path,
+                      load_language, open_project, project_is_current, normalize_settings, convert, preview_frames,
+                      StageTimer, profile_to, profile_requested, append_run_log, format_timings)
+from rpp_cache import ParseCache, DEFAULT_CACHE_MB
+
+# REAPERの保存は一時ファイルへの書き込みと置き換えが続けて起きるので、静かになるまで待ってから出力する
+WATCH_DEBOUNCE_MS = 700
+
+# プレビューのタイル幅(ピクセル)と保持するタイル数
+PREVIEW_TILE_W = 256
+PREVIEW_TILE_CACHE = 256
+# 1オブジェクトあたりこのピクセル数より詰まったら、重なり数の濃淡で描く
+PREVIEW_LOD_PX = 4
 
 class BezierCanvas(QWidget):
     def __init__(self, parent=None):
@@ -86,6 +42,10 @@ class BezierCanvas(QWidget):
         y2 = int(round(self.p2.y()))
         self.bezier_str = f"0|0,{x1},{y2},0"
 
+    def curve(self):
+        # 焼き込み用に、丸めていない両方の制御点 (x1, y1, x2, y2)
+        return [self.p1.x(), self.p1.y(), self.p2.x(), self.p2.y()]
+
     def get_draw_rect(self):
         side = min(self.width(), self.height()) - 60
         left = (self.width() - side) / 2
@@ -156,6 +116,480 @@ class BezierCanvas(QWidget):
     def mouseReleaseEvent(self, event):
         self.active_point = None
 
+class TimelinePreview(QWidget):
+    """計算済みのオブジェクトをレイヤー×フレームのタイムラインに描く。
+    レイヤー毎に開始順の配列と終了フレームの累積最大を持ち、表示範囲に入るものだけを二分探索で取り出す。
+    1ピクセルに何個も入る倍率では、ピクセル幅の区間ごとの重なり数(倍率ごとにキャッシュ)を濃淡で描く。
+    レイヤーが高さのピクセル数より多ければ隣り合うレイヤーをまとめて1行にする。
+    描いた結果は幅 PREVIEW_TILE_W の画像として倍率・位置ごとに使い回す"""
+
+    BACKGROUND = (35, 35, 35)
+    VARIANT_COLORS = ((100, 180, 255), (255, 170, 90), (130, 220, 130), (230, 120, 230))
+    TC_COLOR = (200, 200, 80)
+    # 重なり数 1, 2, 3, 4以上 の濃さ
+    DENSITY_ALPHA = (0.45, 0.65, 0.85, 1.0)
+    MIN_ZOOM = -3
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setMinimumSize(280, 280)
+        self.lanes = []
+        self.n_frames = 0
+        self.zoom = 0
+        self.offset = 0.0
+        self.tiles = OrderedDict()
+        self.rows_cache = {}
+        self.coverage = {}
+        self.drag_x = None
+        # numpy は起動時に読み込まないよう、最初に描くときに用意する
+        self.palette_rgb = None
+
+    @classmethod
+    def _rgb(cls, color, alpha=1.0):
+        r, g, b = (int(round(c * alpha + bg * (1.0 - alpha))) for c, bg in zip(color, cls.BACKGROUND))
+        return 0xFF000000 | (r << 16) | (g << 8) | b
+
+    def _palette(self):
+        # 行の種類(反転の段階 0〜3, 時間制御 4)ごとの、そのままの色と重なり数による濃淡
+        import numpy as np
+
+        bases = self.VARIANT_COLORS + (self.TC_COLOR,)
+        solid = np.array([self._rgb(c) for c in bases], dtype=np.uint32)
+        density = np.array([[self._rgb(c, a) for a in (0.0,) + self.DENSITY_ALPHA] for c in bases], dtype=np.uint32)
+        return solid, density
+
+    def set_frames(self, frames, time_control):
+        # 行はオブジェクトのあるレイヤーだけ。時間制御は本体の1つ上のレイヤーに置かれる
+        import numpy as np
+
+        layer = frames["layer"].astype(np.int64)
+        main = layer * 2 if time_control else layer
+        n = len(main)
+        start = frames["start"]
+        end = frames["end"]
+        kind = frames["variant"].astype(np.int64) % 4
+        if time_control:
+            main = np.concatenate((main, main - 1))
+            start = np.concatenate((start, start))
+            end = np.concatenate((end, end))
+            kind = np.concatenate((kind, np.full(n, 4, dtype=np.int64)))
+
+        order = np.lexsort((start, main))
+        lane = main[order]
+        self.lanes = []
+        if len(lane):
+            bounds = np.flatnonzero(np.diff(lane)) + 1
+            for a, b in zip(np.r_[0, bounds].tolist(), np.r_[bounds, len(lane)].tolist()):
+                idx = order[a:b]
+                self.lanes.append(self._row(start[idx], end[idx], kind[idx]))
+        self.n_frames = int(end.max()) + 1 if len(end) else 0
+        self._clear_cache()
+        self.fit()
+
+    @staticmethod
+    def _row(starts, ends, kinds):
+        import numpy as np
+
+        return {"starts": starts, "ends": ends, "max_end": np.maximum.accumulate(ends), "kinds": kinds}
+
+    def clear(self):
+        self.lanes = []
+        self.n_frames = 0
+        self._clear_cache()
+        self.update()
+
+    def fit(self):
+        fpp = max(self.n_frames, 1) / max(self.width(), 1)
+        self.zoom = max(self.MIN_ZOOM, int(math.ceil(math.log2(max(fpp, 2.0 ** self.MIN_ZOOM)))))
+        self.offset = 0.0
+        self.update()
+
+    def _clear_cache(self):
+        self.tiles.clear()
+        self.rows_cache.clear()
+        self.coverage.clear()
+
+    def _fpp(self, zoom=None):
+        return 2.0 ** (self.zoom if zoom is None else zoom)
+
+    def _rows(self, height):
+        # 高さに収まらないときは、隣り合うレイヤーを group 個ずつ1行にまとめる
+        import numpy as np
+
+        rows = self.rows_cache.get(height)
+        if rows is None:
+            group = max(1, -(-len(self.lanes) // max(height, 1)))
+            if group == 1:
+                rows = self.lanes
+            else:
+                rows = []
+                for k in range(0, len(self.lanes), group):
+                    part = self.lanes[k:k + group]
+                    starts = np.concatenate([r["starts"] for r in part])
+                    order = np.argsort(starts, kind="stable")
+                    rows.append(self._row(starts[order], np.concatenate([r["ends"] for r in part])[order],
+                                          np.concatenate([r["kinds"] for r in part])[order]))
+            self.rows_cache[height] = rows
+        return rows
+
+    def _coverage(self, height, r, zoom):
+        # ピクセル幅の区間ごとに、その区間にかかっているオブジェクトの数
+        import numpy as np
+
+        key = (height, r, zoom)
+        cov = self.coverage.get(key)
+        if cov is None:
+            row = self._rows(height)[r]
+            fpp = self._fpp(zoom)
+            s_bin = (row["starts"] / fpp).astype(np.int64)
+            e_bin = (row["ends"] / fpp).astype(np.int64) + 1
+            n = int(e_bin.max()) + 1
+            cov = np.cumsum(np.bincount(s_bin, minlength=n) - np.bincount(e_bin, minlength=n))
+            self.coverage[key] = cov
+        return cov
+
+    def _tile(self, zoom, tx, height):
+        key = (zoom, tx, height)
+        tile = self.tiles.get(key)
+        if tile is not None:
+            self.tiles.move_to_end(key)
+            return tile
+        tile = self._render_tile(zoom, tx, height)
+        self.tiles[key] = tile
+        if len(self.tiles) > PREVIEW_TILE_CACHE:
+            self.tiles.popitem(last=False)
+        return tile
+
+    def _render_tile(self, zoom, tx, height):
+        import numpy as np
+
+        tw = PREVIEW_TILE_W
+        fpp = self._fpp(zoom)
+        f0 = tx * tw * fpp
+        f1 = f0 + tw * fpp
+        if self.palette_rgb is None:
+            self.palette_rgb = self._palette()
+        solid, density = self.palette_rgb
+        img = np.full((height, tw), self._rgb(self.BACKGROUND), dtype=np.uint32)
+        rows = self._rows(height)
+        rh = height / max(len(rows), 1)
+        gap = 1 if rh >= 3 else 0
+        for r, row in enumerate(rows):
+            lo = int(np.searchsorted(row["max_end"], f0, "left"))
+            hi = int(np.searchsorted(row["starts"], f1, "left"))
+            if hi <= lo:
+                continue
+            y0 = int(r * rh)
+            y1 = max(y0 + 1, int((r + 1) * rh) - gap)
+            if hi - lo > tw // PREVIEW_LOD_PX:
+                # 詰まりすぎている行は重なり数の濃淡だけを描く
+                seg = self._coverage(height, r, zoom)[tx * tw:(tx + 1) * tw]
+                level = np.minimum(seg, len(self.DENSITY_ALPHA))
+                img[y0:y1, :len(seg)] = density[int(row["kinds"][lo])][level]
+                continue
+            for s, e, k in zip(row["starts"][lo:hi].tolist(), row["ends"][lo:hi].tolist(),
+                               row["kinds"][lo:hi].tolist()):
+                if e < f0:
+                    continue
+                x0 = max(0, int((s - f0) / fpp))
+                x1 = min(tw, max(x0 + 1, int((e + 1 - f0) / fpp)))
+                img[y0:y1, x0:x1] = solid[k]
+        image = QImage(img.data, tw, height, tw * 4, QImage.Format.Format_RGB32)
+        return QPixmap.fromImage(image)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor(*self.BACKGROUND))
+        if self.lanes:
+            tw = PREVIEW_TILE_W
+            left = self.offset / self._fpp()
+            tx = int(left // tw)
+            while tx * tw - left < self.width():
+                painter.drawPixmap(QPointF(tx * tw - left, 0), self._tile(self.zoom, tx, self.height()))
+                tx += 1
+        painter.setPen(QPen(QColor(80, 80, 80), 1))
+        painter.drawRect(self.rect().adjusted(0, 0, -1, -1))
+
+    def wheelEvent(self, event):
+        if not self.lanes:
+            return
+        step = 1 if event.angleDelta().y() < 0 else -1
+        max_zoom = int(math.ceil(math.log2(max(self.n_frames, 1)))) + 1
+        zoom = max(self.MIN_ZOOM, min(max_zoom, self.zoom + step))
+        if zoom == self.zoom:
+            return
+        # カーソル位置のフレームが動かないように拡大・縮小する
+        x = event.position().x()
+        frame = self.offset + x * self._fpp()
+        self.zoom = zoom
+        self.offset = max(0.0, frame - round(x) * self._fpp())
+        self.update()
+
+    def mousePressEvent(self, event):
+        self.drag_x = event.position().x()
+
+    def mouseMoveEvent(self, event):
+        if self.drag_x is None:
+            return
+        x = event.position().x()
+        dx = round(x - self.drag_x)
+        # タイルの継ぎ目がずれないよう、位置はピクセル単位で動かす
+        self.offset = max(0.0, self.offset - dx * self._fpp())
+        self.drag_x += dx
+        self.update()
+
+    def mouseReleaseEvent(self, event):
+        self.drag_x = None
+
+    def mouseDoubleClickEvent(self, event):
+        self.fit()
+
+class _Worker(QObject):
+    """QThread 上で動かす処理の共通部分(進捗・完了・失敗・中止の通知と中止の要求)"""
+    progress = pyqtSignal(str, int, int)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(object)
+    cancelled = pyqtSignal()
+
+    def __init__(self):
+        super().__init__()
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def _on_progress(self, stage, done, total):
+        self.progress.emit(stage, done, total)
+
+
+class ProjectWorker(_Worker):
+    """選んだファイルを開く。MIDIは解析まで、RPPはトラックの索引作りまでを行う"""
+
+    def __init__(self, path, cache):
+        super().__init__()
+        self.path = path
+        self.cache = cache
+
+    def run(self):
+        try:
+            project = open_project(self.path, self.cache, self._on_progress, self.cancel_event)
+            self.finished.emit(project)
+        except ConvertCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.failed.emit(e)
+
+
+class ConvertWorker(_Worker):
+    def __init__(self, cfg, project, cache, profile_path=None, preview=False):
+        super().__init__()
+        self.cfg = cfg
+        self.project = project
+        self.cache = cache
+        self.profile_path = profile_path
+        self.preview = preview
+
+    def run(self):
+        try:
+            path = self.cfg.input
+            project = self.project
+            timer = StageTimer()
+            # cProfileはスレッドごとなので、ワーカースレッドの中で開始する
+            with profile_to(self.profile_path):
+                if not project_is_current(project, path, self.cfg.midi_notes):
+                    with timer.stage("parse"):
+                        project = open_project(path, self.cache, self._on_progress, self.cancel_event,
+                                               self.cfg.midi_notes)
+                run = preview_frames if self.preview else convert
+                result = run(self.cfg, items=project["items"], cache=self.cache,
+                             progress=self._on_progress, cancel=self.cancel_event, timer=timer,
+                             index=project["index"])
+            result["project"] = project
+            result["profile"] = self.profile_path
+            self.finished.emit(result)
+        except ConvertCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.failed.emit(e)
+
+class TrackListModel(QAbstractItemModel):
+    """「全トラック」の下にトラックを並べるチェック付きの一覧。
+    チェック状態はトラック数分のbool配列で持ち、行は表示される分だけ少しずつ作る。
+    全選択・全解除はdataChangedを1回出すだけにする"""
+
+    FETCH_ROWS = 256
+    _ROOT = 0
+    _TRACK = 1
+
+    def __init__(self, root_label, parent=None):
+        super().__init__(parent)
+        self.root_label = root_label
+        self.names = []
+        self.is_midi = False
+        # トラックを読み込むまでは空のまま(numpy は起動時に読み込まない)
+        self.checked = ()
+        self.visible = ()
+        self.loaded = 0
+        self.filter_text = ""
+        self.n_visible_checked = 0
+
+    def set_tracks(self, names, is_midi, checked=None):
+        # checked: トラック番号→bool。無い番号はチェックする
+        import numpy as np
+
+        self.beginResetModel()
+        self.names = list(names)
+        self.is_midi = is_midi
+        self.checked = np.ones(len(self.names), dtype=bool)
+        if checked is not None:
+            for idx, on in checked.items():
+                if 1 <= idx <= len(self.names):
+                    self.checked[idx - 1] = on
+        self._apply_filter()
+        self.endResetModel()
+
+    def clear(self):
+        self.set_tracks([], False)
+
+    def set_filter(self, text):
+        self.beginResetModel()
+        self.filter_text = text.strip().casefold()
+        self._apply_filter()
+        self.endResetModel()
+
+    def _apply_filter(self):
+        import numpy as np
+
+        if self.filter_text:
+            key = self.filter_text
+            self.visible = np.array([i for i, name in enumerate(self.names) if key in name.casefold()], dtype=np.int64)
+        else:
+            self.visible = np.arange(len(self.names))
+        self.loaded = min(self.FETCH_ROWS, len(self.visible))
+        self._count_checked()
+
+    def _count_checked(self):
+        import numpy as np
+
+        self.n_visible_checked = int(np.count_nonzero(self.checked[self.visible]))
+
+    def set_root_label(self, text):
+        self.root_label = text
+        root = self.root_index()
+        self.dataChanged.emit(root, root, [Qt.ItemDataRole.DisplayRole])
+
+    def set_all(self, on):
+        # 絞り込み中は表示されているトラックだけを切り替える
+        if not len(self.visible):
+            return
+        self.checked[self.visible] = on
+        self._count_checked()
+        root = self.root_index()
+        if self.loaded:
+            self.dataChanged.emit(self.index(0, 0, root), self.index(self.loaded - 1, 0, root),
+                                  [Qt.ItemDataRole.CheckStateRole])
+        self.dataChanged.emit(root, root, [Qt.ItemDataRole.CheckStateRole])
+
+    def selection(self):
+        # 出力に渡すトラック番号の集合。全部選ばれていれば None(絞り込みなし)
+        import numpy as np
+
+        if len(self.checked) and self.checked.all():
+            return None
+        return frozenset((np.flatnonzero(self.checked) + 1).tolist())
+
+    def track_checks(self):
+        if not len(self.checked):
+            return {}
+        return {idx: bool(on) for idx, on in enumerate(self.checked.tolist(), 1)}
+
+    def root_index(self):
+        return self.createIndex(0, 0, self._ROOT)
+
+    def _label(self, track):
+        idx = track + 1
+        name = self.names[track]
+        if self.is_midi:
+            return f"{idx:02} MIDI \"{name}\""
+        return f"{idx:02} ┣ \"{name}\""
+
+    def index(self, row, column, parent=QModelIndex()):
+        if column != 0:
+            return QModelIndex()
+        if not parent.isValid():
+            return self.createIndex(row, 0, self._ROOT) if row == 0 else QModelIndex()
+        if parent.internalId() == self._ROOT and 0 <= row < self.loaded:
+            return self.createIndex(row, 0, self._TRACK)
+        return QModelIndex()
+
+    def parent(self, index):
+        if index.isValid() and index.internalId() == self._TRACK:
+            return self.root_index()
+        return QModelIndex()
+
+    def rowCount(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return 1
+        if parent.internalId() == self._ROOT:
+            return self.loaded
+        return 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return 1
+
+    def hasChildren(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return True
+        return parent.internalId() == self._ROOT and len(self.visible) > 0
+
+    def canFetchMore(self, parent):
+        return parent.isValid() and parent.internalId() == self._ROOT and self.loaded < len(self.visible)
+
+    def fetchMore(self, parent):
+        n = min(self.loaded + self.FETCH_ROWS, len(self.visible))
+        self.beginInsertRows(parent, self.loaded, n - 1)
+        self.loaded = n
+        self.endInsertRows()
+
+    def flags(self, index):
+        return Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsUserCheckable
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if index.internalId() == self._ROOT:
+            if role == Qt.ItemDataRole.DisplayRole:
+                return self.root_label
+            if role == Qt.ItemDataRole.CheckStateRole:
+                if self.n_visible_checked == 0:
+                    return Qt.CheckState.Unchecked
+                if self.n_visible_checked == len(self.visible):
+                    return Qt.CheckState.Checked
+                return Qt.CheckState.PartiallyChecked
+            return None
+        track = int(self.visible[index.row()])
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self._label(track)
+        if role == Qt.ItemDataRole.CheckStateRole:
+            return Qt.CheckState.Checked if self.checked[track] else Qt.CheckState.Unchecked
+        if role == Qt.ItemDataRole.UserRole:
+            return track + 1
+        return None
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if not index.isValid() or role != Qt.ItemDataRole.CheckStateRole:
+            return False
+        on = Qt.CheckState(value) == Qt.CheckState.Checked
+        if index.internalId() == self._ROOT:
+            self.set_all(on)
+            return True
+        self.checked[int(self.visible[index.row()])] = on
+        self._count_checked()
+        root = self.root_index()
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.CheckStateRole])
+        self.dataChanged.emit(root, root, [Qt.ItemDataRole.CheckStateRole])
+        return True
+
 class RPPtoObjectApp(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -168,11 +602,12 @@ class RPPtoObjectApp(QMainWindow):
 
         self.lang_dir = os.path.join(self.resource_dir, "language")
         self.settings_path = os.path.join(self.app_dir, "settings.json")
+        self.cache_dir = os.path.join(self.app_dir, "cache")
+        self.run_log_path = os.path.join(self.app_dir, "export_log.jsonl")
+        self.profile_dir = os.path.join(self.app_dir, "profiles")
         self.lang_code = "ja"
         self.play_speed_steps = tuple(PLAY_SPEED_STEPS)
         self.i18n = {}
-        self.obj_terms = {}
-        self.obj_tokens = {}
         self.settings = self._load_settings()
         self._load_language(self.lang_code)
         self.setWindowTitle(self._tr("window_title"))
@@ -180,7 +615,24 @@ class RPPtoObjectApp(QMainWindow):
         self.file_rows = []
         self.form_rows = []
         self.added_effects_data = []
-        self.midi_cache = {"path": None, "mtime": None, "items": None, "track_names": None}
+        self.project = None
+        self.tree_names = []
+        self.run_thread = None
+        self.run_worker = None
+        self.load_pending = None
+        self.load_path = None
+        self.run_auto = False
+        self.watch_path = None
+        self.watch_stat = None
+        self.watch_pending = False
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self.on_watch_event)
+        self.watcher.directoryChanged.connect(self.on_watch_event)
+        self.watch_timer = QTimer(self)
+        self.watch_timer.setSingleShot(True)
+        self.watch_timer.setInterval(WATCH_DEBOUNCE_MS)
+        self.watch_timer.timeout.connect(self.on_watch_timeout)
+        self.parse_cache = ParseCache(self.cache_dir, self._cache_limit_bytes())
         self.init_ui()
         self._apply_settings_to_ui()
 
@@ -191,7 +643,13 @@ class RPPtoObjectApp(QMainWindow):
             "fps": "60",
             "scene_no": "1",
             "base_len_sec": "1.0",
-            "play_speed_steps": list(PLAY_SPEED_STEPS)
+            "play_speed_steps": list(PLAY_SPEED_STEPS),
+            "parse_cache_mb": DEFAULT_CACHE_MB,
+            "profile": False,
+            "workers": 0,
+            "shard_minutes": 0,
+            "shard_tracks": 0,
+            "bake_max_keys": BAKE_MAX_KEYS
         }
         loaded = {}
         try:
@@ -222,6 +680,13 @@ class RPPtoObjectApp(QMainWindow):
         settings["language"] = self.lang_code
         return settings
 
+    def _cache_limit_bytes(self):
+        try:
+            mb = float(self.settings.get("parse_cache_mb", DEFAULT_CACHE_MB))
+        except Exception:
+            mb = DEFAULT_CACHE_MB
+        return int(max(mb, 0) * 1024 * 1024)
+
     def _apply_settings_to_ui(self):
         self.fps_in.setText(str(self.settings.get("fps", "60")))
         self.scene_in.setText(str(self.settings.get("scene_no", "1")))
@@ -237,7 +702,13 @@ class RPPtoObjectApp(QMainWindow):
             "fps": self.fps_in.text().strip() or "60",
             "scene_no": self.scene_in.text().strip() or "1",
             "base_len_sec": self.base_len.text().strip() or "1.0",
-            "play_speed_steps": [float(v) for v in self.play_speed_steps]
+            "play_speed_steps": [float(v) for v in self.play_speed_steps],
+            "parse_cache_mb": self.settings.get("parse_cache_mb", DEFAULT_CACHE_MB),
+            "profile": bool(self.settings.get("profile", False)),
+            "workers": self.settings.get("workers", 0),
+            "shard_minutes": self.settings.get("shard_minutes", 0),
+            "shard_tracks": self.settings.get("shard_tracks", 0),
+            "bake_max_keys": self.settings.get("bake_max_keys", BAKE_MAX_KEYS)
         }
         try:
             with open(self.settings_path, "w", encoding="utf-8") as f:
@@ -246,42 +717,8 @@ class RPPtoObjectApp(QMainWindow):
             pass
 
     def _load_language(self, code):
-        base = {}
-        ja_path = os.path.join(self.lang_dir, "ja.json")
-        lang_path = os.path.join(self.lang_dir, f"{code}.json")
-        try:
-            with open(ja_path, "r", encoding="utf-8") as f:
-                base = json.load(f)
-        except Exception:
-            base = {}
-        if code != "ja":
-            try:
-                with open(lang_path, "r", encoding="utf-8") as f:
-                    base.update(json.load(f))
-            except Exception:
-                pass
         self.lang_code = code
-        self.i18n = base
-        self._load_object_language("ja")
-
-    def _load_object_language(self, code):
-        self.obj_terms = {}
-        self.obj_tokens = {}
-        obj_path = os.path.join(self.lang_dir, "object.json")
-        try:
-            with open(obj_path, "r", encoding="utf-8") as f:
-                obj_i18n = json.load(f)
-        except Exception:
-            obj_i18n = {}
-
-        ja_pack = obj_i18n.get("ja", {})
-        self.obj_terms = dict(ja_pack.get("terms", {}))
-        self.obj_tokens = dict(ja_pack.get("tokens", {}))
-
-        if code != "ja":
-            lang_pack = obj_i18n.get(code, {})
-            self.obj_terms.update(lang_pack.get("terms", {}))
-            self.obj_tokens.update(lang_pack.get("tokens", {}))
+        self.i18n = load_language(code, self.lang_dir)
 
     def _tr(self, key, **kwargs):
         text = self.i18n.get(key, key)
@@ -292,12 +729,6 @@ class RPPtoObjectApp(QMainWindow):
                 return text
         return text
 
-    def _obj(self, key):
-        return self.obj_terms.get(key, key)
-
-    def _obj_text(self, text):
-        return self.obj_tokens.get(text, text)
-
     def _ui_token(self, text):
         mapping = {
             "座標": "ui_eff_coordinate",
@@ -314,16 +745,6 @@ class RPPtoObjectApp(QMainWindow):
         key = mapping.get(text)
         return self._tr(key) if key else text
 
-    def _translate_motion_name(self, method_name):
-        mapping = {
-            "": "motion.none",
-            "直線移動": "motion.linear",
-            "直線移動(時間制御)": "motion.linear_time",
-            "補間移動": "motion.interpolate",
-            "補間移動(時間制御)": "motion.interpolate_time"
-        }
-        return self._obj(mapping.get(method_name, "motion.none"))
-
     def _fill_motion_combo(self, combo):
         current_key = combo.currentData()
         combo.clear()
@@ -384,6 +805,8 @@ class RPPtoObjectApp(QMainWindow):
         self.cb_auto_speed = QCheckBox(self._tr("auto_speed"))
         self.cb_redzone = QCheckBox(self._tr("redzone_mode"))
         self.cb_redzone.setStyleSheet("color: #FF6666; font-weight: bold;")
+        self.cb_pack_layers = QCheckBox(self._tr("pack_layers"))
+        self.cb_midi_notes = QCheckBox(self._tr("midi_notes"))
 
         self.base_len = QLineEdit("1.0")
         self.base_len.setFixedWidth(40)
@@ -394,6 +817,8 @@ class RPPtoObjectApp(QMainWindow):
         opt_grid.addWidget(self.cb_no_gap, 1, 1)
         opt_grid.addWidget(self.cb_as_scene, 2, 0)
         opt_grid.addWidget(self.cb_redzone, 3, 0)
+        opt_grid.addWidget(self.cb_pack_layers, 3, 1)
+        opt_grid.addWidget(self.cb_midi_notes, 4, 0, 1, 2)
         
         speed_h = QHBoxLayout()
         speed_h.addWidget(self.cb_auto_speed)
@@ -438,14 +863,20 @@ class RPPtoObjectApp(QMainWindow):
 
         self.lbl_track = QLabel(self._tr("track_select"))
         left.addWidget(self.lbl_track)
-        self.track_tree = QTreeWidget()
+        self.track_filter = QLineEdit()
+        self.track_filter.setPlaceholderText(self._tr("track_filter"))
+        self.track_filter.setClearButtonEnabled(True)
+        self.track_filter.textChanged.connect(self.on_track_filter_changed)
+        left.addWidget(self.track_filter)
+        self.track_model = TrackListModel(self._tr("all_tracks"), self)
+        self.track_tree = QTreeView()
         self.track_tree.setHeaderHidden(True)
+        self.track_tree.setUniformRowHeights(True)
         self.track_tree.setFixedHeight(120)
         self.track_tree.setStyleSheet("background-color: #2a2a2a; color: white;")
-
-        self.root_item = QTreeWidgetItem(self.track_tree, [self._tr("all_tracks")])
-        self.root_item.setCheckState(0, Qt.CheckState.Checked)
-        self.track_tree.itemChanged.connect(self.on_tree_changed)
+        self.track_tree.setModel(self.track_model)
+        self.track_model.modelReset.connect(self._expand_track_root)
+        self._expand_track_root()
         left.addWidget(self.track_tree)
 
         self.lbl_script = QLabel(self._tr("script_control"))
@@ -456,15 +887,44 @@ class RPPtoObjectApp(QMainWindow):
         self.run_btn = QPushButton(self._tr("run_output"))
         self.run_btn.setStyleSheet("height: 50px; background-color: #0D47A1; color: white; font-weight: bold; border-radius: 4px;")
         self.run_btn.clicked.connect(self.run_process)
-        left.addWidget(self.run_btn)
+        self.cancel_btn = QPushButton(self._tr("cancel_btn"))
+        self.cancel_btn.setFixedWidth(100)
+        self.cancel_btn.setStyleSheet("height: 50px; background-color: #555; color: white; font-weight: bold; border-radius: 4px;")
+        self.cancel_btn.setEnabled(False)
+        self.cancel_btn.clicked.connect(self.cancel_process)
+        self.cb_watch = QCheckBox(self._tr("watch_mode"))
+        self.cb_watch.toggled.connect(self.on_watch_toggled)
+        self.rpp_path.editingFinished.connect(self._update_watch)
+        left.addWidget(self.cb_watch)
+        run_h = QHBoxLayout()
+        run_h.addWidget(self.run_btn)
+        run_h.addWidget(self.cancel_btn)
+        left.addLayout(run_h)
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(0)
+        self.progress_bar.setTextVisible(True)
+        left.addWidget(self.progress_bar)
 
         right_widget = QWidget()
         right = QVBoxLayout(right_widget)
         
         self.lbl_easing = QLabel(f"<b>{self._tr('section_easing')}</b>")
-        right.addWidget(self.lbl_easing)
+        self.cb_bake_easing = QCheckBox(self._tr("bake_easing"))
+        easing_h = QHBoxLayout()
+        easing_h.addWidget(self.lbl_easing)
+        easing_h.addWidget(self.cb_bake_easing)
+        easing_h.addStretch()
+        right.addLayout(easing_h)
         self.bezier_ui = BezierCanvas() 
-        right.addWidget(self.bezier_ui)
+        self.preview_ui = TimelinePreview()
+        canvas_h = QHBoxLayout()
+        canvas_h.addWidget(self.bezier_ui)
+        canvas_h.addWidget(self.preview_ui, 1)
+        right.addLayout(canvas_h)
+        self.preview_btn = QPushButton(self._tr("preview_btn"))
+        self.preview_btn.clicked.connect(self.run_preview)
+        right.addWidget(self.preview_btn)
         
         self.lbl_effect = QLabel(f"<b>{self._tr('section_effect')}</b>")
         right.addWidget(self.lbl_effect)
@@ -497,11 +957,11 @@ class RPPtoObjectApp(QMainWindow):
         splitter.setStyleSheet("QSplitter::handle { background-color: #555; }") 
         main_layout.addWidget(splitter)
 
-    def on_tree_changed(self, item, column):
-        if item == self.root_item:
-            state = item.checkState(0)
-            for i in range(self.root_item.childCount()):
-                self.root_item.child(i).setCheckState(0, state)
+    def on_track_filter_changed(self, text):
+        self.track_model.set_filter(text)
+
+    def _expand_track_root(self):
+        self.track_tree.expand(self.track_model.root_index())
 
     def on_language_changed(self, _index):
         code = self.lang_combo.currentData()
@@ -531,18 +991,25 @@ class RPPtoObjectApp(QMainWindow):
         self.cb_as_scene.setText(self._tr("as_scene"))
         self.cb_auto_speed.setText(self._tr("auto_speed"))
         self.cb_redzone.setText(self._tr("redzone_mode"))
+        self.cb_pack_layers.setText(self._tr("pack_layers"))
+        self.cb_midi_notes.setText(self._tr("midi_notes"))
         self.lbl_base.setText(self._tr("base_label"))
         self.lbl_seconds.setText(self._tr("seconds"))
         self.cb_time_ctrl.setText(self._tr("time_control"))
         self.cb_apply_easing.setText(self._tr("apply_easing"))
         self.lbl_step.setText(self._tr("step_frame"))
         self.lbl_track.setText(self._tr("track_select"))
-        self.root_item.setText(0, self._tr("all_tracks"))
+        self.track_model.set_root_label(self._tr("all_tracks"))
+        self.track_filter.setPlaceholderText(self._tr("track_filter"))
         self.lbl_script.setText(self._tr("script_control"))
         self.run_btn.setText(self._tr("run_output"))
+        self.cancel_btn.setText(self._tr("cancel_btn"))
+        self.cb_watch.setText(self._tr("watch_mode"))
         self.lbl_easing.setText(f"<b>{self._tr('section_easing')}</b>")
+        self.cb_bake_easing.setText(self._tr("bake_easing"))
         self.lbl_effect.setText(f"<b>{self._tr('section_effect')}</b>")
         self.add_btn.setText(self._tr("add_effect"))
+        self.preview_btn.setText(self._tr("preview_btn"))
         self.refresh_effect_combo()
 
         self.lang_combo.blockSignals(True)
@@ -574,7 +1041,7 @@ class RPPtoObjectApp(QMainWindow):
 
     def select_rpp(self):
         p, _ = QFileDialog.getOpenFileName(self, self._tr("dialog_select_rpp_midi"), "", "RPP/MIDI (*.rpp *.mid *.midi)")
-        if p: self.rpp_path.setText(p); self.load_tracks(p)
+        if p: self.rpp_path.setText(p); self.load_tracks(p); self._update_watch()
 
     def save_exo(self):
         p, _ = QFileDialog.getSaveFileName(self, self._tr("dialog_save"), "", "*.object")
@@ -585,38 +1052,54 @@ class RPPtoObjectApp(QMainWindow):
         if p: self.src_path.setText(p)
 
     def load_tracks(self, path):
-        self.root_item.takeChildren()
-        self.midi_cache = {"path": None, "mtime": None, "items": None, "track_names": None}
-
-        ext = os.path.splitext(path)[1].lower()
-        if ext in (".mid", ".midi"):
-            try:
-                items, track_names = _parse_midi(path)
-                mtime = os.path.getmtime(path)
-                self.midi_cache = {"path": path, "mtime": mtime, "items": items, "track_names": track_names}
-                for idx, name in enumerate(track_names, 1):
-                    child = QTreeWidgetItem(self.root_item, [f"{idx:02} MIDI \"{name}\""])
-                    child.setData(0, Qt.ItemDataRole.UserRole, idx)
-                    child.setCheckState(0, Qt.CheckState.Checked)
-                self.root_item.setExpanded(True)
-            except Exception as e:
-                QMessageBox.critical(self, self._tr("midi_load_error_en"), str(e))
+        # 解析(MIDI)や索引作り(RPP)は大きなファイルだと時間がかかるので、ワーカースレッドで行う
+        self.track_model.clear()
+        self.tree_names = []
+        self.project = None
+        if self.run_thread is not None:
+            # 実行中の処理を止め、終わってから開く
+            self.load_pending = path
+            self.cancel_process()
             return
+        self.load_pending = None
+        self.load_path = path
+        self._start_worker(ProjectWorker(path, self.parse_cache), self.on_load_finished, self.on_load_failed,
+                           self.on_load_cancelled)
+        self.progress_bar.setRange(0, 0)
+
+    def on_load_finished(self, project):
+        self._end_run()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(0)
+        self.progress_bar.setFormat("%p%")
+        self.project = project
+        self._fill_track_tree(project)
+
+    def on_load_failed(self, e):
+        self._end_run()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(0)
+        self.progress_bar.setFormat("%p%")
+        if is_midi_path(self.load_path):
+            QMessageBox.critical(self, self._tr("midi_load_error_en"), str(e))
+        elif isinstance(e, ConvertError):
+            self._show_convert_error(e)
+        else:
+            QMessageBox.critical(self, self._tr("error_fatal"), str(e))
 
-        try:
-            with open(path, 'r', encoding='utf-8', errors='ignore') as f:
-                idx = 0
-                for line in f:
-                    if "<TRACK" in line:
-                        idx += 1; l2 = next(f)
-                        name = l2.replace("NAME ", "").strip() if "NAME" in l2 else f"Track {idx}"
-                        symbol = "┣" if idx > 0 else "┗"
-                        child = QTreeWidgetItem(self.root_item, [f"{idx:02} {symbol} \"{name}\""])
-                        child.setData(0, Qt.ItemDataRole.UserRole, idx) 
-                        child.setCheckState(0, Qt.CheckState.Checked)
-            self.root_item.setExpanded(True)
-        except:
-            pass
+    def on_load_cancelled(self):
+        self._end_run()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(0)
+        self.progress_bar.setFormat(self._tr("cancelled"))
+
+    def _fill_track_tree(self, project, checked=None):
+        # checked: 作り直す前のチェック状態(トラック番号→bool)。無い番号は新しいトラックとしてチェックする
+        self.tree_names = list(project["track_names"])
+        self.track_model.set_tracks(self.tree_names, project["is_midi"], checked)
+
+    def _track_checks(self):
+        return self.track_model.track_checks()
 
     def add_eff_ui(self):
         name = self.eff_combo.currentData() or self.eff_combo.currentText()
@@ -654,337 +1137,280 @@ class RPPtoObjectApp(QMainWindow):
     def remove_eff(self, info):
         self.added_effects_data.remove(info); info["frame"].deleteLater()
 
-    def run_process(self):
-        try:
-            rpp_p = self.rpp_path.text().strip()
-            exo_p = self.exo_path.text().strip()
-            src_p = self.src_path.text().strip()
-
-            if not rpp_p:
-                QMessageBox.warning(self, self._tr("error_input"), self._tr("msg_need_rpp_midi"))
-                return
-            if not os.path.exists(rpp_p):
-                QMessageBox.critical(self, self._tr("error_file"), self._tr("msg_rpp_midi_not_found"))
-                return
-            if not exo_p:
-                QMessageBox.warning(self, self._tr("error_input"), self._tr("msg_need_output"))
-                return
-
-            try:
-                fps_text = self.fps_in.text().strip() or "60"
-                fps = float(fps_text)
-                if fps <= 0:
-                    raise ValueError
-            except:
-                QMessageBox.critical(self, self._tr("error_number"), self._tr("msg_fps_gt0"))
-                return
-
-            try:
-                base_s = float(self.base_len.text() or 1.0)
-                if base_s <= 0:
-                    raise ValueError
-            except:
-                QMessageBox.critical(self, self._tr("error_number"), self._tr("msg_base_gt0"))
-                return
-
-            bez_str = self.bezier_ui.bezier_str
-            is_redzone = self.cb_redzone.isChecked()
-            flip_h = self.cb_flip_h.isChecked()
-            flip_v = self.cb_flip_v.isChecked()
-            effect_scene = self._obj("effect.scene")
-            effect_video = self._obj("effect.video_file")
-            effect_standard_draw = self._obj("effect.standard_draw")
-            effect_flip = self._obj("effect.flip")
-            effect_clip = self._obj("effect.clip")
-            effect_time_ctrl_obj = "時間制御(オブジェクト)"
-            param_play_pos = self._obj("param.play_pos")
-            param_play_speed = self._obj("param.play_speed")
-            param_scene = self._obj("param.scene")
-            param_file = self._obj("param.file")
-            param_audio_on = self._obj("param.audio_on")
-            param_x = self._obj("param.x")
-            param_y = self._obj("param.y")
-            param_z = self._obj("param.z")
-            param_opacity = self._obj("param.opacity")
-            param_flip_ud = self._obj("param.flip_ud")
-            param_flip_lr = self._obj("param.flip_lr")
-            param_flip_luma = self._obj("param.flip_luma")
-            param_flip_hue = self._obj("param.flip_hue")
-            param_flip_alpha = self._obj("param.flip_alpha")
-            param_clip_top = self._obj("param.clip_top")
-            param_clip_bottom = self._obj("param.clip_bottom")
-            param_clip_left = self._obj("param.clip_left")
-            param_clip_right = self._obj("param.clip_right")
-            param_position = "位置"
-            param_frame_step = "コマ落ち"
-            param_target_layer_count = "対象レイヤー数"
-            motion_linear_time = "直線移動(時間制御)"
-
-            active_tracks = []
-            for i in range(self.root_item.childCount()):
-                child = self.root_item.child(i)
-                if child.checkState(0) == Qt.CheckState.Checked:
-                    active_tracks.append(child.data(0, Qt.ItemDataRole.UserRole))
-
-            if not active_tracks:
-                QMessageBox.warning(self, self._tr("error_track_unselected"), self._tr("msg_need_track"))
-                return
-
-            ext = os.path.splitext(rpp_p)[1].lower()
-            is_midi_input = ext in (".mid", ".midi")
-            all_objs = []
-
-            if is_midi_input:
-                try:
-                    mtime = os.path.getmtime(rpp_p)
-                    if (self.midi_cache["path"] == rpp_p and
-                            self.midi_cache["mtime"] == mtime and
-                            self.midi_cache["items"] is not None):
-                        all_objs = list(self.midi_cache["items"])
-                    else:
-                        all_objs, track_names = _parse_midi(rpp_p)
-                        self.midi_cache = {"path": rpp_p, "mtime": mtime, "items": all_objs, "track_names": track_names}
-                except Exception as e:
-                    QMessageBox.critical(self, self._tr("error_midi_read"), str(e))
-                    return
-
-                all_objs = [o for o in all_objs if o["track"] in active_tracks]
-            else:
-                try:
-                    with open(rpp_p, 'r', encoding='utf-8', errors='ignore') as f:
-                        content = f.read()
-                except Exception as e:
-                    QMessageBox.critical(self, self._tr("error_read"), str(e))
-                    return
-
-                items_raw = content.split("<ITEM")
-                if len(items_raw) <= 1:
-                    QMessageBox.warning(self, self._tr("error_parse"), self._tr("msg_item_not_found"))
-                    return
-
-                track_count = 0
-
-                for i in range(1, len(items_raw)):
-                    track_count += items_raw[i-1].count("<TRACK")
-                    if track_count not in active_tracks:
-                        continue
-
-                    block = items_raw[i]
-                    pos, length = None, None
-
-                    for line in block.split("\n"):
-                        ls = line.strip()
-                        if ls.startswith("POSITION"):
-                            try:
-                                pos = float(ls.split()[1])
-                            except:
-                                pass
-                        if ls.startswith("LENGTH"):
-                            try:
-                                length = float(ls.split()[1])
-                            except:
-                                pass
-
-                    if pos is None or length is None:
-                        continue
-                    if length <= 0:
-                        continue
-
-                    all_objs.append({
-                        "pos": pos,
-                        "length": length,
-                        "track": track_count
+    def _collect_settings(self):
+        effects = []
+        for eff in self.added_effects_data:
+            params = []
+            for p in eff["params"]:
+                if p["type"] == "cb":
+                    params.append({"type": "cb", "name": p["name"], "value": p["obj"].isChecked()})
+                else:
+                    params.append({
+                        "type": "motion",
+                        "name": p["name"],
+                        "start": p["start"].text(),
+                        "end": p["end"].text(),
+                        "method": p["method"].currentData()
                     })
+            effects.append({"name": eff["name"], "params": params})
+
+        return {
+            "input": self.rpp_path.text().strip(),
+            "output": self.exo_path.text().strip(),
+            "source": self.src_path.text().strip(),
+            "fps": self.fps_in.text(),
+            "scene_no": self.scene_in.text(),
+            "base_len_sec": self.base_len.text(),
+            "flip_h": self.cb_flip_h.isChecked(),
+            "flip_v": self.cb_flip_v.isChecked(),
+            "loop": self.cb_loop.isChecked(),
+            "no_gap": self.cb_no_gap.isChecked(),
+            "as_scene": self.cb_as_scene.isChecked(),
+            "auto_speed": self.cb_auto_speed.isChecked(),
+            "redzone": self.cb_redzone.isChecked(),
+            "time_control": self.cb_time_ctrl.isChecked(),
+            "pack_layers": self.cb_pack_layers.isChecked(),
+            "midi_notes": self.cb_midi_notes.isChecked(),
+            "apply_easing": self.cb_apply_easing.isChecked(),
+            "frame_step": self.tc_step.text(),
+            "easing": self.bezier_ui.bezier_str,
+            "bake_easing": self.cb_bake_easing.isChecked(),
+            "easing_curve": self.bezier_ui.curve(),
+            "bake_max_keys": self.settings.get("bake_max_keys", BAKE_MAX_KEYS),
+            "tracks": self.track_model.selection(),
+            "effects": effects,
+            "play_speed_steps": list(self.play_speed_steps),
+            "workers": self.settings.get("workers", 0),
+            "shard_minutes": self.settings.get("shard_minutes", 0),
+            "shard_tracks": self.settings.get("shard_tracks", 0)
+        }
 
-            if not all_objs:
-                QMessageBox.warning(self, self._tr("error_no_result"), self._tr("msg_valid_item_not_found"))
-                return
+    def _show_convert_error(self, e):
+        box = QMessageBox.warning if e.level == "warning" else QMessageBox.critical
+        box(self, self._tr(e.title), self._tr(e.message, **e.kwargs))
 
-            objs_to_process = sorted(all_objs, key=lambda x: (x["track"], x["pos"]))
-            output = []
-            last_end_frames = {}
-            track_item_counts = {}
-            emitted_frame_keys = set()
-            total_obj_idx = 0
+    def _error_text(self, e):
+        if isinstance(e, ConvertError):
+            return f"{self._tr(e.title)}: {self._tr(e.message, **e.kwargs)}"
+        return f"{self._tr('error_fatal')}: {e}"
 
-            for o in objs_to_process:
-                try:
-                    t_idx = o["track"]
-
-                    if t_idx not in track_item_counts:
-                        track_item_counts[t_idx] = 0
-                    track_item_counts[t_idx] += 1
-                    curr_cnt = track_item_counts[t_idx]
-
-                    start_f = round(o["pos"] * fps)
-
-                    if self.cb_no_gap.isChecked() and t_idx in last_end_frames:
-                        if abs(start_f - (last_end_frames[t_idx] + 1)) < 5:
-                            start_f = last_end_frames[t_idx] + 1
-
-                    end_f = start_f + round(o["length"] * fps) - 1
-                    if end_f < start_f:
-                        continue
-                    if is_midi_input:
-                        frame_key = (t_idx, start_f, end_f)
-                        if frame_key in emitted_frame_keys:
-                            continue
-                        emitted_frame_keys.add(frame_key)
-
-                    last_end_frames[t_idx] = end_f
-
-                    speed = 100.0
-                    if self.cb_auto_speed.isChecked() and o["length"] > 0:
-                        speed = base_s / o["length"] * 100.0
-                    duration_frames = end_f - start_f + 1
-                    if duration_frames in FRAME_SPEED_OVERRIDES:
-                        speed = FRAME_SPEED_OVERRIDES[duration_frames]
-                    else:
-                        speed = min(self.play_speed_steps, key=lambda v: abs(v - speed))
-
-                    main_layer = t_idx * 2 if self.cb_time_ctrl.isChecked() else t_idx
-
-                    obj_x = 0.0
-                    if is_redzone:
-                        if t_idx == 1:
-                            obj_x = -480.0
-                        elif t_idx == 2:
-                            obj_x = 480.0
-
-                    output.append(f"[{total_obj_idx}]\nframe={start_f},{end_f}\nlayer={main_layer}\n")
-
-                    if self.cb_as_scene.isChecked():
-                        output.append(
-                            f"[{total_obj_idx}.0]\n"
-                            f"effect.name={effect_scene}\n"
-                            f"{param_play_pos}=0.000\n"
-                            f"{param_play_speed}={speed:.2f}\n"
-                            f"{param_scene}={self.scene_in.text()}\n"
-                        )
-                    else:
-                        output.append(
-                            f"[{total_obj_idx}.0]\n"
-                            f"effect.name={effect_video}\n"
-                            f"{param_file}={src_p}\n"
-                            f"{param_play_pos}=0.000\n"
-                            f"{param_play_speed}={speed:.2f}\n"
-                            f"{param_audio_on}=1\n"
-                        )
-
-                    output.append(
-                        f"[{total_obj_idx}.1]\n"
-                        f"effect.name={effect_standard_draw}\n"
-                        f"{param_x}={obj_x:.2f}\n{param_y}=0.00\n{param_z}=0.00\n{param_opacity}=0.00\n"
-                    )
-
-                    p_idx = 2
-
-                    if flip_h or flip_v:
-                        ud_val = 0
-                        lr_val = 0
-                        if flip_h and flip_v:
-                            phase = (curr_cnt - 1) % 4
-                            if phase == 1:
-                                lr_val = 1
-                            elif phase == 2:
-                                ud_val = 1
-                            elif phase == 3:
-                                ud_val, lr_val = 1, 1
-                        else:
-                            flip_on = (curr_cnt % 2 == 0)
-                            ud_val = 1 if (flip_v and flip_on) else 0
-                            lr_val = 1 if (flip_h and flip_on) else 0
-
-                        if ud_val or lr_val:
-                            output.append(
-                                f"[{total_obj_idx}.{p_idx}]\n"
-                                f"effect.name={effect_flip}\n"
-                                f"{param_flip_ud}={ud_val}\n"
-                                f"{param_flip_lr}={lr_val}\n"
-                                f"{param_flip_luma}=0\n{param_flip_hue}=0\n{param_flip_alpha}=0\n"
-                            )
-                            p_idx += 1
-
-                    if is_redzone and (t_idx == 1 or t_idx == 2):
-                        output.append(
-                            f"[{total_obj_idx}.{p_idx}]\n"
-                            f"effect.name={effect_clip}\n"
-                            f"{param_clip_top}=0\n{param_clip_bottom}=0\n{param_clip_left}=480\n{param_clip_right}=480\n"
-                        )
-                        p_idx += 1
-
-                    for eff in self.added_effects_data:
-                        output.append(f"[{total_obj_idx}.{p_idx}]\neffect.name={self._obj_text(eff['name'])}\n")
-                        for p in eff["params"]:
-                            out_pname = self._obj_text(p["name"])
-                            if p["type"] == "cb":
-                                val = int(p["obj"].isChecked())
-                            else:
-                                try:
-                                    float(p["start"].text())
-                                    float(p["end"].text())
-                                except:
-                                    QMessageBox.warning(self, self._tr("error_number"), self._tr("msg_invalid_value", name=p["name"]))
-                                    return
-
-                                motion_name = self._translate_motion_name(XDict[p["method"].currentText()])
-                                val = f"{p['start'].text()},{p['end'].text()},{motion_name},{bez_str}"
-
-                            output.append(f"{out_pname}={val}\n")
-                        p_idx += 1
-
-                    output.append("\n")
-                    total_obj_idx += 1
-
-                    if self.cb_time_ctrl.isChecked():
-                        if curr_cnt % 2 == 0:
-                            s_val, e_val = "100.000", "0.000"
-                        else:
-                            s_val, e_val = "0.000", "100.000"
-
-                        t_easing = bez_str if self.cb_apply_easing.isChecked() else "0"
-
-                        output.append(
-                            f"[{total_obj_idx}]\n"
-                            f"frame={start_f},{end_f}\n"
-                            f"layer={main_layer-1}\n"
-                        )
-
-                        output.append(
-                            f"[{total_obj_idx}.0]\n"
-                            f"effect.name={effect_time_ctrl_obj}\n"
-                            f"{param_position}={s_val},{e_val},{motion_linear_time},{t_easing}\n"
-                            f"{param_frame_step}={self.tc_step.text()}\n"
-                            f"{param_target_layer_count}=1\n\n"
-                        )
-
-                        total_obj_idx += 1
-
-                except Exception as inner_e:
-                    print("オブジェクト処理エラー:", inner_e)
-                    continue
+    def run_process(self):
+        self._start_run(auto=False)
 
-            try:
-                with open(exo_p, 'w', encoding='utf-8') as f:
-                    f.write("".join(output))
-            except Exception as e:
-                QMessageBox.critical(self, self._tr("error_save"), str(e))
-                return
-
-            QMessageBox.information(
-                self,
-                self._tr("done"),
-                self._tr("msg_done", prefix=(self._tr("redzone_prefix") if is_redzone else ""))
-            )
+    def run_preview(self):
+        self._start_run(False, preview=True)
 
+    def _start_run(self, auto, preview=False):
+        if self.run_thread is not None:
+            return
+        try:
+            cfg = normalize_settings(self._collect_settings(), need_output=not preview)
         except Exception as e:
+            if auto:
+                self.statusBar().showMessage(self._tr("status_auto_failed", error=self._error_text(e)))
+            elif isinstance(e, ConvertError):
+                self._show_convert_error(e)
+            else:
+                QMessageBox.critical(self, self._tr("error_fatal"), str(e))
+            return
+        if self.watch_path is not None:
+            self.watch_stat = self._file_stat(self.watch_path)
+
+        profile_path = None
+        if profile_requested(self.settings.get("profile", False)):
+            stamp = time.strftime("%Y%m%d_%H%M%S") + f"_{int(time.time() * 1000) % 1000:03d}"
+            profile_path = os.path.join(self.profile_dir, f"export_{stamp}.prof")
+
+        self.run_cfg = cfg
+        self.run_auto = auto
+        self._start_worker(ConvertWorker(cfg, self.project, self.parse_cache, profile_path, preview),
+                           self.on_run_finished, self.on_run_failed, self.on_run_cancelled)
+
+    def _start_worker(self, worker, finished, failed, cancelled):
+        self.run_thread = QThread(self)
+        self.run_worker = worker
+        self.run_worker.moveToThread(self.run_thread)
+        self.run_thread.started.connect(self.run_worker.run)
+        self.run_worker.progress.connect(self.on_run_progress)
+        self.run_worker.finished.connect(finished)
+        self.run_worker.failed.connect(failed)
+        self.run_worker.cancelled.connect(cancelled)
+        self.run_btn.setEnabled(False)
+        self.preview_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(0)
+        self.run_thread.start()
+
+    def cancel_process(self):
+        if self.run_worker is not None:
+            self.run_worker.cancel()
+            self.cancel_btn.setEnabled(False)
+
+    def _end_run(self):
+        if self.run_thread is not None:
+            self.run_thread.quit()
+            self.run_thread.wait()
+            self.run_thread.deleteLater()
+            self.run_worker.deleteLater()
+        self.run_thread = None
+        self.run_worker = None
+        self.run_btn.setEnabled(True)
+        self.preview_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(False)
+        if self.load_pending is not None:
+            # 実行中に別のファイルが選ばれた。出力の結果を扱い終えてから開く
+            QTimer.singleShot(0, lambda: self.load_pending is not None and self.load_tracks(self.load_pending))
+            return
+        if self.watch_pending:
+            # 実行中に保存された分は、終わってから最新の状態で1回だけ出力する
+            self.watch_pending = False
+            self.watch_timer.start()
+
+    def on_run_progress(self, stage, done, total):
+        label = self._tr(f"progress_{stage}")
+        if total > 0:
+            self.progress_bar.setRange(0, 100)
+            self.progress_bar.setValue(int(done * 100 / total))
+        else:
+            self.progress_bar.setRange(0, 0)
+        self.progress_bar.setFormat(f"{label} %p%")
+
+    def on_run_finished(self, result):
+        self._end_run()
+        self.project = result["project"]
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(100)
+        self.progress_bar.setFormat(self._tr("done"))
+        if "frames" in result:
+            self.preview_ui.set_frames(result["frames"], result["time_control"])
+            self.statusBar().showMessage(self._tr("status_preview", objects=result["objects"],
+                                                  stages=format_timings(result["timings"])))
+            return
+        self._report_timings(result)
+        if self.project["track_names"] != self.tree_names:
+            # 保存でトラック構成が変わった。新しいトラックは選択済みにして、それを含めてもう一度出力する
+            added = len(self.project["track_names"]) > len(self.tree_names)
+            self._fill_track_tree(self.project, self._track_checks())
+            if added and self.watch_path is not None:
+                self.watch_stat = None
+                self.watch_timer.start()
+        if self.run_auto:
+            self.statusBar().showMessage(self._tr("status_auto_done", status=self.statusBar().currentMessage()))
+            return
+        QMessageBox.information(
+            self,
+            self._tr("done"),
+            self._tr("msg_done", prefix=(self._tr("redzone_prefix") if self.run_cfg.redzone else ""))
+        )
+
+    def _report_timings(self, result):
+        timings = result["timings"]
+        msg = self._tr(
+            "status_run",
+            objects=result["objects"],
+            size=f"{result['bytes'] / 1024:.0f}",
+            total=f"{timings['total'] * 1000:.0f}",
+            stages=format_timings(timings)
+        )
+        counters = timings["counters"]
+        if "reused" in counters:
+            msg += "  " + self._tr("status_reused", reused=counters["reused"], emitted=counters["emitted"])
+        if result.get("profile"):
+            msg += "  " + self._tr("status_profile", path=result["profile"])
+        self.statusBar().showMessage(msg)
+        append_run_log(self.run_log_path, {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "input": self.run_cfg.input,
+            "output": result["output"],
+            "items": result["items"],
+            "objects": result["objects"],
+            "bytes": result["bytes"],
+            "stages": timings["stages"],
+            "counters": timings["counters"],
+            "total": timings["total"],
+            "profile": result.get("profile")
+        })
+
+    def on_run_failed(self, e):
+        self._end_run()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(0)
+        self.progress_bar.setFormat("%p%")
+        if self.run_auto:
+            self.statusBar().showMessage(self._tr("status_auto_failed", error=self._error_text(e)))
+        elif isinstance(e, ConvertError):
+            self._show_convert_error(e)
+        else:
             QMessageBox.critical(self, self._tr("error_fatal"), str(e))
 
+    def on_run_cancelled(self):
+        self._end_run()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(0)
+        self.progress_bar.setFormat(self._tr("cancelled"))
+        if self.run_auto:
+            self.statusBar().showMessage(self._tr("msg_cancelled"))
+            return
+        QMessageBox.information(self, self._tr("cancelled"), self._tr("msg_cancelled"))
+
+    def _file_stat(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_size, st.st_mtime_ns)
+
+    def on_watch_toggled(self, _checked):
+        self._update_watch()
+
+    def _update_watch(self):
+        watched = self.watcher.files() + self.watcher.directories()
+        if watched:
+            self.watcher.removePaths(watched)
+        self.watch_timer.stop()
+        self.watch_pending = False
+        self.watch_path = None
+        path = self.rpp_path.text().strip()
+        if not self.cb_watch.isChecked() or not path:
+            return
+        self.watch_path = os.path.abspath(path)
+        self.watch_stat = self._file_stat(self.watch_path)
+        # 置き換え保存でファイルの監視が外れても気付けるよう、フォルダも監視する
+        self.watcher.addPath(os.path.dirname(self.watch_path))
+        if self.watch_stat is not None:
+            self.watcher.addPath(self.watch_path)
+        self.statusBar().showMessage(self._tr("status_watching", path=self.watch_path))
+
+    def on_watch_event(self, _path):
+        if self.watch_path is None:
+            return
+        if self.watch_path not in self.watcher.files() and os.path.exists(self.watch_path):
+            self.watcher.addPath(self.watch_path)
+        self.watch_timer.start()
+
+    def on_watch_timeout(self):
+        if self.watch_path is None:
+            return
+        st = self._file_stat(self.watch_path)
+        if st is None or st == self.watch_stat:
+            return
+        if self.run_thread is not None:
+            self.watch_pending = True
+            return
+        self._start_run(auto=True)
+
     def closeEvent(self, event):
+        if self.run_worker is not None:
+            self.run_worker.cancel()
+            self.run_thread.quit()
+            self.run_thread.wait()
         self._save_settings()
         super().closeEvent(event)
 
 if __name__ == "__main__":
+    # 並列出力のワーカープロセスが、exe化した場合もウィンドウを開かないようにする
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv); app.setStyle("Fusion")
     dark_p = QPalette()
     dark_p.setColor(QPalette.ColorRole.Window, QColor(45, 45, 45))
@@ -0,0 +1,412 @@
+import os
+import sys
+import json
+import time
+import random
+import struct
+import argparse
+import tempfile
+import tracemalloc
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# 秒。起動直後のウィンドウ表示と、小さなRPPのヘッドレス変換1回分
+STARTUP_BUDGET = {
+    "window": 2.0,
+    "headless": 0.6,
+}
+
+HEAVY_MODULES = ("numpy", "pretty_midi", "mido")
+
+STAGES = ("parse", "filter", "sort", "frames", "emit", "write")
+DEFAULT_SIZES = (1000, 10000, 100000)
+FULL_SIZES = DEFAULT_SIZES + (1000000,)
+DEFAULT_TRACKS = (1, 50, 500)
+# ベースラインより遅くなったと判定する割合と、ノイズとして無視する絶対差(秒)
+DEFAULT_TOLERANCE = 0.25
+MIN_REGRESSION_SEC = 0.005
+
+_WINDOW_PROBE = r"""
+import sys, json
+from PyQt6.QtWidgets import QApplication
+app = QApplication(sys.argv)
+import RPPtoOBJECT
+win = RPPtoOBJECT.RPPtoObjectApp()
+win.show()
+app.processEvents()
+print(json.dumps([m for m in %r if m in sys.modules]))
+""" % (HEAVY_MODULES,)
+
+
+def write_small_rpp(path, tracks=2, items=8):
+    lines = ['<REAPER_PROJECT 0.1 "7.0" 0']
+    for t in range(1, tracks + 1):
+        lines.append("  <TRACK")
+        lines.append(f'    NAME "Track {t}"')
+        for i in range(items):
+            lines.append("    <ITEM")
+            lines.append(f"      POSITION {i * 0.5}")
+            lines.append("      LENGTH 0.25")
+            lines.append("    >")
+        lines.append("  >")
+    lines.append(">")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def _timed_run(cmd, env=None):
+    t0 = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=HERE, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - t0
+    if proc.returncode != 0:
+        raise RuntimeError(f"{' '.join(cmd)} failed:\n{proc.stderr}")
+    return elapsed, proc.stdout
+
+
+def measure_startup(repeat=3):
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    window = []
+    heavy = []
+    for _ in range(repeat):
+        elapsed, out = _timed_run([sys.executable, "-c", _WINDOW_PROBE], env)
+        window.append(elapsed)
+        heavy = json.loads(out.strip().splitlines()[-1])
+
+    headless = []
+    with tempfile.TemporaryDirectory() as tmp:
+        rpp = os.path.join(tmp, "small.rpp")
+        write_small_rpp(rpp)
+        for _ in range(repeat):
+            elapsed, _ = _timed_run([sys.executable, "-m", "rpp_core", rpp, "-o", os.path.join(tmp, "out.object"), "--no-cache"])
+            headless.append(elapsed)
+
+    return {"window": min(window), "headless": min(headless), "heavy_at_startup": heavy}
+
+
+def startup_failures(result, budget=None):
+    """measure_startup の結果のうち予算を超えたものの説明。空なら合格"""
+    budget = budget or STARTUP_BUDGET
+    failures = [f"{key} {result[key] * 1000:.1f} ms > budget {budget[key] * 1000:.0f} ms"
+                for key in ("window", "headless") if result[key] > budget[key]]
+    if result["heavy_at_startup"]:
+        failures.append(f"heavy modules imported at startup: {', '.join(result['heavy_at_startup'])}")
+    return failures
+
+
+def cmd_startup(args):
+    result = measure_startup(args.repeat)
+    budget = dict(STARTUP_BUDGET)
+    if args.window_budget is not None:
+        budget["window"] = args.window_budget
+    if args.headless_budget is not None:
+        budget["headless"] = args.headless_budget
+
+    for key in ("window", "headless"):
+        over = result[key] > budget[key]
+        print(f"{key:9s} {result[key] * 1000:8.1f} ms  (budget {budget[key] * 1000:.0f} ms){'  OVER' if over else ''}")
+    failures = startup_failures(result, budget)
+    if result["heavy_at_startup"]:
+        print(failures[-1])
+    return 1 if failures else 0
+
+
+def _split_counts(total, parts):
+    base, extra = divmod(total, parts)
+    return [base + (1 if i < extra else 0) for i in range(parts)]
+
+
+def generate_rpp(path, n_items, n_tracks, midi_ratio=0.1, midi_events=32, seed=0):
+    """REAPERが書き出すのと同じ形の合成RPPを作る。MIDIアイテムは SOURCE MIDI の中にイベント行を持つ。"""
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        f.write('<REAPER_PROJECT 0.1 "7.0/x64" 1700000000\n  TEMPO 120 4 4\n')
+        for t, count in enumerate(_split_counts(n_items, n_tracks), 1):
+            f.write(f'  <TRACK {{{t:08X}-0000-0000-0000-000000000000}}\n    NAME "Track {t}"\n    VOLPAN 1 0 -1 -1 1\n')
+            pos = rng.random()
+            for i in range(count):
+                length = rng.choice((0.125, 0.25, 0.5, 1.0)) * rng.uniform(0.5, 1.5)
+                f.write(
+                    "    <ITEM\n"
+                    f"      POSITION {pos:.14f}\n"
+                    "      SNAPOFFS 0\n"
+                    f"      LENGTH {length:.14f}\n"
+                    "      LOOP 0\n      ALLTAKES 0\n      FADEIN 1 0 0 1 0 0 0\n      FADEOUT 1 0 0 1 0 0 0\n"
+                    "      MUTE 0 0\n      SEL 0\n"
+                    f"      IGUID {{{t:08X}-{i & 0xFFFF:04X}-0000-0000-{i:012X}}}\n"
+                    f'      NAME "clip {i}"\n'
+                    "      VOLPAN 1 0 1 -1\n      SOFFS 0\n      PLAYRATE 1 1 0 -1 0 0.0025\n      CHANMODE 0\n"
+                )
+                if rng.random() < midi_ratio:
+                    f.write("      <SOURCE MIDI\n        HASDATA 1 960 QN\n")
+                    for e in range(midi_events):
+                        pitch = 36 + rng.randrange(48)
+                        on = "90" if e % 2 == 0 else "80"
+                        f.write(f"        E {rng.randrange(240)} {on} {pitch:02x} {rng.randrange(1, 128):02x}\n")
+                    f.write("        E 960 b0 7b 00\n      >\n")
+                else:
+                    f.write(f'      <SOURCE WAVE\n        FILE "audio/clip_{t}_{i % 16}.wav"\n      >\n')
+                f.write("    >\n")
+                pos += length + rng.choice((0.0, 0.0, 0.05, 0.25))
+            f.write("  >\n")
+        f.write(">\n")
+
+
+def _varlen(value):
+    out = [value & 0x7F]
+    value >>= 7
+    while value:
+        out.append(0x80 | (value & 0x7F))
+        value >>= 7
+    return bytes(reversed(out))
+
+
+def _smf_chunk(body):
+    return b"MTrk" + struct.pack(">I", len(body)) + body
+
+
+def generate_midi(path, n_notes, n_tracks, division=480, seed=0):
+    """テンポ変更・和音・ランニングステータスを含む合成SMF(フォーマット1)を作る。"""
+    rng = random.Random(seed)
+    conductor = bytearray()
+    tick = 0
+    for bpm in (120, 96, 150, 132):
+        conductor += _varlen(tick) + b"\xff\x51\x03" + (60000000 // bpm).to_bytes(3, "big")
+        tick = division * 16
+    conductor += b"\x00\xff\x2f\x00"
+    chunks = [_smf_chunk(bytes(conductor))]
+
+    for t, count in enumerate(_split_counts(n_notes, n_tracks), 1):
+        name = f"Track {t}".encode("utf-8")
+        ch = (t - 1) % 16
+        events = []
+        tick = 0
+        left = count
+        while left > 0:
+            chord = min(left, rng.choice((1, 1, 1, 2, 3)))
+            dur = rng.choice((60, 120, 240, 480))
+            for pitch in rng.sample(range(36, 96), chord):
+                events.append((tick, 1, pitch, rng.randrange(1, 128)))
+                events.append((tick + dur, 0, pitch, 0))
+            left -= chord
+            tick += rng.choice((0, 60, 120, 240, 480))
+        events.sort()
+
+        body = bytearray(b"\x00\xff\x03" + _varlen(len(name)) + name + b"\x00" + bytes((0xC0 | ch, t % 128)))
+        last = 0
+        status = None
+        for ev_tick, is_on, pitch, vel in events:
+            body += _varlen(ev_tick - last)
+            last = ev_tick
+            st = (0x90 if is_on else 0x80) | ch
+            if st != status:
+                body.append(st)
+                status = st
+            body += bytes((pitch, vel))
+        body += b"\x00\xff\x2f\x00"
+        chunks.append(_smf_chunk(bytes(body)))
+
+    with open(path, "wb") as f:
+        f.write(b"MThd" + struct.pack(">IHHH", 6, 1, len(chunks), division))
+        for c in chunks:
+            f.write(c)
+
+
+def _stage_funcs(path, out_path, n_tracks):
+    from rpp_core import (
+        is_midi_path, normalize_settings, load_project, filter_items,
+        sort_items, frame_math, emit_objects, write_chunks, OUTPUT_CHUNK_SIZE,
+    )
+    is_midi = is_midi_path(path)
+    # 半分のトラックを選んだ状態で変換する
+    tracks = frozenset(range(1, n_tracks + 1, 2))
+    cfg = normalize_settings({
+        "input": path, "output": out_path, "tracks": tracks,
+        "flip_h": True, "time_control": True, "apply_easing": True,
+    })
+
+    def write(parts):
+        with open(out_path, "w", encoding="utf-8", buffering=OUTPUT_CHUNK_SIZE) as f:
+            write_chunks(f, parts)
+
+    return [
+        ("parse", lambda _: load_project(path)[0]),
+        ("filter", lambda items: filter_items(items, cfg.tracks)),
+        ("sort", sort_items),
+        ("frames", lambda cols: frame_math(cols, cfg, is_midi)),
+        ("emit", lambda frames: list(emit_objects(frames, cfg))),
+        ("write", write),
+    ]
+
+
+def _run_stages(funcs, memory):
+    result = {}
+    value = None
+    if memory:
+        tracemalloc.start()
+    try:
+        for name, fn in funcs:
+            if memory:
+                base = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+            t0 = time.perf_counter()
+            value = fn(value)
+            elapsed = time.perf_counter() - t0
+            result[name] = {"time": elapsed}
+            if memory:
+                result[name]["peak"] = max(0, tracemalloc.get_traced_memory()[1] - base)
+    finally:
+        if memory:
+            tracemalloc.stop()
+    return result
+
+
+def measure_case(kind, n_items, n_tracks, tmp, repeat=3, memory=True, midi_ratio=0.1, seed=0):
+    ext = ".mid" if kind == "midi" else ".rpp"
+    path = os.path.join(tmp, f"{kind}_{n_items}_{n_tracks}{ext}")
+    out_path = os.path.join(tmp, "out.object")
+    if kind == "midi":
+        generate_midi(path, n_items, n_tracks, seed=seed)
+    else:
+        generate_rpp(path, n_items, n_tracks, midi_ratio=midi_ratio, seed=seed)
+    funcs = _stage_funcs(path, out_path, n_tracks)
+
+    # 時間は tracemalloc なしの最速値、メモリは別の1回で測る
+    timings = [_run_stages(funcs, False) for _ in range(repeat)]
+    result = {name: {"time": min(t[name]["time"] for t in timings)} for name in STAGES}
+    if memory:
+        for name, v in _run_stages(funcs, True).items():
+            result[name]["peak"] = v["peak"]
+    os.remove(path)
+    return result
+
+
+def case_key(kind, n_items, n_tracks):
+    return f"{kind}/{n_items}/{n_tracks}"
+
+
+def compare_baseline(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    regressions = []
+    for key, stages in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        for name, v in stages.items():
+            b = base.get(name, {}).get("time")
+            if b is None:
+                continue
+            if v["time"] > b * (1 + tolerance) and v["time"] - b > MIN_REGRESSION_SEC:
+                regressions.append((key, name, b, v["time"]))
+    return regressions
+
+
+def _parse_int_list(text):
+    return [int(v) for v in text.split(",") if v.strip()]
+
+
+def _format_case(key, stages):
+    cols = []
+    for name in STAGES:
+        v = stages[name]
+        col = f"{name} {v['time'] * 1000:8.1f}ms"
+        if "peak" in v:
+            col += f" {v['peak'] / (1 << 20):6.1f}MB"
+        cols.append(col)
+    return f"{key:22s} " + " | ".join(cols)
+
+
+def cmd_stages(args):
+    sizes = _parse_int_list(args.items) if args.items else list(FULL_SIZES if args.full else DEFAULT_SIZES)
+    tracks = _parse_int_list(args.tracks) if args.tracks else list(DEFAULT_TRACKS)
+    kinds = [k.strip() for k in args.kinds.split(",") if k.strip()]
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for kind in kinds:
+            for n_items in sizes:
+                for n_tracks in tracks:
+                    if n_tracks > n_items:
+                        continue
+                    key = case_key(kind, n_items, n_tracks)
+                    results[key] = measure_case(
+                        kind, n_items, n_tracks, tmp,
+                        repeat=args.repeat, memory=not args.no_memory, midi_ratio=args.midi_ratio,
+                    )
+                    print(_format_case(key, results[key]), flush=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if not args.baseline:
+        return 0
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2)
+        print(f"baseline saved: {args.baseline}")
+        return 0
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare_baseline(results, baseline, args.tolerance)
+    for key, name, before, after in regressions:
+        print(f"REGRESSION {key} {name}: {before * 1000:.1f} ms -> {after * 1000:.1f} ms ({after / before - 1:+.0%})")
+    return 1 if regressions else 0
+
+
+def cmd_generate(args):
+    if args.kind == "midi":
+        generate_midi(args.path, args.items, args.tracks, seed=args.seed)
+    else:
+        generate_rpp(args.path, args.items, args.tracks, midi_ratio=args.midi_ratio, seed=args.seed)
+    return 0
+
+
+def build_arg_parser():
+    ap = argparse.ArgumentParser(prog="benchmark", description="RPPtoOBJECT performance checks")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    sp = sub.add_parser("startup", help="check startup time against the budget")
+    sp.add_argument("--repeat", type=int, default=3)
+    sp.add_argument("--window-budget", type=float, default=None, help="seconds")
+    sp.add_argument("--headless-budget", type=float, default=None, help="seconds")
+    sp.set_defaults(func=cmd_startup)
+
+    sp = sub.add_parser("stages", help="time and profile each conversion stage on synthetic projects")
+    sp.add_argument("--items", default=None, help="item counts, e.g. 1000,10000")
+    sp.add_argument("--tracks", default=None, help="track counts, e.g. 1,50,500")
+    sp.add_argument("--kinds", default="rpp,midi", help="rpp, midi or both")
+    sp.add_argument("--full", action="store_true", help="include the 1M item case")
+    sp.add_argument("--repeat", type=int, default=3)
+    sp.add_argument("--midi-ratio", type=float, default=0.1, help="share of RPP items that carry MIDI data")
+    sp.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    sp.add_argument("--json", default=None, help="write the results to this file")
+    sp.add_argument("--baseline", default=None, help="baseline JSON to compare against")
+    sp.add_argument("--save-baseline", action="store_true", help="store the results into --baseline instead of comparing")
+    sp.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed slowdown ratio")
+    sp.set_defaults(func=cmd_stages)
+
+    sp = sub.add_parser("generate", help="write a synthetic project")
+    sp.add_argument("kind", choices=("rpp", "midi"))
+    sp.add_argument("path")
+    sp.add_argument("--items", type=int, default=10000)
+    sp.add_argument("--tracks", type=int, default=10)
+    sp.add_argument("--midi-ratio", type=float, default=0.1)
+    sp.add_argument("--seed", type=int, default=0)
+    sp.set_defaults(func=cmd_generate)
+    return ap
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
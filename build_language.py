@@ -0,0 +1,21 @@
+import sys
+import argparse
+from rpp_core import LANG_DIR, LANG_BUNDLE, build_language_bundle, load_language_bundle, write_language_bundle
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="build_language",
+                                 description=f"rebuild language/{LANG_BUNDLE} from the language source files")
+    ap.add_argument("--check", action="store_true", help="only check that the bundle is up to date")
+    args = ap.parse_args(argv)
+    if args.check:
+        if load_language_bundle(LANG_DIR) != build_language_bundle(LANG_DIR):
+            print(f"language/{LANG_BUNDLE} is out of date; run python build_language.py", file=sys.stderr)
+            return 1
+        return 0
+    print(write_language_bundle(LANG_DIR))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,217 @@
+import os
+import json
+import struct
+import hashlib
+from rpp_items import ItemTable, as_item_table
+
+CACHE_VERSION = 6
+DEFAULT_CACHE_MB = 256
+
+_MAGIC = b"RPOC"
+# magic, version, kind, size, mtime_ns, sha1, item count, meta(JSON) byte length
+_HEADER = struct.Struct("<4sHH qq 20s II")
+_KINDS = {"rpp": 1, "midi": 2, "rpp_notes": 3}
+_HASH_CHUNK = 1 << 20
+_ENTRY_EXTS = (".bin", ".manifest")
+
+
+def file_digest(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(_HASH_CHUNK)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.digest()
+
+
+class ParseCache:
+    def __init__(self, directory, max_bytes=DEFAULT_CACHE_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def _entry_path(self, path, kind):
+        key = f"{CACHE_VERSION}|{kind}|{os.path.normcase(os.path.abspath(path))}"
+        return os.path.join(self.directory, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".bin")
+
+    def get(self, path, kind):
+        entry = self._entry_path(path, kind)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        data = self._read(entry, kind)
+        if data is None:
+            return None
+        _, _, _, size, mtime_ns, digest, count, names_len = _HEADER.unpack_from(data, 0)
+        if size != st.st_size:
+            return None
+        if mtime_ns != st.st_mtime_ns:
+            # 更新日時だけ変わった場合は内容のハッシュで判定する
+            try:
+                if file_digest(path) != digest:
+                    return None
+            except OSError:
+                return None
+            self._write(entry, kind, st, digest, data[_HEADER.size:], count, names_len)
+        else:
+            self._touch(entry)
+        items, meta = self._decode(data)
+        return items, meta["names"]
+
+    def get_previous(self, path, kind):
+        """元ファイルが変わっていても、前回記録した解析結果を (items, トラック名, トラックごとの情報) で返す。
+        トラックごとの情報は put に tracks を渡したときだけ入る(無ければ None)"""
+        data = self._read(self._entry_path(path, kind), kind)
+        if data is None:
+            return None
+        items, meta = self._decode(data)
+        return items, meta["names"], meta.get("tracks")
+
+    def _read(self, entry, kind):
+        try:
+            with open(entry, "rb") as f:
+                data = f.read()
+            magic, ver, kind_id = _HEADER.unpack_from(data, 0)[:3]
+        except (OSError, struct.error):
+            return None
+        if magic != _MAGIC or ver != CACHE_VERSION or kind_id != _KINDS[kind]:
+            return None
+        return data
+
+    def _decode(self, data):
+        import numpy as np
+
+        count, names_len = _HEADER.unpack_from(data, 0)[-2:]
+        # 列はファイルの中身をそのまま参照する(コピーしない)
+        off = _HEADER.size
+        pos = np.frombuffer(data, dtype="<f8", count=count, offset=off)
+        off += count * 8
+        length = np.frombuffer(data, dtype="<f8", count=count, offset=off)
+        off += count * 8
+        track = np.frombuffer(data, dtype="<i4", count=count, offset=off)
+        off += count * 4
+        meta = json.loads(data[off:off + names_len].decode("utf-8"))
+        note = None
+        if meta.get("note"):
+            # MIDIアイテムから分けたノートの印は、名前の後ろに1行1バイトで置く
+            note = np.frombuffer(data, dtype=np.bool_, count=count, offset=off + names_len)
+        return ItemTable(pos, length, track, meta["ids"], note=note), meta
+
+    @staticmethod
+    def stamp(path):
+        """解析を始める前に呼び、その結果を put に渡す。解析中に保存されても古い内容として記録されるので、
+        次回の get で再解析される"""
+        try:
+            st = os.stat(path)
+            return st, file_digest(path)
+        except OSError:
+            return None
+
+    def put(self, path, kind, items, track_names, stamp, tracks=None):
+        # tracks: 次に元ファイルが変わったとき、変わったトラックだけを解析し直すための情報(JSONにできる値)
+        if stamp is None:
+            return
+        st, digest = stamp
+        items = as_item_table(items)
+        pos, length, track, rows = items.columns()
+        note = items.note_column()
+        ids = items.ids
+        if ids is not None and items.rows is not None:
+            ids = [ids[r] for r in rows.tolist()]
+        meta = {"names": track_names, "ids": ids, "note": note is not None, "tracks": tracks}
+        names = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+        body = b"".join((pos.astype("<f8").tobytes(), length.astype("<f8").tobytes(),
+                         track.astype("<i4").tobytes(), names, b"" if note is None else note.tobytes()))
+        self._write(self._entry_path(path, kind), kind, st, digest, body, len(items), len(names))
+        self.evict()
+
+    def _manifest_path(self, output, kind="manifest"):
+        key = f"{CACHE_VERSION}|{kind}|{os.path.normcase(os.path.abspath(output))}"
+        return os.path.join(self.directory, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".manifest")
+
+    def get_manifest(self, output, kind="manifest"):
+        entry = self._manifest_path(output, kind)
+        try:
+            with open(entry, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._touch(entry)
+        return manifest if isinstance(manifest, dict) else None
+
+    def put_manifest(self, output, manifest, kind="manifest"):
+        entry = self._manifest_path(output, kind)
+        tmp = entry + ".tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(json.dumps(manifest, ensure_ascii=False, separators=(",", ":")))
+            os.replace(tmp, entry)
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+        self.evict()
+
+    def _write(self, entry, kind, st, digest, body, count, names_len):
+        header = _HEADER.pack(_MAGIC, CACHE_VERSION, _KINDS[kind], st.st_size, st.st_mtime_ns, digest, count, names_len)
+        tmp = entry + ".tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp, "wb") as f:
+                f.write(header)
+                f.write(body)
+            os.replace(tmp, entry)
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    def _touch(self, entry):
+        try:
+            os.utime(entry, None)
+        except OSError:
+            pass
+
+    def evict(self):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        entries = []
+        total = 0
+        for name in names:
+            if not name.endswith(_ENTRY_EXTS):
+                continue
+            p = os.path.join(self.directory, name)
+            try:
+                st = os.stat(p)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+            total += st.st_size
+        entries.sort()
+        for _, size, p in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(p)
+                total -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            if name.endswith(_ENTRY_EXTS):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
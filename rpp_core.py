@@ -0,0 +1,2641 @@
+import os
+import sys
+import math
+import json
+import time
+import re
+import hashlib
+import dataclasses
+import functools
+import importlib.util
+from array import array
+from contextlib import contextmanager
+from rpp_cache import ParseCache, DEFAULT_CACHE_MB
+from rpp_items import ItemTable, as_item_table
+
+EffDict = {
+    "座標": [["X", 0.0], ["Y", 0.0], ["Z", 0.0]],
+    "拡大率": [["拡大率", 100.00], ["X", 100.00], ["Y", 100.00]],
+}
+
+XDict = {
+    "移動無し": "",
+    "直線移動": "直線移動",
+    "直線移動(時間制御)": "直線移動(時間制御)",
+    "補間移動": "補間移動",
+    "補間移動(時間制御)": "補間移動(時間制御)",
+}
+
+MOTION_ALIASES = {
+    "none": "移動無し",
+    "linear": "直線移動",
+    "linear_time": "直線移動(時間制御)",
+    "interpolate": "補間移動",
+    "interpolate_time": "補間移動(時間制御)",
+}
+
+PLAY_SPEED_STEPS = (
+    float(100.0 * 0.5),
+    float(math.floor(100.0 * (2.0 / 3.0))),
+    float(100.0 * 1.0),
+    float(100.0 * 2.0),
+    float(100.0 * 4.0),
+    float(100.0 * 8.0),
+)
+
+FRAME_SPEED_OVERRIDES = {
+    72: 66.0,
+    96: 100.0,
+}
+
+RPP_CHUNK_SIZE = 1 << 20
+RPP_NAME_SCAN = 1 << 16
+DEFAULT_TEMPO = 120.0
+DEFAULT_MIDI_PPQ = 960
+# 選ばれたトラックがファイルのこの割合以下なら、そのバイト範囲だけを解析する
+PARTIAL_PARSE_RATIO = 0.5
+
+OUTPUT_CHUNK_SIZE = 1 << 20
+
+PROGRESS_STEP = 1000
+
+# これより少ないオブジェクト数では、プロセスを起動するより1コアで生成した方が速い
+PARALLEL_MIN_ROWS = 20000
+EMIT_CHUNK_ROWS = 5000
+EMIT_COLUMNS = ("track", "start", "end", "speed", "count", "layer")
+
+TIMING_STAGES = ("parse", "filter", "sort", "frames", "emit", "reuse", "write")
+PROFILE_ENV = "RPPTOOBJECT_PROFILE"
+
+DEFAULT_EASING = "0|0,0,1,0"
+DEFAULT_EASING_CURVE = (0.0, 0.0, 1.0, 1.0)
+# 焼き込みでオブジェクト1つに置く中間点の上限の既定値。これより長いオブジェクトは等間隔に間引く。
+# 設定の bake_max_keys が 0 なら間引かず、1フレームごとに置く
+BAKE_MAX_KEYS = 64
+BEZIER_NEWTON_STEPS = 8
+BEZIER_BISECT_STEPS = 40
+BEZIER_EPS = 1e-7
+
+DEFAULT_SETTINGS = {
+    "input": "",
+    "output": "",
+    "source": "",
+    "fps": "60",
+    "scene_no": "1",
+    "base_len_sec": "1.0",
+    "flip_h": False,
+    "flip_v": False,
+    "loop": False,
+    "no_gap": False,
+    "as_scene": False,
+    "auto_speed": False,
+    "redzone": False,
+    "time_control": False,
+    "pack_layers": False,
+    "midi_notes": False,
+    "apply_easing": False,
+    "frame_step": "1",
+    "easing": DEFAULT_EASING,
+    "bake_easing": False,
+    "easing_curve": list(DEFAULT_EASING_CURVE),
+    "bake_max_keys": BAKE_MAX_KEYS,
+    "tracks": None,
+    "effects": [],
+    "play_speed_steps": list(PLAY_SPEED_STEPS),
+    "workers": 0,
+    "shard_minutes": 0,
+    "shard_tracks": 0,
+}
+
+LANG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "language")
+
+MIDI_EXTS = (".mid", ".midi")
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+
+
+class ConvertError(Exception):
+    def __init__(self, title, message, level="critical", **kwargs):
+        super().__init__(message)
+        self.title = title
+        self.message = message
+        self.level = level
+        self.kwargs = kwargs
+
+
+class ConvertCancelled(Exception):
+    pass
+
+
+def _check_cancel(cancel):
+    if cancel is not None and cancel.is_set():
+        raise ConvertCancelled()
+
+
+class StageTimer:
+    """変換の段階ごとの経過時間(秒)と件数を記録する"""
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+
+    @contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - t0)
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def seconds(self, name):
+        return self.stages.get(name, 0.0)
+
+    def count(self, name, n):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def total(self):
+        return sum(self.stages.values())
+
+    def as_dict(self):
+        return {"stages": dict(self.stages), "counters": dict(self.counters), "total": self.total()}
+
+
+@contextmanager
+def profile_to(path):
+    """path が指定されていれば、ブロック内をcProfileで計測して .prof を保存する"""
+    if not path:
+        yield
+        return
+    import cProfile
+
+    prof = cProfile.Profile()
+    prof.enable()
+    try:
+        yield
+    finally:
+        prof.disable()
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            prof.dump_stats(path)
+        except OSError:
+            pass
+
+
+def append_run_log(path, record):
+    try:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    except OSError:
+        pass
+
+
+def format_timings(timings):
+    stages = timings["stages"]
+    names = [n for n in TIMING_STAGES if n in stages] + [n for n in stages if n not in TIMING_STAGES]
+    return " / ".join(f"{name} {stages[name] * 1000:.0f} ms" for name in names)
+
+
+def profile_requested(setting=False):
+    value = os.environ.get(PROFILE_ENV, "").strip().lower()
+    if value:
+        return value not in ("0", "false", "no", "off")
+    return bool(setting)
+
+
+def _report(progress, stage, done, total):
+    if progress is not None:
+        progress(stage, done, total)
+
+
+def is_midi_path(path):
+    return os.path.splitext(path)[1].lower() in MIDI_EXTS
+
+
+LANG_BUNDLE = "bundle.json"
+OBJECT_LANG = "object.json"
+
+_lang_bundles = {}
+
+
+def _read_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def _lang_sources(lang_dir):
+    try:
+        names = os.listdir(lang_dir)
+    except OSError:
+        return []
+    return sorted(n for n in names if n.endswith(".json") and n != LANG_BUNDLE)
+
+
+def build_language_bundle(lang_dir=LANG_DIR):
+    # ja.json を基準に各言語を事前に合成し、object.json と合わせて1ファイルにまとめる
+    base = _read_json(os.path.join(lang_dir, "ja.json"))
+    ui = {"ja": base}
+    for name in _lang_sources(lang_dir):
+        code = name[:-5]
+        if name == OBJECT_LANG or code == "ja":
+            continue
+        merged = dict(base)
+        merged.update(_read_json(os.path.join(lang_dir, name)))
+        ui[code] = merged
+
+    obj_i18n = _read_json(os.path.join(lang_dir, OBJECT_LANG))
+    ja_pack = obj_i18n.get("ja", {})
+    obj = {}
+    for code, pack in obj_i18n.items():
+        terms = dict(ja_pack.get("terms", {}))
+        tokens = dict(ja_pack.get("tokens", {}))
+        if code != "ja":
+            terms.update(pack.get("terms", {}))
+            tokens.update(pack.get("tokens", {}))
+        obj[code] = {"terms": terms, "tokens": tokens}
+    return {"ui": ui, "object": obj}
+
+
+def write_language_bundle(lang_dir=LANG_DIR):
+    # 言語ファイルを編集したら build_language.py から実行する。起動時には書き込まない
+    path = os.path.join(lang_dir, LANG_BUNDLE)
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        json.dump(build_language_bundle(lang_dir), f, ensure_ascii=False, indent=1)
+        f.write("\n")
+    return path
+
+
+def load_language_bundle(lang_dir=LANG_DIR):
+    bundle = _lang_bundles.get(lang_dir)
+    if bundle is not None:
+        return bundle
+    # bundle.json は読むだけにする(読み取り専用の場所に置かれても動くように)。無いときはその場で合成する
+    bundle = _read_json(os.path.join(lang_dir, LANG_BUNDLE)) or build_language_bundle(lang_dir)
+    _lang_bundles[lang_dir] = bundle
+    return bundle
+
+
+def load_language(code, lang_dir=LANG_DIR):
+    ui = load_language_bundle(lang_dir).get("ui", {})
+    return dict(ui.get(code) or ui.get("ja") or {})
+
+
+def load_object_language(code, lang_dir=LANG_DIR):
+    obj = load_language_bundle(lang_dir).get("object", {})
+    pack = obj.get(code) or obj.get("ja") or {}
+    return dict(pack.get("terms", {})), dict(pack.get("tokens", {}))
+
+
+def _parse_midi_pretty(path):
+    import pretty_midi
+
+    midi = pretty_midi.PrettyMIDI(path)
+
+    pos = array("d")
+    length = array("d")
+    track = array("i")
+    ids = []
+    track_names = []
+
+    for idx, inst in enumerate(midi.instruments, 1):
+        name = inst.name.strip() if inst.name else f"Track {idx}"
+        track_names.append(name)
+        for note in inst.notes:
+            if note.end <= note.start:
+                continue
+            s_tick = int(round(midi.time_to_tick(note.start)))
+            e_tick = int(round(midi.time_to_tick(note.end)))
+            if e_tick <= s_tick:
+                e_tick = s_tick + 1
+            s = float(midi.tick_to_time(s_tick))
+            e = float(midi.tick_to_time(e_tick))
+            pos.append(s)
+            length.append(e - s)
+            track.append(idx)
+            ids.append(f"{idx}:{s_tick}:{note.pitch}")
+
+    if not track_names:
+        track_names = ["Track 1"]
+
+    return ItemTable(pos, length, track, ids), track_names
+
+
+def _read_varlen(data, i):
+    value = 0
+    while True:
+        b = data[i]
+        i += 1
+        value = (value << 7) | (b & 0x7F)
+        if b < 0x80:
+            return value, i
+
+
+def _decode_midi_text(raw):
+    for enc in ("utf-8", "cp932"):
+        try:
+            return raw.decode(enc)
+        except UnicodeDecodeError:
+            continue
+    return raw.decode("latin1")
+
+
+_SYSTEM_DATA_LEN = {0xF1: 1, 0xF2: 2, 0xF3: 1}
+
+
+def _read_smf(path):
+    # ノートのオン/オフとテンポだけを読む。楽器の区切り(トラック/チャンネル/プログラム)はpretty_midiと同じ
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:4] != b"MThd":
+        raise ValueError("not a Standard MIDI File")
+    hlen = int.from_bytes(data[4:8], "big")
+    n_tracks = int.from_bytes(data[10:12], "big")
+    division = int.from_bytes(data[12:14], "big")
+    if division & 0x8000 or division == 0:
+        raise ValueError("SMPTE time division is not supported")
+
+    tempos = []
+    instruments = {}
+    pos = 8 + hlen
+    for track_idx in range(n_tracks):
+        if data[pos:pos + 4] != b"MTrk":
+            raise ValueError("no MTrk header at start of track")
+        length = int.from_bytes(data[pos + 4:pos + 8], "big")
+        i = pos + 8
+        end = i + length
+        pos = end
+        tick = 0
+        status = 0
+        name = ""
+        program = [0] * 16
+        open_notes = {}
+        while i < end:
+            delta, i = _read_varlen(data, i)
+            tick += delta
+            b = data[i]
+            if b >= 0x80:
+                i += 1
+                if b != 0xFF:
+                    status = b
+            else:
+                if not status:
+                    raise ValueError("running status without last status")
+                b = status
+
+            if b == 0xFF:
+                meta = data[i]
+                n, i = _read_varlen(data, i + 1)
+                if meta == 0x51 and track_idx == 0:
+                    tempos.append((tick, int.from_bytes(data[i:i + 3], "big")))
+                elif meta == 0x03:
+                    name = _decode_midi_text(data[i:i + n])
+                i += n
+                continue
+            if b == 0xF0 or b == 0xF7:
+                n, i = _read_varlen(data, i)
+                i += n
+                continue
+            if b >= 0xF0:
+                i += _SYSTEM_DATA_LEN.get(b, 0)
+                continue
+
+            kind = b & 0xF0
+            ch = b & 0x0F
+            if kind == 0xC0:
+                program[ch] = data[i]
+                i += 1
+                continue
+            if kind == 0xD0:
+                i += 1
+                continue
+            note = data[i]
+            vel = data[i + 1]
+            i += 2
+            if kind == 0x90 and vel > 0:
+                open_notes.setdefault((ch, note), []).append(tick)
+            elif kind == 0x80 or kind == 0x90:
+                starts = open_notes.get((ch, note))
+                if not starts:
+                    continue
+                closing = [t for t in starts if t != tick]
+                keep = [t for t in starts if t == tick]
+                if closing:
+                    key = (program[ch], ch, track_idx)
+                    inst = instruments.get(key)
+                    if inst is None:
+                        inst = instruments[key] = (name, [], [], [])
+                    inst[1].extend(closing)
+                    inst[2].extend([tick] * len(closing))
+                    inst[3].extend([note] * len(closing))
+                if closing and keep:
+                    open_notes[(ch, note)] = keep
+                else:
+                    del open_notes[(ch, note)]
+
+    return division, tempos, list(instruments.values())
+
+
+def _tempo_map(division, tempos):
+    # (開始tick, 1tickの秒数, 開始tickの秒数) の区間表を作る
+    import numpy as np
+
+    scales = [(0, 60.0 / (120.0 * division))]
+    for tick, tempo in tempos:
+        if tick == 0:
+            bpm = 6e7 / tempo
+            scales = [(0, 60.0 / (bpm * division))]
+        else:
+            tick_scale = 60.0 / ((6e7 / tempo) * division)
+            if tick_scale != scales[-1][1]:
+                scales.append((tick, tick_scale))
+    starts = np.array([t for t, _ in scales], dtype=np.int64)
+    rates = np.array([r for _, r in scales], dtype=np.float64)
+    bases = np.zeros(len(scales), dtype=np.float64)
+    for k in range(1, len(scales)):
+        bases[k] = bases[k - 1] + rates[k - 1] * (starts[k] - starts[k - 1])
+    return starts, rates, bases
+
+
+def _ticks_to_seconds(ticks, tempo_map):
+    import numpy as np
+    starts, rates, bases = tempo_map
+    seg = np.searchsorted(starts, ticks, side="right") - 1
+    return bases[seg] + rates[seg] * (ticks - starts[seg])
+
+
+def _parse_midi_native(path):
+    import numpy as np
+
+    division, tempos, instruments = _read_smf(path)
+    tempo_map = _tempo_map(division, tempos)
+
+    pos_parts = []
+    len_parts = []
+    track_parts = []
+    id_parts = []
+    track_names = []
+    for idx, (name, s_ticks, e_ticks, pitches) in enumerate(instruments, 1):
+        track_names.append(name.strip() if name else f"Track {idx}")
+        s_ticks = np.asarray(s_ticks, dtype=np.int64)
+        s = _ticks_to_seconds(s_ticks, tempo_map)
+        e = _ticks_to_seconds(np.asarray(e_ticks, dtype=np.int64), tempo_map)
+        pos_parts.append(s)
+        len_parts.append(e - s)
+        track_parts.append(np.full(len(s), idx, dtype=np.int64))
+        # MIDIノートはトラック・開始tick・音程で識別する
+        id_parts.extend(f"{idx}:{t}:{p}" for t, p in zip(s_ticks.tolist(), pitches))
+
+    items = ItemTable.empty()
+    if pos_parts:
+        items = ItemTable(np.concatenate(pos_parts), np.concatenate(len_parts), np.concatenate(track_parts), id_parts)
+
+    if not track_names:
+        track_names = ["Track 1"]
+
+    return items, track_names
+
+
+def _parse_midi(path):
+    try:
+        return _parse_midi_native(path)
+    except (ValueError, IndexError) as e:
+        # 独自リーダーで読めない形式はpretty_midiが入っていればそちらに任せる
+        if importlib.util.find_spec("pretty_midi") is None:
+            raise e
+        return _parse_midi_pretty(path)
+
+
+def _unquote_name(raw):
+    name = raw.decode("utf-8", errors="ignore").strip()
+    if len(name) >= 2 and name[0] == name[-1] and name[0] in "\"'`":
+        name = name[1:-1]
+    return name
+
+
+def _iter_rpp_items(path, chunk_size=RPP_CHUNK_SIZE, track_names=None, on_chunk=None, spans=None,
+                    midi_notes=False, tempo=DEFAULT_TEMPO):
+    # spans: (トラック番号, 開始, 終了) のリスト。指定したときはmmapでそのバイト範囲だけを読む
+    # on_chunk には読んだバイト数を渡す
+    with open(path, "rb") as f:
+        if spans is None:
+            yield from _parse_rpp_chunks(_file_chunks(f, chunk_size, on_chunk), 0, track_names, midi_notes, tempo)
+            return
+        if not spans:
+            return
+        import mmap
+
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for track, start, end in spans:
+                chunks = _span_chunks(mm, start, end, chunk_size, on_chunk)
+                yield from _parse_rpp_chunks(chunks, track - 1, None, midi_notes, tempo)
+        finally:
+            mm.close()
+
+
+def _file_chunks(f, chunk_size, on_chunk):
+    while True:
+        chunk = f.read(chunk_size)
+        if on_chunk is not None:
+            on_chunk(len(chunk))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _span_chunks(mm, start, end, chunk_size, on_chunk):
+    for offset in range(start, end, chunk_size):
+        chunk = mm[offset:min(offset + chunk_size, end)]
+        if on_chunk is not None:
+            on_chunk(len(chunk))
+        yield chunk
+
+
+# _parse_rpp_chunks で今いるブロックの種類
+_IN_OTHER = 0
+_IN_ITEM = 1
+_IN_MIDI = 2
+_IN_TRACK = 3
+_IN_SKIP = 4
+
+
+def _parse_rpp_chunks(chunks, track, track_names, midi_notes=False, tempo=DEFAULT_TEMPO):
+    # バイト列のままチャンク単位で読み、ブロックの入れ子(TRACK/ITEM/SOURCE)を追跡する
+    # midi_notes なら <SOURCE MIDI のノートを1つずつのアイテムとして返す
+    # 行は先頭の1バイトと今いるブロックの種類で振り分け、ほとんどの行は整数の比較だけで読み飛ばす
+    stack = []
+    where = _IN_OTHER
+    item = None  # [pos, length, iguid, soffs, loop, playrate]
+    midi = None  # [ticks_per_qn, イベント行のリスト]
+    skip = 0  # 読み飛ばし中のSOURCEブロックの深さ
+    rest = b""
+    chunks = iter(chunks)
+    while True:
+        chunk = next(chunks, b"")
+        if not chunk:
+            lines = [rest]
+        else:
+            lines = (rest + chunk).split(b"\n")
+            rest = lines.pop()
+        for line in lines:
+            ls = line.strip()
+            if not ls:
+                continue
+            head = ls[0]
+            if head > 62:
+                # "<" でも ">" でもない行。読み飛ばし中のSOURCEの中身はここで捨てる
+                if where == _IN_ITEM:
+                    if head == 80:  # "P"
+                        if ls.startswith(b"POSITION"):
+                            item[0] = _line_float(ls, 8)
+                        elif midi_notes and ls.startswith(b"PLAYRATE"):
+                            try:
+                                item[5] = float(ls.split()[1]) or 1.0
+                            except (IndexError, ValueError):
+                                pass
+                    elif head == 76:  # "L"
+                        if ls.startswith(b"LENGTH"):
+                            item[1] = _line_float(ls, 6)
+                        elif midi_notes and ls.startswith(b"LOOP"):
+                            try:
+                                item[4] = ls.split()[1] != b"0"
+                            except IndexError:
+                                pass
+                    elif head == 73:  # "I"
+                        if ls.startswith(b"IGUID"):
+                            item[2] = ls[5:].strip().decode("ascii", errors="ignore") or None
+                    elif head == 83 and midi_notes and ls.startswith(b"SOFFS"):
+                        try:
+                            item[3] = float(ls.split()[1])
+                        except (IndexError, ValueError):
+                            pass
+                elif where == _IN_MIDI:
+                    # イベント行は先頭の語が E / e / Em / em のものだけ(EVTFILTER などは含めない)
+                    if head == 69 or head == 101:
+                        if len(ls) > 2 and (ls[1] == 32 or (ls[1] == 109 and ls[2] == 32)):
+                            midi[1].append(ls)
+                    elif head == 88 or head == 120:
+                        # X / x / Xm / xm はシステムエクスクルーシブなど。ノートではないが経過tickは数える
+                        if len(ls) > 2 and (ls[1] == 32 or (ls[1] == 109 and ls[2] == 32)):
+                            midi[1].append(_midi_delta_event(ls))
+                    elif head == 72 and ls.startswith(b"HASDATA"):
+                        # HASDATA 1 960 QN
+                        try:
+                            midi[0] = int(ls.split()[2])
+                        except (IndexError, ValueError):
+                            pass
+                elif where == _IN_TRACK:
+                    if head == 78 and track_names is not None and ls.startswith(b"NAME "):
+                        track_names[track - 1] = _unquote_name(ls[5:]) or f"Track {track}"
+                elif head == 84 and midi_notes and len(stack) == 1 and ls.startswith(b"TEMPO "):
+                    try:
+                        tempo = float(ls.split()[1]) or tempo
+                    except (IndexError, ValueError):
+                        pass
+            elif head == 60:  # "<"
+                if skip:
+                    # 解析しないSOURCEの中身は、ブロックの入れ子の深さだけを数える
+                    skip += 1
+                    continue
+                tag = ls[1:].split(None, 1)[0] if len(ls) > 1 else b""
+                stack.append(tag)
+                if where == _IN_MIDI:
+                    if tag in _MIDI_BLOCK_EVENTS:
+                        # <X 経過tick 0 のブロック(中身はBase64のデータ)も経過tickだけを数える
+                        midi[1].append(_midi_delta_event(ls))
+                    skip = 1
+                    where = _IN_SKIP
+                elif where == _IN_ITEM and tag == b"SOURCE":
+                    if midi_notes and midi is None and ls[7:].split(None, 1)[:1] == [b"MIDI"]:
+                        midi = [DEFAULT_MIDI_PPQ, []]
+                        where = _IN_MIDI
+                    else:
+                        skip = 1
+                        where = _IN_SKIP
+                elif tag == b"TRACK":
+                    track += 1
+                    if track_names is not None:
+                        track_names.append(f"Track {track}")
+                    where = _IN_TRACK
+                elif tag == b"ITEM":
+                    item = [None, None, None, 0.0, False, 1.0]
+                    midi = None
+                    where = _IN_ITEM
+                else:
+                    where = _IN_OTHER
+            elif head == 62 and ls == b">":
+                if skip:
+                    skip -= 1
+                    if skip:
+                        continue
+                tag = stack.pop() if stack else None
+                if tag == b"ITEM" and item is not None:
+                    if midi is not None and midi[1]:
+                        yield from _midi_item_notes(item, track, midi, tempo)
+                    else:
+                        yield item[0], item[1], track, item[2], False
+                    item = None
+                    midi = None
+                where = _block_kind(stack, item, midi)
+        if not chunk:
+            break
+
+
+_MIDI_BLOCK_EVENTS = (b"X", b"x", b"Xm", b"xm")
+
+
+def _midi_delta_event(ls):
+    # ノート以外のイベントを、経過tickだけを持つ E 行(ステータス 00)に置き換える
+    parts = ls.split(None, 2)
+    return b"E " + (parts[1] if len(parts) > 1 else b"0") + b" 00 00 00"
+
+
+def _block_kind(stack, item, midi):
+    # ブロックを閉じた後に戻る先の種類
+    if not stack:
+        return _IN_OTHER
+    tag = stack[-1]
+    if tag == b"ITEM":
+        return _IN_ITEM if item is not None else _IN_OTHER
+    if tag == b"SOURCE" and midi is not None:
+        return _IN_MIDI
+    if tag == b"TRACK":
+        return _IN_TRACK
+    return _IN_OTHER
+
+
+def _line_float(ls, start):
+    # "POSITION 1.5" の値。値が1つだけの行は split せずにそのまま変換する
+    try:
+        return float(ls[start:])
+    except ValueError:
+        try:
+            return float(ls.split()[1])
+        except (IndexError, ValueError):
+            return None
+
+
+def _decode_rpp_midi(lines):
+    """<SOURCE MIDI の E/e 行をまとめて数値にし、ノートの (開始tick, 終了tick, 音程) とソースの長さ(tick)を返す。
+    行は "E <前のイベントからのtick> <ステータス> <データ1> <データ2>"(値は16進)"""
+    import numpy as np
+
+    tokens = b" ".join(lines).split()
+    if len(tokens) != len(lines) * 5:
+        tokens = [t for line in lines for t in (line.split() + [b"00"] * 4)[:5]]
+    ticks = np.cumsum(np.array(tokens[1::5], dtype=np.int64))
+    status = np.frombuffer(bytes.fromhex(b"".join(tokens[2::5]).decode("ascii")), dtype=np.uint8)
+    data1 = np.frombuffer(bytes.fromhex(b"".join(tokens[3::5]).decode("ascii")), dtype=np.uint8)
+    data2 = np.frombuffer(bytes.fromhex(b"".join(tokens[4::5]).decode("ascii")), dtype=np.uint8)
+    src_end = int(ticks[-1]) if len(ticks) else 0
+
+    kind = status & 0xF0
+    is_on = (kind == 0x90) & (data2 > 0)
+    is_note = is_on | (kind == 0x80) | (kind == 0x90)
+    note_idx = np.flatnonzero(is_note)
+
+    # 同じチャンネル・音程の発音は先に鳴ったものから止める
+    key_l = ((status[note_idx] & 0x0F).astype(np.int64) * 128 + data1[note_idx]).tolist()
+    on_l = is_on[note_idx].tolist()
+    tick_l = ticks[note_idx].tolist()
+    pitch_l = data1[note_idx].tolist()
+    open_notes = {}
+    starts = []
+    ends = []
+    pitches = []
+    for key, on, tick, pitch in zip(key_l, on_l, tick_l, pitch_l):
+        if on:
+            open_notes.setdefault(key, []).append((tick, pitch))
+            continue
+        pending = open_notes.get(key)
+        if pending:
+            s_tick, p = pending.pop(0)
+            starts.append(s_tick)
+            ends.append(tick)
+            pitches.append(p)
+    for pending in open_notes.values():
+        for s_tick, p in pending:
+            starts.append(s_tick)
+            ends.append(max(src_end, s_tick))
+            pitches.append(p)
+    return (np.asarray(starts, dtype=np.int64), np.asarray(ends, dtype=np.int64),
+            np.asarray(pitches, dtype=np.int64), src_end)
+
+
+def _midi_item_notes(item, track, midi, tempo):
+    """アイテムの位置・SOFFS・ループ・再生速度に合わせて、ソース内のノートをプロジェクト上の (pos, length) に置く"""
+    import numpy as np
+
+    pos, length, iguid, soffs, loop, rate = item
+    if pos is None or length is None or length <= 0:
+        return
+    ppq, lines = midi
+    try:
+        s_tick, e_tick, pitch, src_end = _decode_rpp_midi(lines)
+    except (ValueError, IndexError):
+        # 読めないイベント列は、これまで通りアイテム1つとして扱う
+        yield pos, length, track, iguid, False
+        return
+    # テンポはプロジェクトの TEMPO 行の値で一定とみなす
+    sec_per_tick = 60.0 / (tempo * max(ppq, 1))
+    s = s_tick * sec_per_tick
+    e = e_tick * sec_per_tick
+    src_len = src_end * sec_per_tick
+    span = length * rate
+    first, last = 0, 1
+    if loop and src_len > 0:
+        first = int(math.floor(soffs / src_len))
+        last = int(math.ceil((soffs + span) / src_len))
+    base = iguid or f"{track}@{pos!r}"
+    for k in range(first, last):
+        shift = k * src_len - soffs
+        t0 = s + shift
+        t1 = np.minimum(e + shift, span)
+        visible = np.flatnonzero((t0 >= 0) & (t0 < span) & (t1 > t0))
+        rows = zip(t0[visible].tolist(), t1[visible].tolist(), s_tick[visible].tolist(), pitch[visible].tolist())
+        for a, b, tick, p in rows:
+            yield pos + a / rate, (b - a) / rate, track, f"{base}:{k}:{tick}:{p}", True
+
+
+_RPP_BLOCK_RE = re.compile(rb"<(TRACK|ITEM)(?=\s)")
+
+
+@dataclasses.dataclass(frozen=True)
+class TrackIndex:
+    """RPPの <TRACK ブロックごとのバイト範囲・名前・アイテム数"""
+    path: str
+    size: int
+    mtime_ns: int
+    names: tuple
+    spans: tuple
+    item_counts: tuple
+    tempo: float = DEFAULT_TEMPO
+
+    def is_current(self, st):
+        return st.st_size == self.size and st.st_mtime_ns == self.mtime_ns
+
+    def select(self, tracks):
+        # (トラック番号, 開始, 終了) をファイル内の順に
+        return [(t, *self.spans[t - 1]) for t in sorted(tracks) if 1 <= t <= len(self.spans)]
+
+    def selected_bytes(self, tracks):
+        return sum(end - start for _, start, end in self.select(tracks))
+
+
+def scan_rpp_tracks(path, cancel=None):
+    """ファイルをmmapして1回だけ走査し、各トラックのバイト範囲・名前・アイテム数を記録する。
+    アイテムの中身は解析しない"""
+    import mmap
+    import numpy as np
+
+    try:
+        st = os.stat(path)
+        f = open(path, "rb")
+    except OSError as e:
+        raise ConvertError("error_read", str(e))
+    track_starts = []
+    item_starts = []
+    names = []
+    with f:
+        if st.st_size == 0:
+            return TrackIndex(path, st.st_size, st.st_mtime_ns, (), (), ())
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for n, m in enumerate(_RPP_BLOCK_RE.finditer(mm)):
+                if n % PROGRESS_STEP == 0:
+                    _check_cancel(cancel)
+                start = mm.rfind(b"\n", 0, m.start()) + 1
+                # 行頭(インデントのみ)の "<TRACK" / "<ITEM" だけをブロックとして数える
+                if mm[start:m.start()].strip():
+                    continue
+                if m.group(1) == b"TRACK":
+                    track_starts.append(start)
+                else:
+                    item_starts.append(start)
+            ends = track_starts[1:] + [len(mm)]
+            for k, (start, end) in enumerate(zip(track_starts, ends), 1):
+                names.append(_track_block_name(mm, start, end) or f"Track {k}")
+            tempo = _project_tempo(mm, track_starts[0] if track_starts else min(len(mm), RPP_NAME_SCAN))
+        finally:
+            mm.close()
+
+    n_tracks = len(track_starts)
+    counts = np.zeros(n_tracks + 1, dtype=np.int64)
+    if item_starts:
+        owner = np.searchsorted(np.asarray(track_starts, dtype=np.int64), item_starts, side="right")
+        counts = np.bincount(owner, minlength=n_tracks + 1)
+    return TrackIndex(path, st.st_size, st.st_mtime_ns, tuple(names),
+                      tuple(zip(track_starts, ends)), tuple(counts[1:].tolist()), tempo)
+
+
+def _project_tempo(mm, end):
+    # トラックより前に書かれる "TEMPO 120 4 4"
+    for line in mm[:end].split(b"\n"):
+        ls = line.strip()
+        if ls.startswith(b"TEMPO "):
+            try:
+                return float(ls.split()[1]) or DEFAULT_TEMPO
+            except (IndexError, ValueError):
+                break
+    return DEFAULT_TEMPO
+
+
+def _track_block_name(mm, start, end):
+    # NAME は <TRACK の直後、入れ子のブロックより前に書かれる
+    head = mm[start:min(end, start + RPP_NAME_SCAN)].split(b"\n")
+    for line in head[1:]:
+        ls = line.strip()
+        if ls.startswith(b"<"):
+            break
+        if ls.startswith(b"NAME "):
+            return _unquote_name(ls[5:])
+    return None
+
+
+def load_midi(path, cache=None, progress=None, cancel=None):
+    if cache is not None:
+        hit = cache.get(path, "midi")
+        if hit is not None:
+            return hit
+        stamp = cache.stamp(path)
+    _report(progress, "parse", 0, 0)
+    try:
+        items, track_names = _parse_midi(path)
+    except Exception as e:
+        raise ConvertError("error_midi_read", str(e))
+    _check_cancel(cancel)
+    if cache is not None:
+        cache.put(path, "midi", items, track_names, stamp)
+    return items, track_names
+
+
+def load_rpp(path, cache=None, progress=None, cancel=None, midi_notes=False):
+    kind = _rpp_kind(midi_notes)
+    if cache is not None:
+        hit = cache.get(path, kind)
+        if hit is not None:
+            return hit
+        return _load_rpp_changed(path, cache, kind, progress, cancel, midi_notes)
+    track_names = []
+    try:
+        total = os.path.getsize(path)
+        items = _collect_rpp_items(_iter_rpp_items(path, track_names=track_names, midi_notes=midi_notes,
+                                                   on_chunk=_parse_progress(total, progress, cancel)))
+    except ConvertCancelled:
+        raise
+    except Exception as e:
+        raise ConvertError("error_read", str(e))
+    return items, track_names
+
+
+def _load_rpp_changed(path, cache, kind, progress, cancel, midi_notes):
+    """キャッシュと元ファイルが違うとき、トラックごとのバイト列のハッシュを前回と比べ、
+    変わったトラック(とトラックより前の部分)だけを解析して、残りは前回の解析結果を使う"""
+    import mmap
+
+    stamp = cache.stamp(path)
+    previous = cache.get_previous(path, kind)
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return ItemTable.empty(), []
+            # ハッシュと解析は同じmmapから行い、途中で保存されても食い違わないようにする
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                spans = _rpp_track_spans(mm)
+                digests = [hashlib.sha1(mm[start:end]).hexdigest() for start, end in spans[1:]]
+                names = [_track_block_name(mm, start, end) or f"Track {t}"
+                         for t, (start, end) in enumerate(spans[1:], 1)]
+                tempo = _project_tempo(mm, spans[0][1] if len(spans) > 1 else min(len(mm), RPP_NAME_SCAN))
+                reuse = _reusable_tracks(previous, digests, tempo, midi_notes)
+
+                # 変わったトラックが続く範囲はまとめて解析する。トラックより前の部分は毎回解析する
+                runs = []  # [先頭のトラック番号, 開始, 終了, 流用する前回のトラック番号 or None]
+                for t, (start, end) in enumerate(spans):
+                    old_track = reuse.get(t)
+                    if old_track is None and runs and runs[-1][3] is None:
+                        runs[-1][2] = end
+                    else:
+                        runs.append([t, start, end, old_track])
+                total = sum(end - start for _, start, end, old_track in runs if old_track is None)
+                on_chunk = _parse_progress(total, progress, cancel)
+                parts = []
+                for t, start, end, old_track in runs:
+                    if old_track is not None:
+                        parts.append(_track_rows(previous[0], old_track, t))
+                        continue
+                    chunks = _span_chunks(mm, start, end, RPP_CHUNK_SIZE, on_chunk)
+                    rows = _parse_rpp_chunks(chunks, max(t - 1, 0), None, midi_notes, tempo)
+                    parts.append(_collect_rpp_items(rows))
+            finally:
+                mm.close()
+    except ConvertCancelled:
+        raise
+    except Exception as e:
+        raise ConvertError("error_read", str(e))
+
+    items = _concat_items(parts)
+    cache.put(path, kind, items, names, stamp, tracks={"digests": digests, "tempo": tempo})
+    return items, names
+
+
+def _rpp_track_spans(mm):
+    # 行頭(インデントのみ)の "<TRACK" で区切ったバイト範囲。先頭はトラックより前(プロジェクトの設定)の部分。
+    # 末尾のプロジェクトを閉じる ">" の行は含めない(トラックを足しても最後のトラックが変わったことにならないように)
+    starts = [0]
+    at = mm.find(b"<TRACK")
+    while at >= 0:
+        line = mm.rfind(b"\n", 0, at) + 1
+        if not mm[line:at].strip() and mm[at + 6:at + 7].isspace():
+            starts.append(line)
+        at = mm.find(b"<TRACK", at + 6)
+    end = len(mm)
+    close = mm.rfind(b">")
+    if close > starts[-1] and not mm[close + 1:].strip():
+        line = mm.rfind(b"\n", 0, close) + 1
+        if not mm[line:close].strip():
+            end = line
+    return list(zip(starts, starts[1:] + [end]))
+
+
+def _reusable_tracks(previous, digests, tempo, midi_notes):
+    # {今のトラック番号: 前回のトラック番号}。バイト列が同じトラックは前回の解析結果が使える。
+    # MIDIのノートはテンポで位置が変わり、IGUIDの無いノートの識別子にはトラック番号が入るので、
+    # その場合はテンポと番号も同じものに限る
+    if previous is None or not previous[2]:
+        return {}
+    old = previous[2]
+    if midi_notes and old.get("tempo") != tempo:
+        return {}
+    by_digest = {}
+    for t, digest in enumerate(old.get("digests") or (), 1):
+        by_digest.setdefault(digest, []).append(t)
+    reuse = {}
+    for t, digest in enumerate(digests, 1):
+        candidates = by_digest.get(digest)
+        if not candidates:
+            continue
+        if midi_notes:
+            if t in candidates:
+                candidates.remove(t)
+                reuse[t] = t
+        else:
+            reuse[t] = candidates.pop(0)
+    return reuse
+
+
+def _track_rows(items, old_track, track):
+    # 前回の解析結果から1トラック分の行を取り出し、トラック番号を付け替える
+    import numpy as np
+
+    # 解析結果の行はファイル内の順なので、トラック番号は昇順に並んでいる
+    a, b = np.searchsorted(items.track, [old_track, old_track + 1])
+    ids = items.ids[a:b] if items.ids is not None else None
+    note = items.note[a:b] if items.note is not None else None
+    return ItemTable(items.pos[a:b], items.length[a:b], np.full(b - a, track, dtype=np.int32), ids, note=note)
+
+
+def _concat_items(parts):
+    import numpy as np
+
+    if not parts:
+        return ItemTable.empty()
+    if len(parts) == 1:
+        return parts[0]
+    ids = None
+    if any(p.ids is not None for p in parts):
+        ids = []
+        for p in parts:
+            ids.extend(p.ids if p.ids is not None else [None] * len(p))
+    note = None
+    if any(p.note is not None for p in parts):
+        note = np.concatenate([p.note if p.note is not None else np.zeros(len(p), dtype=bool) for p in parts])
+    return ItemTable(np.concatenate([p.pos for p in parts]), np.concatenate([p.length for p in parts]),
+                     np.concatenate([p.track for p in parts]), ids, note=note)
+
+
+def _rpp_kind(midi_notes):
+    # MIDIをノートに分けたかどうかで解析結果が変わるので、キャッシュは別に持つ
+    return "rpp_notes" if midi_notes else "rpp"
+
+
+def load_rpp_tracks(path, tracks, index=None, progress=None, cancel=None, midi_notes=False):
+    """索引のバイト範囲を使い、選ばれたトラックのブロックだけを解析する"""
+    if index is None:
+        index = scan_rpp_tracks(path, cancel)
+    spans = index.select(tracks)
+    try:
+        on_chunk = _parse_progress(index.selected_bytes(tracks), progress, cancel)
+        items = _collect_rpp_items(_iter_rpp_items(path, on_chunk=on_chunk, spans=spans,
+                                                   midi_notes=midi_notes, tempo=index.tempo))
+    except ConvertCancelled:
+        raise
+    except Exception as e:
+        raise ConvertError("error_read", str(e))
+    return items, list(index.names)
+
+
+def _parse_progress(total, progress, cancel):
+    done = 0
+
+    def on_chunk(n):
+        nonlocal done
+        done += n
+        _check_cancel(cancel)
+        _report(progress, "parse", done, total)
+
+    return on_chunk
+
+
+def _collect_rpp_items(rows):
+    # rows: (pos, length, track, iguid, MIDIアイテムから分けたノートか)
+    pos = array("d")
+    length = array("d")
+    track = array("i")
+    note = array("b")
+    ids = []
+    for p, l, t, i, is_note in rows:
+        if p is None or l is None:
+            continue
+        if l <= 0:
+            continue
+        pos.append(p)
+        length.append(l)
+        track.append(t)
+        note.append(is_note)
+        ids.append(i)
+    return ItemTable(pos, length, track, ids if any(ids) else None, note=note if any(note) else None)
+
+
+def load_project(path, cache=None, progress=None, cancel=None, midi_notes=False):
+    if is_midi_path(path):
+        return load_midi(path, cache, progress, cancel)
+    return load_rpp(path, cache, progress, cancel, midi_notes)
+
+
+def open_project(path, cache=None, progress=None, cancel=None, midi_notes=False):
+    # 解析中に保存された場合でも次回確実に再解析されるよう、先にstatを取る
+    try:
+        st = os.stat(path)
+    except OSError as e:
+        raise ConvertError("error_read", str(e))
+    is_midi = is_midi_path(path)
+    hit = cache.get(path, _rpp_kind(midi_notes)) if cache is not None and not is_midi else None
+    index = None
+    if is_midi or hit is not None:
+        items, track_names = hit or load_project(path, cache, progress, cancel)
+    else:
+        # RPPはトラックの索引だけ作り、アイテムの解析は出力時に選ばれたトラックの分だけ行う
+        index = scan_rpp_tracks(path, cancel)
+        items = None
+        track_names = list(index.names)
+    return {
+        "path": path,
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "is_midi": is_midi,
+        "midi_notes": midi_notes,
+        "items": items,
+        "index": index,
+        "track_names": track_names
+    }
+
+
+def project_is_current(project, path, midi_notes=False):
+    if not project or project["path"] != path:
+        return False
+    if not project["is_midi"] and project["items"] is not None and project["midi_notes"] != midi_notes:
+        return False
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    return st.st_size == project["size"] and st.st_mtime_ns == project["mtime_ns"]
+
+
+@dataclasses.dataclass(frozen=True)
+class EffectParam:
+    kind: str
+    name: str
+    start: str = ""
+    end: str = ""
+    method: str = ""
+    value: bool = False
+
+
+@dataclasses.dataclass(frozen=True)
+class Effect:
+    name: str
+    params: tuple
+
+
+@dataclasses.dataclass(frozen=True)
+class RunConfig:
+    input: str
+    output: str
+    source: str
+    fps: float
+    scene_no: str
+    base_len_sec: float
+    flip_h: bool
+    flip_v: bool
+    loop: bool
+    no_gap: bool
+    as_scene: bool
+    auto_speed: bool
+    redzone: bool
+    time_control: bool
+    pack_layers: bool
+    midi_notes: bool
+    apply_easing: bool
+    frame_step: str
+    easing: str
+    tracks: frozenset
+    effects: tuple
+    play_speed_steps: tuple
+    workers: int = 1
+    shard_minutes: float = 0.0
+    shard_tracks: int = 0
+    bake_easing: bool = False
+    easing_curve: tuple = DEFAULT_EASING_CURVE
+    bake_max_keys: int = BAKE_MAX_KEYS
+
+
+def _freeze_effects(effects):
+    frozen = []
+    for eff in effects or ():
+        params = []
+        for p in eff["params"]:
+            if p["type"] == "cb":
+                params.append(EffectParam("cb", p["name"], value=bool(p.get("value"))))
+                continue
+            start, end = str(p["start"]), str(p["end"])
+            method = _motion_key(p.get("method"))
+            try:
+                float(start)
+                float(end)
+                if method not in XDict:
+                    raise ValueError
+            except:
+                raise ConvertError("error_number", "msg_invalid_value", level="warning", name=p["name"])
+            params.append(EffectParam("motion", p["name"], start, end, method))
+        frozen.append(Effect(eff["name"], tuple(params)))
+    return tuple(frozen)
+
+
+def normalize_settings(settings, need_output=False):
+    if isinstance(settings, RunConfig):
+        if need_output and not settings.output:
+            raise ConvertError("error_input", "msg_need_output", level="warning")
+        return settings
+
+    cfg = dict(DEFAULT_SETTINGS)
+    cfg.update(settings or {})
+
+    path_in = str(cfg["input"] or "").strip()
+    path_out = str(cfg["output"] or "").strip()
+
+    if not path_in:
+        raise ConvertError("error_input", "msg_need_rpp_midi", level="warning")
+    if not os.path.exists(path_in):
+        raise ConvertError("error_file", "msg_rpp_midi_not_found")
+    if need_output and not path_out:
+        raise ConvertError("error_input", "msg_need_output", level="warning")
+
+    try:
+        fps = float(str(cfg["fps"]).strip() or "60")
+        if fps <= 0:
+            raise ValueError
+    except:
+        raise ConvertError("error_number", "msg_fps_gt0")
+
+    try:
+        base_s = float(cfg["base_len_sec"] or 1.0)
+        if base_s <= 0:
+            raise ValueError
+    except:
+        raise ConvertError("error_number", "msg_base_gt0")
+
+    tracks = None
+    if cfg["tracks"] is not None:
+        tracks = frozenset(cfg["tracks"])
+        if not tracks:
+            raise ConvertError("error_track_unselected", "msg_need_track", level="warning")
+
+    steps = tuple(float(v) for v in (cfg["play_speed_steps"] or ()) if float(v) > 0)
+
+    try:
+        workers = int(cfg["workers"] or 0)
+    except (TypeError, ValueError):
+        workers = 0
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+
+    try:
+        shard_minutes = float(cfg["shard_minutes"] or 0)
+        shard_tracks = int(cfg["shard_tracks"] or 0)
+        if shard_minutes < 0 or shard_tracks < 0 or (shard_minutes and shard_tracks):
+            raise ValueError
+    except (TypeError, ValueError):
+        raise ConvertError("error_number", "msg_shard_invalid")
+
+    try:
+        curve = tuple(float(v) for v in cfg["easing_curve"] or DEFAULT_EASING_CURVE)
+        if len(curve) != 4 or not all(math.isfinite(v) for v in curve):
+            raise ValueError
+        if not (0.0 <= curve[0] <= 1.0 and 0.0 <= curve[2] <= 1.0):
+            raise ValueError
+    except (TypeError, ValueError):
+        raise ConvertError("error_number", "msg_easing_invalid")
+
+    try:
+        bake_max_keys = int(cfg["bake_max_keys"])
+        if bake_max_keys < 0 or bake_max_keys == 1:
+            raise ValueError
+    except (TypeError, ValueError):
+        raise ConvertError("error_number", "msg_bake_keys_invalid")
+
+    return RunConfig(
+        input=path_in,
+        output=path_out,
+        source=str(cfg["source"] or "").strip(),
+        fps=fps,
+        scene_no=str(cfg["scene_no"]),
+        base_len_sec=base_s,
+        flip_h=bool(cfg["flip_h"]),
+        flip_v=bool(cfg["flip_v"]),
+        loop=bool(cfg["loop"]),
+        no_gap=bool(cfg["no_gap"]),
+        as_scene=bool(cfg["as_scene"]),
+        auto_speed=bool(cfg["auto_speed"]),
+        redzone=bool(cfg["redzone"]),
+        time_control=bool(cfg["time_control"]),
+        pack_layers=bool(cfg["pack_layers"]),
+        midi_notes=bool(cfg["midi_notes"]),
+        apply_easing=bool(cfg["apply_easing"]),
+        frame_step=str(cfg["frame_step"]),
+        easing=cfg["easing"] or DEFAULT_EASING,
+        tracks=tracks,
+        effects=_freeze_effects(cfg["effects"]),
+        play_speed_steps=steps or tuple(PLAY_SPEED_STEPS),
+        workers=workers,
+        shard_minutes=shard_minutes,
+        shard_tracks=shard_tracks,
+        bake_easing=bool(cfg["bake_easing"]),
+        easing_curve=curve,
+        bake_max_keys=bake_max_keys
+    )
+
+
+def _quantize_speed(speed, steps):
+    # min(steps, key=lambda v: abs(v - speed)) と同じ結果(同距離なら先に書かれた段階)をsearchsortedで求める
+    import numpy as np
+
+    values, first = np.unique(np.asarray(steps, dtype=np.float64), return_index=True)
+    hi = np.searchsorted(values, speed)
+    lo = np.clip(hi - 1, 0, len(values) - 1)
+    hi = np.clip(hi, 0, len(values) - 1)
+    d_lo = np.abs(values[lo] - speed)
+    d_hi = np.abs(values[hi] - speed)
+    pick_hi = (d_hi < d_lo) | ((d_hi == d_lo) & (first[hi] < first[lo]))
+    return values[np.where(pick_hi, hi, lo)]
+
+
+def _snap_no_gap(track, start, dur, keep, dedup):
+    # 前のオブジェクトの終端に依存するため、トラック毎の逐次処理が必要
+    # dedup: 重複を除く対象の行のbool列(無ければ None)
+    import numpy as np
+
+    dedup_l = dedup.tolist() if dedup is not None else None
+    track_l = track.tolist()
+    start_l = start.tolist()
+    dur_l = dur.tolist()
+    keep_l = keep.tolist()
+    last_track = None
+    last_end = None
+    seen = set()
+    for i in range(len(track_l)):
+        if not keep_l[i]:
+            continue
+        t = track_l[i]
+        s = start_l[i]
+        if t != last_track:
+            last_track = t
+            last_end = None
+        elif abs(s - (last_end + 1)) < 5:
+            s = last_end + 1
+        e = s + dur_l[i] - 1
+        if dedup_l is not None and dedup_l[i]:
+            key = (t, s, e)
+            if key in seen:
+                keep_l[i] = False
+                continue
+            seen.add(key)
+        last_end = e
+        start_l[i] = s
+    return np.asarray(start_l, dtype=np.int64), np.asarray(keep_l, dtype=bool)
+
+
+def sort_items(items):
+    import numpy as np
+
+    items = as_item_table(items)
+    pos, length, track, rows = items.columns()
+    note = items.note_column()
+    order = np.lexsort((pos, track))
+    return pos[order], length[order], track[order], rows[order], None if note is None else note[order]
+
+
+def frame_math(columns, cfg, is_midi):
+    import numpy as np
+
+    pos, length, track, order, note = columns
+    n = len(pos)
+
+    # 同じノートをまとめる対象は、MIDIファイルなら全行、RPPならMIDIアイテムから分けたノートの行(行ごとの印)。
+    # 重なりをレイヤーに分けるときは和音の同時ノートも残す
+    dedup = None
+    if n and not cfg.pack_layers:
+        if is_midi:
+            dedup = np.ones(n, dtype=bool)
+        elif note is not None and note.any():
+            dedup = note
+    if dedup is not None:
+        # 同じトラックで開始・長さが全く同じノートは最初の1つだけにし、通し番号にも数えない
+        cand = np.flatnonzero(dedup)
+        keys = np.stack((track[cand].astype(np.float64), pos[cand], length[cand]), axis=1)
+        _, first_same = np.unique(keys, axis=0, return_index=True)
+        if len(first_same) < len(cand):
+            rows = ~dedup
+            rows[cand[first_same]] = True
+            rows = np.flatnonzero(rows)
+            pos, length, track, order, dedup = pos[rows], length[rows], track[rows], order[rows], dedup[rows]
+            n = len(pos)
+
+    # トラック内での通し番号(1始まり)。スキップされるアイテムも数える
+    idx = np.arange(n)
+    first = np.zeros(n, dtype=np.int64)
+    if n:
+        head = np.ones(n, dtype=bool)
+        head[1:] = track[1:] != track[:-1]
+        first = np.maximum.accumulate(np.where(head, idx, 0))
+    count = idx - first + 1
+
+    fps = cfg.fps
+    start = np.rint(pos * fps).astype(np.int64)
+    dur = np.rint(length * fps).astype(np.int64)
+    keep = dur >= 1
+
+    if cfg.no_gap:
+        start, keep = _snap_no_gap(track, start, dur, keep, dedup)
+    elif dedup is not None and (keep & dedup).any():
+        kept = np.flatnonzero(keep & dedup)
+        keys = np.stack((track[kept], start[kept], dur[kept]), axis=1)
+        _, first_kept = np.unique(keys, axis=0, return_index=True)
+        keep = keep.copy()
+        keep[kept] = False
+        keep[kept[first_kept]] = True
+
+    end = start + dur - 1
+
+    speed = np.full(n, 100.0)
+    if cfg.auto_speed:
+        pos_len = length > 0
+        speed[pos_len] = cfg.base_len_sec / length[pos_len] * 100.0
+    speed = _quantize_speed(speed, cfg.play_speed_steps)
+    for frames, value in FRAME_SPEED_OVERRIDES.items():
+        speed[dur == frames] = value
+
+    track = track[keep]
+    start = start[keep]
+    end = end[keep]
+    layer = track.astype(np.int64)
+    if cfg.pack_layers:
+        layer = _layer_bands(track, _pack_layers(track, start, end))
+
+    return {
+        "track": track,
+        "start": start,
+        "end": end,
+        "speed": speed[keep],
+        "count": count[keep],
+        "layer": layer,
+        "row": order[keep]
+    }
+
+
+def _pack_layers(track, start, end):
+    """トラック毎に、重なるオブジェクトを空いている一番下のサブレイヤー(0始まり)に割り当てる。
+    開始順に走査し、使用中のサブレイヤーを終了フレームのヒープ、空いたものを番号のヒープで持つ"""
+    import heapq
+    import numpy as np
+
+    order = np.lexsort((start, track))
+    track_l = track[order].tolist()
+    start_l = start[order].tolist()
+    end_l = end[order].tolist()
+    sub = [0] * len(order)
+    last_track = None
+    busy = []
+    free = []
+    used = 0
+    for k in range(len(order)):
+        if track_l[k] != last_track:
+            last_track = track_l[k]
+            busy = []
+            free = []
+            used = 0
+        s = start_l[k]
+        while busy and busy[0][0] < s:
+            heapq.heappush(free, heapq.heappop(busy)[1])
+        if free:
+            layer = heapq.heappop(free)
+        else:
+            layer = used
+            used += 1
+        heapq.heappush(busy, (end_l[k], layer))
+        sub[k] = layer
+
+    result = np.empty(len(order), dtype=np.int64)
+    result[order] = sub
+    return result
+
+
+def _layer_bands(track, sub):
+    # トラック毎に使うサブレイヤー数だけ帯をずらす。オブジェクトの無いトラックも1段分空けるので、
+    # 重なりが無ければ元の「レイヤー = トラック番号」と同じになる
+    import numpy as np
+
+    if not len(track):
+        return track.astype(np.int64)
+    width = np.ones(int(track.max()) + 1, dtype=np.int64)
+    np.maximum.at(width, track, sub + 1)
+    width[0] = 0
+    base = np.cumsum(width) - width + 1
+    return base[track] + sub
+
+
+def compute_frames(items, cfg, is_midi):
+    return frame_math(sort_items(items), cfg, is_midi)
+
+
+def _motion_key(method):
+    method = method or "移動無し"
+    return MOTION_ALIASES.get(method, method)
+
+
+def bezier_ease(curve, x):
+    """(0,0)-(x1,y1)-(x2,y2)-(1,1) の3次ベジェで、横軸 x (0〜1の配列) に対する縦軸の値を返す。
+    媒介変数はニュートン法で求め、収束しなかった要素だけ二分法で求め直す"""
+    import numpy as np
+
+    x1, y1, x2, y2 = curve
+    x = np.clip(np.asarray(x, dtype=np.float64), 0.0, 1.0)
+    cx = 3.0 * x1
+    bx = 3.0 * (x2 - x1) - cx
+    ax = 1.0 - cx - bx
+
+    def _x(t):
+        return ((ax * t + bx) * t + cx) * t
+
+    t = x.copy()
+    for _ in range(BEZIER_NEWTON_STEPS):
+        d = (3.0 * ax * t + 2.0 * bx) * t + cx
+        ok = np.abs(d) > 1e-6
+        t = np.where(ok, t - (_x(t) - x) / np.where(ok, d, 1.0), t)
+    t = np.clip(t, 0.0, 1.0)
+
+    # x(t) は 0〜1 で単調増加なので、二分法なら必ず収束する
+    bad = np.flatnonzero(np.abs(_x(t) - x) > BEZIER_EPS)
+    if len(bad):
+        lo = np.zeros(len(bad))
+        hi = np.ones(len(bad))
+        target = x[bad]
+        for _ in range(BEZIER_BISECT_STEPS):
+            mid = (lo + hi) * 0.5
+            low = _x(mid) < target
+            lo = np.where(low, mid, lo)
+            hi = np.where(low, hi, mid)
+        t[bad] = (lo + hi) * 0.5
+
+    cy = 3.0 * y1
+    by = 3.0 * (y2 - y1) - cy
+    ay = 1.0 - cy - by
+    return ((ay * t + by) * t + cy) * t
+
+
+@functools.lru_cache(maxsize=4096)
+def _easing_keys(curve, length, max_keys=BAKE_MAX_KEYS):
+    # 長さ length フレームのオブジェクトに置く中間点(先頭からのフレーム数)と、そこでの進み具合 0〜1
+    import numpy as np
+
+    if length < 1:
+        return (0, length), np.array([0.0, 1.0])
+    n = min(length + 1, max_keys) if max_keys else length + 1
+    offsets = np.unique(np.round(np.linspace(0, length, n)).astype(np.int64))
+    return tuple(offsets.tolist()), bezier_ease(curve, offsets / length)
+
+
+def _bake_keys(bake, length):
+    # 長さごとの (中間点, 効果パラメータ毎の値, 時間制御の位置(偶数回目, 奇数回目))
+    offsets, ratio = _easing_keys(bake["curve"], length, bake["max_keys"])
+    ratio = ratio.tolist()
+    values = tuple(
+        ",".join([f"{start + (end - start) * r:.2f}" for r in ratio]) + f",{motion},0"
+        for start, end, motion in bake["params"]
+    )
+    position = {
+        even: ",".join([f"{(1.0 - r if even else r) * 100.0:.3f}" for r in ratio]) + ",直線移動(時間制御),0"
+        for even in (False, True)
+    }
+    return offsets, values, position
+
+
+def compile_templates(cfg, obj_lang="ja"):
+    # 実行中に変わらない部分を事前に整形し、オブジェクト毎には番号・フレーム・レイヤー・速度だけを埋める
+    terms, tokens = load_object_language(obj_lang)
+
+    def _obj(key):
+        return terms.get(key, key)
+
+    def _obj_text(text):
+        return tokens.get(text, text)
+
+    def _esc(text):
+        return str(text).replace("{", "{{").replace("}", "}}")
+
+    motion_names = {
+        "": "motion.none",
+        "直線移動": "motion.linear",
+        "直線移動(時間制御)": "motion.linear_time",
+        "補間移動": "motion.interpolate",
+        "補間移動(時間制御)": "motion.interpolate_time"
+    }
+
+    bez_str = _esc(cfg.easing)
+    param_play_pos = _obj("param.play_pos")
+    param_play_speed = _obj("param.play_speed")
+
+    # 焼き込みでは移動のあるパラメータの値を {1}, {2}, … として、オブジェクトの長さごとに埋める
+    baked = []
+    if cfg.bake_easing:
+        for eff in cfg.effects:
+            for p in eff.params:
+                if p.kind != "cb" and XDict[p.method]:
+                    baked.append((float(p.start), float(p.end), _obj(motion_names[XDict[p.method]])))
+
+    bake_time = cfg.bake_easing and cfg.time_control and cfg.apply_easing
+    # 焼き込みでは frame= に中間点を並べた文字列を {1} として渡す
+    head = "[{0}]\nframe={1}\nlayer={3}\n" if baked or bake_time else "[{0}]\nframe={1},{2}\nlayer={3}\n"
+    if cfg.as_scene:
+        source = (
+            "[{0}.0]\n"
+            f"effect.name={_esc(_obj('effect.scene'))}\n"
+            f"{_esc(param_play_pos)}=0.000\n"
+            f"{_esc(param_play_speed)}={{4:.2f}}\n"
+            f"{_esc(_obj('param.scene'))}={_esc(cfg.scene_no)}\n"
+        )
+    else:
+        source = (
+            "[{0}.0]\n"
+            f"effect.name={_esc(_obj('effect.video_file'))}\n"
+            f"{_esc(_obj('param.file'))}={_esc(cfg.source)}\n"
+            f"{_esc(param_play_pos)}=0.000\n"
+            f"{_esc(param_play_speed)}={{4:.2f}}\n"
+            f"{_esc(_obj('param.audio_on'))}=1\n"
+        )
+
+    def _draw(obj_x):
+        return (
+            head + source +
+            "[{0}.1]\n"
+            f"effect.name={_esc(_obj('effect.standard_draw'))}\n"
+            f"{_esc(_obj('param.x'))}={obj_x:.2f}\n{_esc(_obj('param.y'))}=0.00\n"
+            f"{_esc(_obj('param.z'))}=0.00\n{_esc(_obj('param.opacity'))}=0.00\n"
+        )
+
+    def _flip(p_idx, ud_val, lr_val):
+        return (
+            f"[{{0}}.{p_idx}]\n"
+            f"effect.name={_esc(_obj('effect.flip'))}\n"
+            f"{_esc(_obj('param.flip_ud'))}={ud_val}\n"
+            f"{_esc(_obj('param.flip_lr'))}={lr_val}\n"
+            f"{_esc(_obj('param.flip_luma'))}=0\n{_esc(_obj('param.flip_hue'))}=0\n"
+            f"{_esc(_obj('param.flip_alpha'))}=0\n"
+        )
+
+    def _clip(p_idx):
+        return (
+            f"[{{0}}.{p_idx}]\n"
+            f"effect.name={_esc(_obj('effect.clip'))}\n"
+            f"{_esc(_obj('param.clip_top'))}=0\n{_esc(_obj('param.clip_bottom'))}=0\n"
+            f"{_esc(_obj('param.clip_left'))}=480\n{_esc(_obj('param.clip_right'))}=480\n"
+        )
+
+    def _effects(p_idx):
+        out = []
+        n_baked = 0
+        for eff in cfg.effects:
+            out.append(f"[{{0}}.{p_idx}]\neffect.name={_esc(_obj_text(eff.name))}\n")
+            for p in eff.params:
+                if p.kind == "cb":
+                    val = _esc(int(p.value))
+                elif baked and XDict[p.method]:
+                    n_baked += 1
+                    val = f"{{{n_baked}}}"
+                else:
+                    motion_name = _obj(motion_names.get(XDict[p.method], "motion.none"))
+                    val = _esc(f"{p.start},{p.end},{motion_name},{cfg.easing}")
+                out.append(f"{_esc(_obj_text(p.name))}={val}\n")
+            p_idx += 1
+        return "".join(out)
+
+    # 本体: 赤ゾーンのX座標別
+    body = {x: _draw(x) for x in (0.0, -480.0, 480.0)}
+
+    # 追加フィルタ: (上下反転, 左右反転, クリッピング) の組み合わせ別
+    tail = {}
+    for ud_val in (0, 1):
+        for lr_val in (0, 1):
+            for clip in (False, True):
+                p_idx = 2
+                parts = []
+                if ud_val or lr_val:
+                    parts.append(_flip(p_idx, ud_val, lr_val))
+                    p_idx += 1
+                if clip:
+                    parts.append(_clip(p_idx))
+                    p_idx += 1
+                parts.append(_effects(p_idx))
+                parts.append("\n")
+                tail[(ud_val, lr_val, clip)] = "".join(parts)
+
+    time_ctrl = {}
+    if cfg.time_control:
+        t_easing = bez_str if cfg.apply_easing else "0"
+        for even in (False, True):
+            s_val, e_val = ("100.000", "0.000") if even else ("0.000", "100.000")
+            position = "{4}" if bake_time else f"{s_val},{e_val},直線移動(時間制御),{t_easing}"
+            time_ctrl[even] = (
+                head +
+                "[{0}.0]\n"
+                "effect.name=時間制御(オブジェクト)\n"
+                f"位置={position}\n"
+                f"コマ落ち={_esc(cfg.frame_step)}\n"
+                "対象レイヤー数=1\n\n"
+            )
+
+    bake = None
+    if baked or bake_time:
+        bake = {"curve": cfg.easing_curve, "max_keys": cfg.bake_max_keys, "params": tuple(baked), "body": bool(baked),
+                "time": bake_time}
+    return {"body": body, "tail": tail, "time_ctrl": time_ctrl, "bake": bake}
+
+
+def iter_objects(items, cfg, is_midi, obj_lang="ja", progress=None, cancel=None, stats=None):
+    frames = compute_frames(items, cfg, is_midi)
+    return emit_objects(frames, cfg, obj_lang, progress, cancel, stats)
+
+
+def emit_objects(frames, cfg, obj_lang="ja", progress=None, cancel=None, stats=None,
+                 first_index=0, templates=None):
+    tpl = templates if templates is not None else compile_templates(cfg, obj_lang)
+    body = tpl["body"]
+    tail = tpl["tail"]
+    time_ctrl = tpl["time_ctrl"]
+    bake = tpl.get("bake")
+    bake_keys = {}
+
+    flip_h = cfg.flip_h
+    flip_v = cfg.flip_v
+    is_redzone = cfg.redzone
+    use_tc = cfg.time_control
+    total_obj_idx = first_index
+    n_items = len(frames["track"])
+    rows = zip(frames["track"].tolist(), frames["start"].tolist(), frames["end"].tolist(),
+               frames["speed"].tolist(), frames["count"].tolist(), frames["layer"].tolist())
+
+    for n, (t_idx, start_f, end_f, speed, curr_cnt, layer) in enumerate(rows):
+        if n % PROGRESS_STEP == 0:
+            _check_cancel(cancel)
+            _report(progress, "emit", n, n_items)
+
+        main_layer = layer * 2 if use_tc else layer
+
+        obj_x = 0.0
+        if is_redzone:
+            if t_idx == 1:
+                obj_x = -480.0
+            elif t_idx == 2:
+                obj_x = 480.0
+
+        ud_val = 0
+        lr_val = 0
+        if flip_h and flip_v:
+            phase = (curr_cnt - 1) % 4
+            if phase == 1:
+                lr_val = 1
+            elif phase == 2:
+                ud_val = 1
+            elif phase == 3:
+                ud_val, lr_val = 1, 1
+        elif flip_h or flip_v:
+            flip_on = (curr_cnt % 2 == 0)
+            ud_val = 1 if (flip_v and flip_on) else 0
+            lr_val = 1 if (flip_h and flip_on) else 0
+
+        clip = is_redzone and (t_idx == 1 or t_idx == 2)
+
+        if bake is not None:
+            length = end_f - start_f
+            keys = bake_keys.get(length)
+            if keys is None:
+                keys = bake_keys[length] = _bake_keys(bake, length)
+            offsets, values, position = keys
+            frame_keys = ",".join([str(start_f + o) for o in offsets])
+            frame_ends = f"{start_f},{end_f}"
+            yield body[obj_x].format(total_obj_idx, frame_keys if bake["body"] else frame_ends, end_f,
+                                     main_layer, speed)
+            yield tail[(ud_val, lr_val, clip)].format(total_obj_idx, *values)
+            total_obj_idx += 1
+            if use_tc:
+                even = curr_cnt % 2 == 0
+                yield time_ctrl[even].format(total_obj_idx, frame_keys if bake["time"] else frame_ends, end_f,
+                                             main_layer - 1, position[even])
+                total_obj_idx += 1
+            continue
+
+        yield body[obj_x].format(total_obj_idx, start_f, end_f, main_layer, speed)
+        yield tail[(ud_val, lr_val, clip)].format(total_obj_idx)
+        total_obj_idx += 1
+
+        if use_tc:
+            yield time_ctrl[curr_cnt % 2 == 0].format(total_obj_idx, start_f, end_f, main_layer - 1)
+            total_obj_idx += 1
+
+    if stats is not None:
+        stats["objects"] = total_obj_idx - first_index
+
+
+def _emit_rows(frames, cfg, tpl, first_index, encode=False):
+    parts = list(emit_objects(frames, cfg, templates=tpl, first_index=first_index))
+    if not encode:
+        return "".join(parts)
+    step = len(parts) // len(frames["track"]) if parts else 1
+    encoded = [_encode_text("".join(parts[j:j + step])) for j in range(0, len(parts), step)]
+    return b"".join(encoded), [len(b) for b in encoded]
+
+
+def _emit_chunk(args):
+    return _emit_rows(*args)
+
+
+def _process_pool(workers):
+    # GUIのワーカースレッドや常駐プロセスのようにスレッドのあるプロセスから fork すると、
+    # 他のスレッドが持っていたロックのまま子プロセスが止まることがあるので、fork は使わない
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("forkserver")
+        # 最初に起動したときだけ効く。ワーカーは rpp_core と numpy を読み込み済みのプロセスから作られる
+        ctx.set_forkserver_preload(["rpp_core", "numpy"])
+    else:
+        ctx = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(workers, mp_context=ctx)
+
+
+def _row_ranges(start, stop, size=EMIT_CHUNK_ROWS):
+    return [(a, min(a + size, stop)) for a in range(start, stop, size)]
+
+
+def emit_chunks(frames, cfg, tpl, ranges, workers=1, encode=False):
+    """ranges の行範囲ごとの出力を順番通りに返す。workers > 1 ならプロセスプールで並列に生成する。
+    オブジェクト番号は範囲の先頭行から決まり、行どうしの依存は frame_math で解決済みなので、
+    どう分けても直列に生成したものと同じバイト列になる"""
+    per_row = 2 if cfg.time_control else 1
+    jobs = (({k: frames[k][a:b] for k in EMIT_COLUMNS}, cfg, tpl, a * per_row, encode) for a, b in ranges)
+    if workers <= 1 or len(ranges) <= 1:
+        for job in jobs:
+            yield _emit_rows(*job)
+        return
+
+    pool = _process_pool(min(workers, len(ranges)))
+    try:
+        # 先読みはワーカー数の2倍まで。結果は投入順に受け取るので並びは変わらない
+        pending = []
+        for job in jobs:
+            pending.append(pool.submit(_emit_chunk, job))
+            if len(pending) >= workers * 2:
+                yield pending.pop(0).result()
+        for fut in pending:
+            yield fut.result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _emit_parallel(frames, cfg, progress=None, cancel=None, stats=None):
+    n_rows = len(frames["track"])
+    ranges = _row_ranges(0, n_rows)
+    chunks = emit_chunks(frames, cfg, compile_templates(cfg), ranges, cfg.workers)
+    try:
+        for a, _ in ranges:
+            _check_cancel(cancel)
+            _report(progress, "emit", a, n_rows)
+            yield next(chunks)
+    finally:
+        chunks.close()
+    if stats is not None:
+        stats["objects"] = n_rows * (2 if cfg.time_control else 1)
+
+
+MANIFEST_VERSION = 2
+SIGNATURE_COLUMNS = ("track", "start", "end", "speed", "layer", "variant")
+
+
+def _templates_digest(tpl, cfg):
+    # テンプレートとテンプレートの選び方が同じなら、アイテム毎の出力は番号以外
+    # (トラック, 開始, 終了, 速度, レイヤー, 反転状態) だけで決まる
+    flags = (cfg.redzone, cfg.flip_h, cfg.flip_v, cfg.time_control)
+    if tpl.get("bake") is not None:
+        flags += (repr(tpl["bake"]),)
+    text = repr([sorted(tpl[k].items()) for k in ("body", "tail", "time_ctrl")] + [flags])
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _row_variants(frames, cfg):
+    count = frames["count"]
+    if cfg.flip_h and cfg.flip_v:
+        return (count - 1) % 4
+    if cfg.flip_h or cfg.flip_v or cfg.time_control:
+        return count % 2
+    return count * 0
+
+
+def _row_ids(items, frames):
+    rows = frames["row"].tolist()
+    ids = [items.item_id(r) for r in rows]
+    if None not in ids and len(set(ids)) == len(ids):
+        return ids
+    # IGUIDの無いアイテムは位置で代用し、重複には出現順の番号を付ける
+    seen = {}
+    pos = items.pos.tolist()
+    track = items.track.tolist()
+    ids = []
+    for r in rows:
+        key = items.item_id(r) or f"{track[r]}@{pos[r]!r}"
+        n = seen.get(key, 0)
+        seen[key] = n + 1
+        ids.append(key if n == 0 else f"{key}#{n}")
+    return ids
+
+
+def _manifest_is_valid(manifest, output, digest):
+    if not manifest or manifest.get("version") != MANIFEST_VERSION or manifest.get("templates") != digest:
+        return False
+    try:
+        st = os.stat(output)
+    except OSError:
+        return False
+    try:
+        if st.st_size != manifest["size"] or st.st_mtime_ns != manifest["mtime_ns"]:
+            return False
+        n = len(manifest["ids"])
+        if any(len(manifest["columns"][name]) != n for name in SIGNATURE_COLUMNS):
+            return False
+        return len(manifest["lengths"]) == n and sum(manifest["lengths"]) == st.st_size
+    except (KeyError, TypeError):
+        return False
+
+
+def _encode_text(text):
+    if os.linesep != "\n":
+        text = text.replace("\n", os.linesep)
+    return text.encode("utf-8")
+
+
+_POWERS_OF_TEN = [10 ** k for k in range(1, 19)]
+
+
+def _digit_count(values):
+    import numpy as np
+
+    return np.searchsorted(np.asarray(_POWERS_OF_TEN, dtype=np.int64), values, side="right")
+
+
+def _renumber_rows(old, old_off, a, b, delta, per_row):
+    """前回の出力の a～b 行目を、オブジェクト番号を delta ずらして写す。
+    1行に含まれる番号は決まっているので、見出し "[番号]" / "[番号.k]" を番号ごとに置き換える。
+    置き換えた番号を再度置き換えないよう、ずらす向きの先にある番号から処理する"""
+    order = range(per_row - 1, -1, -1) if delta > 0 else range(per_row)
+    parts = []
+    for k in range(a, b):
+        row = b"\n" + old[old_off[k]:old_off[k + 1]]
+        for j in order:
+            obj = k * per_row + j
+            row = row.replace(b"\n[%d]" % obj, b"\n[%d]" % (obj + delta))
+            row = row.replace(b"\n[%d." % obj, b"\n[%d." % (obj + delta))
+        parts.append(row[1:])
+    return b"".join(parts)
+
+
+def _write_incremental(cfg, items, frames, cache, progress=None, cancel=None, timer=None, ids=None):
+    """前回の出力のうち変わっていないアイテムの部分をそのまま流用し、変わった部分だけを生成して書き直す"""
+    import mmap
+    import numpy as np
+
+    timer = timer if timer is not None else StageTimer()
+    tpl = compile_templates(cfg)
+    digest = _templates_digest(tpl, cfg)
+    per_row = 2 if cfg.time_control else 1
+    output = cfg.output
+
+    if ids is None:
+        ids = _row_ids(items, frames)
+    cols = {
+        "track": frames["track"],
+        "start": frames["start"],
+        "end": frames["end"],
+        "speed": frames["speed"],
+        "layer": frames["layer"],
+        "variant": _row_variants(frames, cfg)
+    }
+    n_rows = len(ids)
+
+    manifest = cache.get_manifest(output)
+    if not _manifest_is_valid(manifest, output, digest):
+        manifest = None
+    old_ids = manifest["ids"] if manifest else []
+    old_cols = {name: np.asarray(manifest["columns"][name] if manifest else [], dtype=cols[name].dtype)
+                for name in SIGNATURE_COLUMNS}
+    old_rows = len(old_ids)
+
+    def _sig_equal(new_idx, old_idx):
+        eq = np.ones(len(new_idx), dtype=bool)
+        for name in SIGNATURE_COLUMNS:
+            eq &= cols[name][new_idx] == old_cols[name][old_idx]
+        return eq
+
+    # 追加・変更・削除はアイテムの識別子(IGUID / トラック:tick:音程)で数える
+    old_index = {i: k for k, i in enumerate(old_ids)}
+    new_idx = []
+    old_idx = []
+    for n, i in enumerate(ids):
+        k = old_index.pop(i, None)
+        if k is not None:
+            new_idx.append(n)
+            old_idx.append(k)
+    new_idx = np.asarray(new_idx, dtype=np.int64)
+    old_idx = np.asarray(old_idx, dtype=np.int64)
+    matched = _sig_equal(new_idx, old_idx)
+
+    # 同じ識別子で内容も同じアイテムは、並び位置がずれていても前回の出力を写して番号だけ書き換える。
+    # 番号の桁数が変わる行は長さが変わるので作り直す(桁の変わり目の前後だけなので数は少ない)
+    src = np.full(n_rows, -1, dtype=np.int64)
+    if len(new_idx):
+        hit_new = new_idx[matched]
+        hit_old = old_idx[matched]
+        same_width = _digit_count(hit_new * per_row) == _digit_count(hit_old * per_row)
+        if per_row > 1:
+            same_width &= _digit_count(hit_new * per_row + 1) == _digit_count(hit_old * per_row + 1)
+        src[hit_new[same_width]] = hit_old[same_width]
+    same = (src >= 0).tolist()
+    src_l = src.tolist()
+    reused = int(sum(same))
+    timer.count("added", n_rows - len(new_idx))
+    timer.count("changed", int(len(new_idx) - matched.sum()))
+    timer.count("removed", len(old_index))
+    timer.count("reused", reused)
+    timer.count("emitted", n_rows - reused)
+    timer.count("objects", n_rows * per_row)
+
+    if manifest is not None and n_rows == old_rows and (src == np.arange(n_rows)).all():
+        # 何も変わっていなければ出力ファイルには触らない
+        return n_rows * per_row
+
+    old_off = [0]
+    if manifest is not None:
+        for length in manifest["lengths"]:
+            old_off.append(old_off[-1] + length)
+
+    fresh_ranges = []
+    n = 0
+    while n < n_rows:
+        m = n + 1
+        while m < n_rows and same[m] == same[n]:
+            m += 1
+        if not same[n]:
+            fresh_ranges.extend(_row_ranges(n, m))
+        n = m
+    n_fresh = n_rows - reused
+    workers = cfg.workers if n_fresh >= PARALLEL_MIN_ROWS else 1
+    fresh = emit_chunks(frames, cfg, tpl, fresh_ranges, workers, encode=True)
+
+    lengths = []
+    f = OutputWriter(output)
+    try:
+        old_f = None
+        old = b""
+        if manifest is not None and old_off[-1] > 0:
+            old_f = open(output, "rb")
+            old = mmap.mmap(old_f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            n = 0
+            while n < n_rows:
+                _check_cancel(cancel)
+                _report(progress, "emit", n, n_rows)
+                if same[n]:
+                    # 前回のファイルで続いている変わっていないアイテムは、おおよそ OUTPUT_CHUNK_SIZE 単位でまとめて写す
+                    a = src_l[n]
+                    m = n + 1
+                    while (m < n_rows and src_l[m] == a + m - n
+                           and old_off[a + m - n] - old_off[a] < OUTPUT_CHUNK_SIZE):
+                        m += 1
+                    b = a + m - n
+                    t0 = time.perf_counter()
+                    if a == n:
+                        chunk = old[old_off[a]:old_off[b]]
+                    else:
+                        chunk = _renumber_rows(old, old_off, a, b, (n - a) * per_row, per_row)
+                    lengths.extend(manifest["lengths"][a:b])
+                    timer.add("reuse", time.perf_counter() - t0)
+                    _timed_write(f, chunk, timer)
+                else:
+                    t0 = time.perf_counter()
+                    data, row_lengths = next(fresh)
+                    m = n + len(row_lengths)
+                    lengths.extend(row_lengths)
+                    timer.add("emit", time.perf_counter() - t0)
+                    _timed_write(f, data, timer)
+                n = m
+        finally:
+            fresh.close()
+            if old_f is not None:
+                old.close()
+                old_f.close()
+        # 置き換えは前回のファイルを閉じてから行う
+        f.commit()
+    except BaseException:
+        f.abort()
+        raise
+    timer.count("unchanged", int(not f.changed))
+
+    st = os.stat(output)
+    cache.put_manifest(output, {
+        "version": MANIFEST_VERSION,
+        "templates": digest,
+        "sha1": f.digest(),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "ids": ids,
+        "columns": {name: col.tolist() for name, col in cols.items()},
+        "lengths": lengths
+    })
+    return n_rows * per_row
+
+
+def filter_items(items, tracks):
+    items = as_item_table(items)
+    if tracks is None:
+        return items
+    return items.select_tracks(tracks)
+
+
+def _select_items(cfg, items=None, cache=None, progress=None, cancel=None, timer=None, index=None):
+    timer = timer if timer is not None else StageTimer()
+    is_midi = is_midi_path(cfg.input)
+    tracks = cfg.tracks
+    if items is None:
+        with timer.stage("parse"):
+            items, index = _load_items(cfg, cache, progress, cancel, index)
+    else:
+        index = None
+    items = as_item_table(items)
+    if not items and not is_midi and (index is None or not any(index.item_counts)):
+        raise ConvertError("error_parse", "msg_item_not_found", level="warning")
+    with timer.stage("filter"):
+        items = filter_items(items, tracks)
+    if not items:
+        raise ConvertError("error_no_result", "msg_valid_item_not_found", level="warning")
+    return items, is_midi
+
+
+def _load_items(cfg, cache, progress, cancel, index):
+    """出力に使うアイテムを読む。RPPで一部のトラックだけが選ばれていれば、そのバイト範囲だけを解析する。
+    部分的に読んだときは使った索引も返す"""
+    path = cfg.input
+    if cfg.tracks is None or is_midi_path(path):
+        return load_project(path, cache, progress, cancel, cfg.midi_notes)[0], None
+    hit = cache.get(path, _rpp_kind(cfg.midi_notes)) if cache is not None else None
+    if hit is not None:
+        return hit[0], None
+    try:
+        st = os.stat(path)
+    except OSError as e:
+        raise ConvertError("error_read", str(e))
+    if index is None or index.path != path or not index.is_current(st):
+        index = scan_rpp_tracks(path, cancel)
+    if index.selected_bytes(cfg.tracks) > index.size * PARTIAL_PARSE_RATIO:
+        # ほとんどのトラックを読むなら、全体を解析してキャッシュに残す方が次回も速い
+        return load_rpp(path, cache, progress, cancel, cfg.midi_notes)[0], None
+    return load_rpp_tracks(path, cfg.tracks, index, progress, cancel, cfg.midi_notes)[0], index
+
+
+def render(settings, items=None, cache=None, progress=None, cancel=None):
+    cfg = normalize_settings(settings)
+    items, is_midi = _select_items(cfg, items, cache, progress, cancel)
+    return "".join(iter_objects(items, cfg, is_midi, progress=progress, cancel=cancel))
+
+
+class OutputWriter:
+    """出力ファイルを書き換えが必要なときだけ書き換える。
+    書く内容を先頭から既存のファイルと突き合わせ、最後まで同じならファイルにも一時ファイルにも触らない。
+    違いが見つかった時点で同じフォルダに一時ファイルを作って一致していた部分を写し、以降はそこへ書いて
+    ディスクに書き出してから置き換える。一時ファイルの名前は毎回違うので、同じ出力先へ同時に書いても壊れず、
+    途中で失敗しても元のファイルは残る。書いた内容のSHA-1は digest() で得られる"""
+
+    def __init__(self, path, text=False):
+        self.path = path
+        self.tmp = None
+        self.text = text
+        self.size = 0
+        self.changed = False
+        self.hash = hashlib.sha1()
+        self.out = None
+        try:
+            self.old = open(path, "rb")
+        except OSError:
+            self.old = None
+            self._open_tmp()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+        return False
+
+    def _open_tmp(self):
+        fd, self.tmp = _create_temp(self.path)
+        self.out = os.fdopen(fd, "wb")
+        self.changed = True
+        try:
+            if self.old is not None:
+                # 置き換える前のファイルの権限を引き継ぐ
+                os.chmod(self.tmp, os.fstat(self.old.fileno()).st_mode & 0o7777)
+                # 一致していた先頭部分を写す
+                self.old.seek(0)
+                remain = self.size
+                while remain:
+                    chunk = self.old.read(min(remain, OUTPUT_CHUNK_SIZE))
+                    if not chunk:
+                        raise OSError(f"{self.path} changed while writing")
+                    self.out.write(chunk)
+                    remain -= len(chunk)
+                self.old.close()
+                self.old = None
+        except BaseException:
+            self.abort()
+            raise
+
+    def write(self, data):
+        if self.text:
+            data = _encode_text(data)
+        self.hash.update(data)
+        if self.out is None:
+            if self.old.read(len(data)) == data:
+                self.size += len(data)
+                return
+            self._open_tmp()
+        self.out.write(data)
+        self.size += len(data)
+
+    def digest(self):
+        return self.hash.hexdigest()
+
+    def commit(self):
+        if self.out is None:
+            # 既存のファイルの方が長ければ、その分だけ内容が違う
+            if not self.old.read(1):
+                self.old.close()
+                self.old = None
+                return False
+            self._open_tmp()
+        try:
+            self.out.flush()
+            os.fsync(self.out.fileno())
+            self.out.close()
+            os.replace(self.tmp, self.path)
+        except BaseException:
+            self.out.close()
+            _remove_partial(self.tmp)
+            raise
+        self.out = None
+        return True
+
+    def abort(self):
+        if self.old is not None:
+            self.old.close()
+            self.old = None
+        if self.out is not None:
+            self.out.close()
+            self.out = None
+            _remove_partial(self.tmp)
+
+
+def write_chunks(f, parts, chunk_size=OUTPUT_CHUNK_SIZE, timer=None):
+    buf = []
+    size = 0
+    for part in parts:
+        buf.append(part)
+        size += len(part)
+        if size >= chunk_size:
+            _timed_write(f, "".join(buf), timer)
+            buf = []
+            size = 0
+    if buf:
+        _timed_write(f, "".join(buf), timer)
+
+
+def _timed_write(f, text, timer):
+    if timer is None:
+        f.write(text)
+        return
+    t0 = time.perf_counter()
+    f.write(text)
+    timer.add("write", time.perf_counter() - t0)
+
+
+def convert(settings, items=None, cache=None, progress=None, cancel=None, timer=None, index=None):
+    timer = timer if timer is not None else StageTimer()
+    cfg = normalize_settings(settings, need_output=True)
+    items, is_midi = _select_items(cfg, items, cache, progress, cancel, timer, index)
+    with timer.stage("sort"):
+        columns = sort_items(items)
+    with timer.stage("frames"):
+        frames = frame_math(columns, cfg, is_midi)
+    if cfg.shard_minutes or cfg.shard_tracks:
+        return _convert_sharded(cfg, items, frames, cache, progress, cancel, timer)
+    if cache is not None:
+        return _convert_incremental(cfg, items, frames, cache, progress, cancel, timer)
+
+    stats = {"objects": 0}
+    if cfg.workers > 1 and len(frames["track"]) >= PARALLEL_MIN_ROWS:
+        parts = _emit_parallel(frames, cfg, progress, cancel, stats)
+    else:
+        parts = emit_objects(frames, cfg, progress=progress, cancel=cancel, stats=stats)
+
+    # テキスト生成と書き込みは交互に進むので、書き込み分を差し引いたものを emit とする
+    written = timer.seconds("write")
+    t0 = time.perf_counter()
+    try:
+        with OutputWriter(cfg.output, text=True) as f:
+            write_chunks(f, parts, timer=timer)
+            t1 = time.perf_counter()
+            emit_sec = t1 - t0 - (timer.seconds("write") - written)
+        timer.add("write", time.perf_counter() - t1)
+    except OSError as e:
+        raise ConvertError("error_save", str(e))
+    timer.add("emit", emit_sec)
+    timer.count("items", len(items))
+    timer.count("objects", stats["objects"])
+    timer.count("bytes", f.size)
+    timer.count("unchanged", int(not f.changed))
+    return {"items": len(items), "objects": stats["objects"], "bytes": f.size, "output": cfg.output,
+            "sha1": f.digest(), "timings": timer.as_dict()}
+
+
+def preview_frames(settings, items=None, cache=None, progress=None, cancel=None, timer=None, index=None):
+    """書き出しはせず、フレーム計算までを行ってプレビュー用の列を返す"""
+    timer = timer if timer is not None else StageTimer()
+    cfg = normalize_settings(settings)
+    items, is_midi = _select_items(cfg, items, cache, progress, cancel, timer, index)
+    with timer.stage("sort"):
+        columns = sort_items(items)
+    with timer.stage("frames"):
+        frames = frame_math(columns, cfg, is_midi)
+    frames["variant"] = _row_variants(frames, cfg)
+    objects = len(frames["track"]) * (2 if cfg.time_control else 1)
+    timer.count("items", len(items))
+    timer.count("objects", objects)
+    return {"items": len(items), "objects": objects, "frames": frames, "time_control": cfg.time_control,
+            "timings": timer.as_dict()}
+
+
+def _convert_incremental(cfg, items, frames, cache, progress, cancel, timer):
+    try:
+        objects = _write_incremental(cfg, items, frames, cache, progress, cancel, timer)
+        size = os.path.getsize(cfg.output)
+    except OSError as e:
+        raise ConvertError("error_save", str(e))
+    timer.count("items", len(items))
+    timer.count("bytes", size)
+    return {"items": len(items), "objects": objects, "bytes": size, "output": cfg.output,
+            "timings": timer.as_dict()}
+
+
+def shard_keys(frames, cfg):
+    """オブジェクト毎の分割先の番号(0始まり)。時間で分けるときは開始フレームの区間、
+    トラックで分けるときはトラック番号を shard_tracks 個ずつまとめた組"""
+    import numpy as np
+
+    if cfg.shard_minutes:
+        window = max(1, int(round(cfg.shard_minutes * 60.0 * cfg.fps)))
+        return np.maximum(frames["start"], 0) // window
+    return (frames["track"].astype(np.int64) - 1).clip(0) // cfg.shard_tracks
+
+
+def shard_path(output, key):
+    stem, ext = os.path.splitext(output)
+    return f"{stem}_{key + 1:03}{ext or '.object'}"
+
+
+def _stale_shards(previous, keep):
+    # 前回の実行が書いたと記録されている分割ファイルのうち、今回は書かなかったもの。
+    # 名前が似ているだけの、記録に無いファイルには触れない
+    keep = {os.path.normcase(os.path.abspath(p)) for p in keep}
+    return [p for p in previous if os.path.normcase(os.path.abspath(p)) not in keep]
+
+
+def _write_shard(cfg, frames, ids, cache, progress=None, cancel=None):
+    """1つの分割ファイルを書く。オブジェクト番号は0から振り直す。
+    プロセスプールからも呼ばれるので、結果は (オブジェクト数, バイト数, 時間の辞書) で返す"""
+    timer = StageTimer()
+    if cache is not None:
+        objects = _write_incremental(cfg, None, frames, cache, progress, cancel, timer, ids=ids)
+    else:
+        stats = {"objects": 0}
+        with OutputWriter(cfg.output, text=True) as f:
+            with timer.stage("emit"):
+                write_chunks(f, emit_objects(frames, cfg, progress=progress, cancel=cancel, stats=stats),
+                             timer=timer)
+        timer.count("unchanged", int(not f.changed))
+        # write_chunks の書き込み時間は emit から差し引く
+        timer.add("emit", -timer.seconds("write"))
+        objects = stats["objects"]
+        timer.count("objects", objects)
+    return objects, os.path.getsize(cfg.output), timer.as_dict()
+
+
+def _convert_sharded(cfg, items, frames, cache, progress, cancel, timer):
+    """出力を時間の区間またはトラックの組ごとの .object に分けて書く。
+    分割ファイルはプロセスプールで並列に書き、キャッシュがあれば変わっていないものは書き換えない"""
+    import numpy as np
+
+    keys = shard_keys(frames, cfg)
+    ids = _row_ids(items, frames) if cache is not None else None
+    jobs = []
+    for key in np.unique(keys).tolist():
+        rows = np.flatnonzero(keys == key)
+        part = {name: col[rows] for name, col in frames.items()}
+        part_ids = [ids[r] for r in rows.tolist()] if ids is not None else None
+        shard_cfg = dataclasses.replace(cfg, output=shard_path(cfg.output, key), workers=1)
+        jobs.append((shard_cfg, part, part_ids, cache))
+
+    results = []
+    try:
+        if cfg.workers <= 1 or len(jobs) <= 1:
+            for n, job in enumerate(jobs):
+                _check_cancel(cancel)
+                _report(progress, "emit", n, len(jobs))
+                results.append(_write_shard(*job, cancel=cancel))
+        else:
+            with _process_pool(min(cfg.workers, len(jobs))) as pool:
+                futures = [pool.submit(_write_shard, *job) for job in jobs]
+                try:
+                    for n, fut in enumerate(futures):
+                        _check_cancel(cancel)
+                        _report(progress, "emit", n, len(jobs))
+                        results.append(fut.result())
+                except BaseException:
+                    for fut in futures:
+                        fut.cancel()
+                    raise
+        if cache is not None:
+            # 書いた分割ファイルはキャッシュに記録し、次回はその中から不要になったものだけを消す
+            written = [os.path.abspath(job[0].output) for job in jobs]
+            previous = (cache.get_manifest(cfg.output, "shards") or {}).get("paths") or []
+            for path in _stale_shards(previous, written):
+                _remove_partial(path)
+            cache.put_manifest(cfg.output, {"paths": written}, "shards")
+    except OSError as e:
+        raise ConvertError("error_save", str(e))
+
+    objects = 0
+    size = 0
+    skipped = 0
+    for n_obj, n_bytes, t in results:
+        objects += n_obj
+        size += n_bytes
+        for name, sec in t["stages"].items():
+            timer.add(name, sec)
+        for name, value in t["counters"].items():
+            timer.count(name, value)
+        if t["counters"].get("unchanged") or (
+                cache is not None and not t["counters"].get("emitted") and not t["counters"].get("removed")):
+            skipped += 1
+    timer.count("items", len(items))
+    timer.count("bytes", size)
+    timer.count("shards", len(jobs))
+    timer.count("shards_skipped", skipped)
+    return {"items": len(items), "objects": objects, "bytes": size, "output": cfg.output,
+            "shards": [job[0].output for job in jobs], "timings": timer.as_dict()}
+
+
+def _create_temp(path):
+    # 出力先と同じフォルダに、他と重ならない名前の一時ファイルを作る。
+    # 権限は通常の新規ファイルと同じく 0o666 から umask を引いたものになる
+    folder, name = os.path.split(path)
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+    while True:
+        tmp = os.path.join(folder, f"{name}.{os.urandom(6).hex()}.tmp")
+        try:
+            return os.open(tmp, flags, 0o666), tmp
+        except FileExistsError:
+            continue
+
+
+def _remove_partial(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _parse_tracks(text):
+    tracks = []
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            a, b = part.split("-", 1)
+            tracks.extend(range(int(a), int(b) + 1))
+        else:
+            tracks.append(int(part))
+    return tracks
+
+
+def _load_effects(text):
+    if os.path.exists(text):
+        with open(text, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return json.loads(text)
+
+
+def build_arg_parser():
+    import argparse
+
+    ap = argparse.ArgumentParser(prog="rpp_core", description="RPP/MIDI → ExEdit2 .object converter")
+    ap.add_argument("input", help=".rpp / .mid / .midi")
+    ap.add_argument("-o", "--output", required=True, help=".object output path")
+    ap.add_argument("-s", "--source", default="", help="video file placed on each object")
+    ap.add_argument("--fps", default=DEFAULT_SETTINGS["fps"])
+    ap.add_argument("--scene", dest="scene_no", default=None, help="place as scene with this scene number")
+    ap.add_argument("--flip-h", action="store_true")
+    ap.add_argument("--flip-v", action="store_true")
+    ap.add_argument("--loop", action="store_true")
+    ap.add_argument("--no-gap", action="store_true")
+    ap.add_argument("--auto-speed", action="store_true")
+    ap.add_argument("--base-len", dest="base_len_sec", default=DEFAULT_SETTINGS["base_len_sec"])
+    ap.add_argument("--redzone", action="store_true")
+    ap.add_argument("--time-control", action="store_true")
+    ap.add_argument("--pack-layers", action="store_true", help="put overlapping objects of a track on separate layers")
+    ap.add_argument("--midi-notes", action="store_true", help="split in-project MIDI items of an .rpp into one object per note")
+    ap.add_argument("--apply-easing", action="store_true")
+    ap.add_argument("--frame-step", default=DEFAULT_SETTINGS["frame_step"])
+    ap.add_argument("--easing", default=DEFAULT_EASING, help='bezier string, e.g. "0|0,0,1,0"')
+    ap.add_argument("--bake-easing", action="store_true",
+                    help="bake --easing-curve into per-frame keyframes instead of the bezier string")
+    ap.add_argument("--easing-curve", default=",".join(str(v) for v in DEFAULT_EASING_CURVE),
+                    help="cubic-bezier control points x1,y1,x2,y2 for --bake-easing")
+    ap.add_argument("--bake-max-keys", type=int, default=BAKE_MAX_KEYS,
+                    help="max keyframes per object for --bake-easing (0 = one per frame)")
+    ap.add_argument("--tracks", default=None, help="track numbers, e.g. 1,3,5-8")
+    ap.add_argument("--effects", default=None, help="effects as JSON text or a JSON file path")
+    ap.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="parse cache directory")
+    ap.add_argument("--cache-mb", type=int, default=DEFAULT_CACHE_MB, help="parse cache size limit (MB)")
+    ap.add_argument("--no-cache", action="store_true", help="do not read or write the parse cache")
+    ap.add_argument("--workers", type=int, default=0, help="processes for object generation (0 = all cores)")
+    ap.add_argument("--shard-minutes", type=float, default=0,
+                    help="split the output into one file per this many minutes (by object start)")
+    ap.add_argument("--shard-tracks", type=int, default=0, help="split the output into one file per this many tracks")
+    ap.add_argument("--lang", default="ja", choices=("ja", "en"), help="message language")
+    ap.add_argument("--timings", action="store_true", help="print per-stage timings to stderr")
+    ap.add_argument("--profile", default=None, metavar="PROF", help="run under cProfile and save stats to this file")
+    return ap
+
+
+def settings_from_args(args):
+    settings = {
+        "input": args.input,
+        "output": args.output,
+        "source": args.source,
+        "fps": args.fps,
+        "scene_no": args.scene_no or DEFAULT_SETTINGS["scene_no"],
+        "base_len_sec": args.base_len_sec,
+        "flip_h": args.flip_h,
+        "flip_v": args.flip_v,
+        "loop": args.loop,
+        "no_gap": args.no_gap,
+        "as_scene": args.scene_no is not None,
+        "auto_speed": args.auto_speed,
+        "redzone": args.redzone,
+        "time_control": args.time_control,
+        "pack_layers": args.pack_layers,
+        "midi_notes": args.midi_notes,
+        "apply_easing": args.apply_easing,
+        "frame_step": args.frame_step,
+        "easing": args.easing,
+        "bake_easing": args.bake_easing,
+        "easing_curve": args.easing_curve.split(","),
+        "bake_max_keys": args.bake_max_keys,
+        "tracks": _parse_tracks(args.tracks) if args.tracks else None,
+        "effects": _load_effects(args.effects) if args.effects else [],
+        "workers": args.workers,
+        "shard_minutes": args.shard_minutes,
+        "shard_tracks": args.shard_tracks,
+    }
+    return settings
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    i18n = load_language(args.lang)
+    try:
+        settings = settings_from_args(args)
+    except (ValueError, OSError) as e:
+        print(f"{i18n.get('error_input', 'error_input')}: {e}", file=sys.stderr)
+        return 2
+    cache = None if args.no_cache else ParseCache(args.cache_dir, args.cache_mb * 1024 * 1024)
+    if args.profile is None and profile_requested():
+        args.profile = os.path.splitext(args.output)[0] + ".prof"
+    try:
+        with profile_to(args.profile):
+            result = convert(settings, cache=cache)
+    except ConvertError as e:
+        msg = i18n.get(e.message, e.message)
+        if e.kwargs:
+            try:
+                msg = msg.format(**e.kwargs)
+            except Exception:
+                pass
+        print(f"{i18n.get(e.title, e.title)}: {msg}", file=sys.stderr)
+        return 1
+    print(f"{result['objects']} objects -> {', '.join(result.get('shards') or [result['output']])}")
+    if args.timings:
+        t = result["timings"]
+        print(f"{format_timings(t)} (total {t['total'] * 1000:.0f} ms, {result['bytes']} bytes)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,348 @@
+import os
+import sys
+import json
+import time
+import socket
+import tempfile
+import threading
+import socketserver
+from rpp_core import (ConvertError, DEFAULT_CACHE_DIR, build_arg_parser, settings_from_args, load_language,
+                      open_project, project_is_current, load_project, normalize_settings, convert,
+                      StageTimer, format_timings)
+from rpp_cache import ParseCache, DEFAULT_CACHE_MB
+
+# 1リクエスト(1行のJSON)の上限
+MAX_REQUEST_BYTES = 1 << 24
+# 解析済みプロジェクトと整形済み設定を保持する数
+KEEP_PROJECTS = 8
+KEEP_SETTINGS = 64
+
+
+def default_socket_path():
+    base = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    user = os.getuid() if hasattr(os, "getuid") else os.environ.get("USERNAME", "user")
+    return os.path.join(base, f"rpptoobject-{user}.sock")
+
+
+def _job_key(settings):
+    return json.dumps(settings, sort_keys=True, ensure_ascii=False, default=sorted)
+
+
+def _jsonable(settings):
+    # トラックの集合などをJSONで送れる形にする
+    return {k: sorted(v) if isinstance(v, (set, frozenset)) else v for k, v in settings.items()}
+
+
+class _Job:
+    __slots__ = ("key", "settings", "done", "result", "error", "submitted", "waiters")
+
+    def __init__(self, key, settings):
+        self.key = key
+        self.settings = settings
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.submitted = time.perf_counter()
+        self.waiters = 1
+
+
+def _output_stamp(result):
+    stamp = []
+    for path in result.get("shards") or [result["output"]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        stamp.append((path, st.st_size, st.st_mtime_ns))
+    return tuple(stamp)
+
+
+class ConvertDaemon:
+    """変換ジョブを1つずつ実行する常駐プロセスの本体。
+    解析済みのプロジェクトと整形済みの設定をメモリに持ち続け、同じ内容のジョブが
+    実行待ちの間に重ねて届いたら1回だけ実行して、全員に同じ結果を返す"""
+
+    def __init__(self, cache=None):
+        self.cache = cache
+        self.projects = {}
+        self.configs = {}
+        self.results = {}
+        self.pending = {}
+        self.queue = []
+        self.lock = threading.Lock()
+        self.wake = threading.Condition(self.lock)
+        self.stopping = False
+        self.stats = {"jobs": 0, "runs": 0, "deduped": 0}
+        self.thread = threading.Thread(target=self._run, name="rpp-daemon", daemon=True)
+        self.thread.start()
+
+    def submit(self, settings):
+        key = _job_key(settings)
+        with self.lock:
+            self.stats["jobs"] += 1
+            job = self.pending.get(key)
+            if job is not None:
+                job.waiters += 1
+                self.stats["deduped"] += 1
+                return job, True
+            job = self.pending[key] = _Job(key, settings)
+            self.queue.append(job)
+            self.wake.notify()
+        return job, False
+
+    def stop(self):
+        with self.lock:
+            self.stopping = True
+            self.wake.notify()
+
+    def _run(self):
+        while True:
+            with self.lock:
+                while not self.queue and not self.stopping:
+                    self.wake.wait()
+                if self.stopping:
+                    for job in self.queue:
+                        job.error = ConvertError("error_fatal", "daemon stopped")
+                        job.done.set()
+                    return
+                job = self.queue.pop(0)
+                # 実行を始めたジョブには合流させない(この後の保存を反映させるため)
+                del self.pending[job.key]
+            try:
+                job.result = self._convert(job.settings)
+            except Exception as e:
+                job.error = e
+            with self.lock:
+                self.stats["runs"] += 1
+            job.done.set()
+
+    def _config(self, settings):
+        key = _job_key(settings)
+        cfg = self.configs.pop(key, None)
+        if cfg is None or not os.path.exists(cfg.input):
+            cfg = normalize_settings(settings, need_output=True)
+        self.configs[key] = cfg
+        while len(self.configs) > KEEP_SETTINGS:
+            self.configs.pop(next(iter(self.configs)))
+        return cfg
+
+    def _project(self, cfg, timer):
+        key = (cfg.input, cfg.midi_notes)
+        project = self.projects.pop(key, None)
+        if not project_is_current(project, cfg.input, cfg.midi_notes):
+            with timer.stage("parse"):
+                project = open_project(cfg.input, self.cache, midi_notes=cfg.midi_notes)
+                if project["items"] is None:
+                    # 常駐では次のジョブで別のトラックが選ばれても解析し直さないよう、全トラックを読んでおく
+                    project["items"] = load_project(cfg.input, self.cache, midi_notes=cfg.midi_notes)[0]
+        self.projects[key] = project
+        while len(self.projects) > KEEP_PROJECTS:
+            self.projects.pop(next(iter(self.projects)))
+        return project
+
+    def _convert(self, settings):
+        timer = StageTimer()
+        cfg = self._config(settings)
+        project = self._project(cfg, timer)
+        # 入力も設定も前回から同じで、出力ファイルも前回書いたままなら変換そのものを省く
+        source = (project["size"], project["mtime_ns"])
+        last = self.results.get(cfg)
+        if last is not None and last[0] == source and last[1] == _output_stamp(last[2]):
+            result = dict(last[2], skipped=True)
+            result["timings"] = timer.as_dict()
+            return result
+        result = convert(cfg, items=project["items"], cache=self.cache, timer=timer, index=project["index"])
+        result.pop("project", None)
+        self.results.pop(cfg, None)
+        self.results[cfg] = (source, _output_stamp(result), result)
+        while len(self.results) > KEEP_SETTINGS:
+            self.results.pop(next(iter(self.results)))
+        return result
+
+    def handle(self, request):
+        if not isinstance(request, dict):
+            return {"status": "error", "title": "error_input", "message": "request must be a JSON object"}
+        cmd = request.get("cmd", "convert")
+        if cmd == "ping":
+            with self.lock:
+                return {"status": "ok", "pid": os.getpid(), "queued": len(self.queue), **self.stats}
+        if cmd == "shutdown":
+            return {"status": "ok", "shutdown": True}
+        if cmd != "convert":
+            return {"status": "error", "title": "error_input", "message": f"unknown command: {cmd}"}
+
+        settings = request.get("settings") or {}
+        if not isinstance(settings, dict):
+            return {"status": "error", "title": "error_input", "message": "settings must be a JSON object"}
+        settings = dict(settings)
+        for name in ("input", "output"):
+            if request.get(name):
+                settings[name] = request[name]
+        # 常駐プロセスではジョブのたびにプロセスプールを起動しないよう、既定は1プロセスにする
+        if not settings.get("workers"):
+            settings["workers"] = 1
+        t0 = time.perf_counter()
+        job, deduped = self.submit(settings)
+        job.done.wait()
+        response = {"deduped": deduped, "latency_ms": (time.perf_counter() - t0) * 1000.0}
+        if job.error is None:
+            response.update(status="ok", **job.result)
+        elif isinstance(job.error, ConvertError):
+            response.update(status="error", title=job.error.title, message=job.error.message,
+                            kwargs=job.error.kwargs)
+        else:
+            response.update(status="error", title="error_fatal", message=str(job.error))
+        return response
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline(MAX_REQUEST_BYTES)
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            response = {"status": "error", "title": "error_input", "message": str(e)}
+        else:
+            response = self.server.daemon.handle(request)
+        self.wfile.write(json.dumps(response, ensure_ascii=False, default=str).encode("utf-8") + b"\n")
+        if response.get("shutdown"):
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def _bind_private(socket_path):
+    # 作ったばかりのソケットを他のユーザーが開けないよう、0700 の一時フォルダの中で作って
+    # 権限を 0600 にしてから置き場所へ移す。umask はプロセス全体に効くので変えない
+    folder = tempfile.mkdtemp(prefix=".rpptoobject-", dir=os.path.dirname(os.path.abspath(socket_path)))
+    tmp = os.path.join(folder, "sock")
+    try:
+        server = _Server(tmp, _Handler)
+        try:
+            os.chmod(tmp, 0o600)
+            os.rename(tmp, socket_path)
+        except OSError:
+            server.server_close()
+            raise
+    finally:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        os.rmdir(folder)
+    return server
+
+
+def serve(socket_path, cache=None):
+    if not hasattr(socket, "AF_UNIX"):
+        raise OSError("Unix domain sockets are not available on this platform")
+    # 前回異常終了したときのソケットが残っていれば、応答が無いことを確かめてから消す
+    if os.path.exists(socket_path):
+        try:
+            request(socket_path, {"cmd": "ping"}, timeout=1.0)
+        except OSError:
+            os.unlink(socket_path)
+        else:
+            raise OSError(f"daemon is already running on {socket_path}")
+    server = _bind_private(socket_path)
+    daemon = ConvertDaemon(cache)
+    server.daemon = daemon
+    try:
+        server.serve_forever()
+    finally:
+        daemon.stop()
+        server.server_close()
+        try:
+            os.unlink(socket_path)
+        except OSError:
+            pass
+
+
+def request(socket_path, payload, timeout=None):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n")
+        with sock.makefile("rb") as f:
+            line = f.readline()
+    if not line:
+        raise OSError("no response from daemon")
+    return json.loads(line)
+
+
+def _print_error(i18n, response):
+    msg = i18n.get(response["message"], response["message"])
+    if response.get("kwargs"):
+        try:
+            msg = msg.format(**response["kwargs"])
+        except Exception:
+            pass
+    title = response.get("title", "error_fatal")
+    print(f"{i18n.get(title, title)}: {msg}", file=sys.stderr)
+
+
+def main(argv=None):
+    import argparse
+
+    argv = list(sys.argv[1:] if argv is None else argv)
+    ap = argparse.ArgumentParser(prog="rpp_daemon", description="local RPPtoOBJECT conversion daemon")
+    ap.add_argument("command", choices=("serve", "submit", "ping", "stop"))
+    ap.add_argument("--socket", default=default_socket_path(), help="Unix domain socket path")
+    ap.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="parse cache directory (serve)")
+    ap.add_argument("--cache-mb", type=int, default=DEFAULT_CACHE_MB, help="parse cache size limit in MB (serve)")
+    ap.add_argument("--no-cache", action="store_true", help="do not use the parse cache (serve)")
+    # submit の残りの引数は python -m rpp_core と同じ
+    args, rest = ap.parse_known_args(argv)
+
+    if args.command == "serve":
+        cache = None if args.no_cache else ParseCache(args.cache_dir, args.cache_mb * 1024 * 1024)
+        try:
+            serve(args.socket, cache)
+        except KeyboardInterrupt:
+            pass
+        except OSError as e:
+            print(f"rpp_daemon: {e}", file=sys.stderr)
+            return 1
+        return 0
+
+    if args.command in ("ping", "stop"):
+        try:
+            response = request(args.socket, {"cmd": "ping" if args.command == "ping" else "shutdown"})
+        except OSError as e:
+            print(f"rpp_daemon: {e}", file=sys.stderr)
+            return 1
+        print(json.dumps(response, ensure_ascii=False))
+        return 0
+
+    sub = build_arg_parser().parse_args(rest)
+    i18n = load_language(sub.lang)
+    try:
+        settings = settings_from_args(sub)
+    except (ValueError, OSError) as e:
+        print(f"{i18n.get('error_input', 'error_input')}: {e}", file=sys.stderr)
+        return 2
+    # 相対パスは常駐プロセスの作業フォルダではなく、呼び出し側から見た場所にする
+    for name in ("input", "output"):
+        if settings.get(name):
+            settings[name] = os.path.abspath(settings[name])
+    t0 = time.perf_counter()
+    try:
+        response = request(args.socket, {"cmd": "convert", "settings": _jsonable(settings)})
+    except OSError as e:
+        print(f"rpp_daemon: {e}", file=sys.stderr)
+        return 1
+    if response.get("status") != "ok":
+        _print_error(i18n, response)
+        return 1
+    print(f"{response['objects']} objects -> {', '.join(response.get('shards') or [response['output']])}")
+    if sub.timings:
+        t = response["timings"]
+        print(f"{'unchanged' if response.get('skipped') else format_timings(t)} (daemon {response['latency_ms']:.1f} ms, "
+              f"round trip {(time.perf_counter() - t0) * 1000:.1f} ms, {response['bytes']} bytes)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+from array import array
+
+
+class ItemTable:
+    """アイテムを列(位置・長さ・トラック番号・識別子)ごとの型付き配列で持つ表。
+
+    rows が None でなければ、その行番号だけを選んだ表として振る舞う。
+    トラックの絞り込みは行番号を作るだけで列はコピーしない。
+    note はRPP内のMIDIアイテムから分けたノートの行を示すbool列(無ければ None)。
+    """
+
+    __slots__ = ("pos", "length", "track", "ids", "rows", "note")
+
+    def __init__(self, pos, length, track, ids=None, rows=None, note=None):
+        import numpy as np
+
+        self.pos = np.asarray(pos, dtype=np.float64)
+        self.length = np.asarray(length, dtype=np.float64)
+        self.track = np.asarray(track, dtype=np.int32)
+        self.ids = ids
+        self.rows = rows
+        self.note = None if note is None else np.asarray(note, dtype=bool)
+
+    @classmethod
+    def empty(cls):
+        return cls(array("d"), array("d"), array("i"))
+
+    @classmethod
+    def from_records(cls, records):
+        # {"pos", "length", "track"(, "id")} の辞書のリストから作る
+        records = list(records)
+        ids = [o.get("id") for o in records]
+        return cls(
+            array("d", (o["pos"] for o in records)),
+            array("d", (o["length"] for o in records)),
+            array("i", (o["track"] for o in records)),
+            ids if any(ids) else None
+        )
+
+    def __len__(self):
+        return len(self.pos) if self.rows is None else len(self.rows)
+
+    def row_index(self):
+        import numpy as np
+
+        if self.rows is None:
+            return np.arange(len(self.pos))
+        return self.rows
+
+    def select_tracks(self, tracks):
+        import numpy as np
+
+        # トラック番号→選択の表を引くので、トラック数に関係なくアイテム数に比例する
+        wanted = np.fromiter(tracks, dtype=np.int64, count=len(tracks))
+        wanted = wanted[wanted >= 0]
+        size = max(int(self.track.max(initial=0)), int(wanted.max(initial=0))) + 1
+        lut = np.zeros(size, dtype=bool)
+        lut[wanted] = True
+        mask = lut[self.track]
+        rows = np.flatnonzero(mask)
+        if self.rows is not None:
+            rows = self.rows[mask[self.rows]]
+        return ItemTable(self.pos, self.length, self.track, self.ids, rows, self.note)
+
+    def columns(self):
+        # 選ばれた行だけの (pos, length, track, 元の行番号)
+        if self.rows is None:
+            return self.pos, self.length, self.track, self.row_index()
+        r = self.rows
+        return self.pos[r], self.length[r], self.track[r], r
+
+    def note_column(self):
+        # 選ばれた行だけのノートの印。ノートが無ければ None
+        if self.note is None:
+            return None
+        return self.note if self.rows is None else self.note[self.rows]
+
+    def item_id(self, row):
+        return self.ids[row] if self.ids is not None else None
+
+
+def as_item_table(items):
+    if isinstance(items, ItemTable):
+        return items
+    return ItemTable.from_records(items)
@@ -0,0 +1,135 @@
+import os
+import stat
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+import importlib.util
+
+import rpp_daemon
+from test_incremental import write_project
+
+
+class DaemonRequestTest(unittest.TestCase):
+    """常駐プロセスが不正なリクエストにエラーを返すことの確認"""
+
+    def setUp(self):
+        self.daemon = rpp_daemon.ConvertDaemon()
+
+    def tearDown(self):
+        self.daemon.stop()
+
+    def test_invalid_requests(self):
+        for request in ([], "convert", None, {"cmd": "nope"}, {"settings": [1]}, {"settings": "x"}):
+            response = self.daemon.handle(request)
+            self.assertEqual(response["status"], "error", request)
+            self.assertEqual(response["title"], "error_input", request)
+
+    def test_missing_input(self):
+        response = self.daemon.handle({"settings": {"output": "out.object"}})
+        self.assertEqual((response["status"], response["message"]), ("error", "msg_need_rpp_midi"))
+
+
+@unittest.skipUnless(importlib.util.find_spec("numpy"), "numpy is not installed")
+class DaemonJobTest(unittest.TestCase):
+    """同じ内容のジョブの合流と、何も変わっていないときに変換を省くことの確認"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.input = os.path.join(self.dir, "project.rpp")
+        self.output = os.path.join(self.dir, "out.object")
+        write_project(self.input, [(1, n * 0.5, f"G{n}") for n in range(10)])
+        self.daemon = rpp_daemon.ConvertDaemon()
+
+    def tearDown(self):
+        self.daemon.stop()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def convert(self):
+        return self.daemon.handle({"settings": {"input": self.input, "output": self.output}})
+
+    def test_identical_jobs_merge(self):
+        started = threading.Event()
+        release = threading.Event()
+        runs = []
+
+        def convert(settings):
+            runs.append(settings)
+            started.set()
+            release.wait(10)
+            return {"objects": len(runs)}
+
+        self.daemon._convert = convert
+        # 1つ目のジョブの実行中に、同じ内容のジョブを2つ続けて入れる
+        first, _ = self.daemon.submit({"input": "a"})
+        self.assertTrue(started.wait(10))
+        second, merged_second = self.daemon.submit({"input": "b"})
+        third, merged_third = self.daemon.submit({"input": "b"})
+        self.assertEqual((merged_second, merged_third), (False, True))
+        self.assertIs(second, third)
+        release.set()
+        for job in (first, second):
+            self.assertTrue(job.done.wait(10))
+        self.assertEqual(len(runs), 2)
+        self.assertEqual(second.result, {"objects": 2})
+        self.assertEqual(self.daemon.stats["deduped"], 1)
+
+    def test_skip_when_unchanged(self):
+        first = self.convert()
+        self.assertEqual(first["status"], "ok")
+        self.assertFalse(first.get("skipped"))
+        second = self.convert()
+        self.assertTrue(second.get("skipped"))
+        self.assertEqual(second["objects"], first["objects"])
+        # 出力ファイルが書き換えられたら、変換し直して元に戻す
+        with open(self.output, "w", encoding="utf-8") as f:
+            f.write("edited")
+        third = self.convert()
+        self.assertFalse(third.get("skipped"))
+        with open(self.output, encoding="utf-8") as f:
+            self.assertNotEqual(f.read(), "edited")
+        # プロジェクトが保存し直されたら変換し直す
+        write_project(self.input, [(1, n * 0.5, f"G{n}") for n in range(11)])
+        st = os.stat(self.input)
+        os.utime(self.input, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+        fourth = self.convert()
+        self.assertFalse(fourth.get("skipped"))
+        self.assertEqual(fourth["objects"], first["objects"] + 1)
+
+
+@unittest.skipUnless(hasattr(rpp_daemon.socket, "AF_UNIX"), "Unix domain sockets are not available")
+class DaemonSocketTest(unittest.TestCase):
+    """ソケットが最初から本人だけに開かれていることの確認"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "daemon.sock")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_socket_mode(self):
+        server = rpp_daemon._bind_private(self.path)
+        try:
+            self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+            # 一時フォルダは残さない
+            self.assertEqual(os.listdir(self.dir), ["daemon.sock"])
+        finally:
+            server.server_close()
+
+    def test_serve(self):
+        thread = threading.Thread(target=rpp_daemon.serve, args=(self.path,), daemon=True)
+        thread.start()
+        for _ in range(200):
+            if os.path.exists(self.path):
+                break
+            time.sleep(0.01)
+        self.assertEqual(rpp_daemon.request(self.path, {"cmd": "ping"}, timeout=5)["status"], "ok")
+        self.assertTrue(rpp_daemon.request(self.path, {"cmd": "shutdown"}, timeout=5)["shutdown"])
+        thread.join(10)
+        self.assertFalse(os.path.exists(self.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
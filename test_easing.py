@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+import unittest
+import importlib.util
+
+import rpp_core
+
+PROJECT = """<REAPER_PROJECT 0.1 "7.0" 0
+  <TRACK
+    <ITEM
+      POSITION 0
+      LENGTH 4
+    >
+  >
+>
+"""
+
+CURVES = [(0.42, 0.0, 0.58, 1.0), (0.25, 0.1, 0.25, 1.0), (0.0, 1.0, 1.0, 0.0), (1.0, 0.0, 0.0, 1.0),
+          (0.5, -0.5, 0.5, 1.5), (0.0, 0.0, 1.0, 1.0)]
+
+
+@unittest.skipUnless(importlib.util.find_spec("numpy"), "numpy is not installed")
+class BezierEaseTest(unittest.TestCase):
+    """イージングの3次ベジェの値と、焼き込む中間点の数の確認"""
+
+    def test_endpoints(self):
+        for curve in CURVES:
+            self.assertEqual(rpp_core.bezier_ease(curve, [0.0, 1.0]).tolist(), [0.0, 1.0])
+
+    def test_monotonic(self):
+        import numpy as np
+
+        x = np.linspace(0.0, 1.0, 1001)
+        for curve in CURVES[:4]:
+            # 制御点のYが0〜1の範囲なら、進み具合は戻らない
+            self.assertTrue((np.diff(rpp_core.bezier_ease(curve, x)) >= -1e-12).all(), curve)
+
+    def test_reference_values(self):
+        # ease-in-out は中央で対称。ease(0.25,0.1,0.25,1) の x=0.5 は二分法で解いた値
+        y = rpp_core.bezier_ease(CURVES[0], [0.25, 0.5, 0.75]).tolist()
+        self.assertAlmostEqual(y[1], 0.5, places=9)
+        self.assertAlmostEqual(y[0] + y[2], 1.0, places=9)
+        self.assertAlmostEqual(rpp_core.bezier_ease(CURVES[1], [0.5]).tolist()[0], 0.8024033876, places=8)
+        # 直線の制御点なら x と同じ値
+        self.assertAlmostEqual(rpp_core.bezier_ease(CURVES[5], [0.3]).tolist()[0], 0.3, places=9)
+
+    def test_key_limit(self):
+        self.assertEqual(len(rpp_core._easing_keys(CURVES[0], 239)[0]), rpp_core.BAKE_MAX_KEYS)
+        self.assertEqual(rpp_core._easing_keys(CURVES[0], 239, 0)[0], tuple(range(240)))
+        self.assertEqual(rpp_core._easing_keys(CURVES[0], 10, 0)[0], tuple(range(11)))
+
+
+@unittest.skipUnless(importlib.util.find_spec("numpy"), "numpy is not installed")
+class BakeMaxKeysTest(unittest.TestCase):
+    """焼き込みの中間点の上限(bake_max_keys)の設定の確認"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "project.rpp")
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(PROJECT)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def keys(self, **settings):
+        settings = dict(settings, input=self.path, time_control=True, apply_easing=True, bake_easing=True)
+        frames = [line for line in rpp_core.render(settings).splitlines() if line.startswith("frame=")]
+        # 1つ目が元のオブジェクト、2つ目が時間制御
+        return len(frames[1].split(","))
+
+    def test_default_limit(self):
+        self.assertEqual(self.keys(), rpp_core.BAKE_MAX_KEYS)
+
+    def test_per_frame(self):
+        # 4秒 × 60fps = 240フレーム。間引かずに1フレームごとに置く
+        self.assertEqual(self.keys(bake_max_keys=0), 240)
+        self.assertEqual(self.keys(bake_max_keys=100), 100)
+
+    def test_invalid(self):
+        for value in (-1, 1, "x"):
+            with self.assertRaises(rpp_core.ConvertError):
+                rpp_core.normalize_settings({"input": self.path, "bake_max_keys": value})
+
+    def test_cli_option(self):
+        args = rpp_core.build_arg_parser().parse_args([self.path, "-o", "out.object", "--bake-max-keys", "0"])
+        self.assertEqual(rpp_core.normalize_settings(rpp_core.settings_from_args(args)).bake_max_keys, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,18 @@
+import os
+import json
+import unittest
+
+import rpp_core
+
+
+class LanguageBundleTest(unittest.TestCase):
+    """コミットされた language/bundle.json が言語ファイルと一致していることの確認"""
+
+    def test_bundle_in_sync(self):
+        with open(os.path.join(rpp_core.LANG_DIR, rpp_core.LANG_BUNDLE), encoding="utf-8") as f:
+            bundle = json.load(f)
+        self.assertEqual(bundle, rpp_core.build_language_bundle(), "run python build_language.py")
+
+
+if __name__ == "__main__":
+    unittest.main()
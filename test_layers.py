@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+import unittest
+import importlib.util
+
+import rpp_core
+from test_incremental import write_project
+
+# 1・3トラック目に重なるアイテムがある(長さはどれも0.4秒)
+ITEMS = [(1, 0.0, "A"), (1, 0.2, "B"), (1, 1.0, "C"), (2, 0.0, "D"), (3, 0.1, "E"), (3, 0.3, "F")]
+
+
+@unittest.skipUnless(importlib.util.find_spec("numpy"), "numpy is not installed")
+class PackLayersTest(unittest.TestCase):
+    """重なるオブジェクトをサブレイヤーに分ける処理と、トラック毎のレイヤーの帯の確認"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "project.rpp")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def array(self, values):
+        import numpy as np
+
+        return np.array(values, dtype=np.int64)
+
+    def layers(self, items, **settings):
+        write_project(self.path, items)
+        text = rpp_core.render(dict(settings, input=self.path))
+        return [int(line[6:]) for line in text.splitlines() if line.startswith("layer=")]
+
+    def test_overlaps_get_distinct_sub_layers(self):
+        track = self.array([1, 1, 1, 1, 2])
+        start = self.array([0, 5, 8, 20, 0])
+        end = self.array([10, 15, 9, 30, 5])
+        # 3つ目は1つ目・2つ目の両方と重なり、4つ目は全部が終わってから始まるので一番下に戻る
+        self.assertEqual(rpp_core._pack_layers(track, start, end).tolist(), [0, 1, 2, 0, 0])
+
+    def test_end_frame_is_inclusive(self):
+        track = self.array([1, 1, 1])
+        start = self.array([0, 10, 21])
+        end = self.array([10, 20, 30])
+        # 終了フレームと次の開始フレームが同じなら重なりとして扱う
+        self.assertEqual(rpp_core._pack_layers(track, start, end).tolist(), [0, 1, 0])
+
+    def test_bands(self):
+        self.assertEqual(rpp_core._layer_bands(self.array([1, 1, 2, 3, 3]), self.array([0, 1, 0, 0, 1])).tolist(),
+                         [1, 2, 3, 4, 5])
+        # オブジェクトの無いトラック(2)も1段分空ける
+        self.assertEqual(rpp_core._layer_bands(self.array([1, 1, 3]), self.array([0, 1, 0])).tolist(), [1, 2, 4])
+
+    def test_render_bands(self):
+        self.assertEqual(sorted(self.layers(ITEMS, pack_layers=True)), [1, 1, 2, 3, 4, 5])
+
+    def test_render_bands_with_time_control(self):
+        # 時間制御があると帯は2倍の間隔になり、時間制御はそれぞれ1つ下のレイヤーに置く
+        layers = self.layers(ITEMS, pack_layers=True, time_control=True)
+        self.assertEqual(sorted(layers[0::2]), [2, 2, 4, 6, 8, 10])
+        self.assertEqual([main - tc for main, tc in zip(layers[0::2], layers[1::2])], [1] * 6)
+
+    def test_default_output_unchanged(self):
+        # 分けないときはこれまでどおり「レイヤー = トラック番号」
+        self.assertEqual(sorted(self.layers(ITEMS)), [1, 1, 1, 2, 3, 3])
+        # 重なりが無ければ、分けても分けなくても同じ出力になる
+        items = [item for item in ITEMS if item[2] not in ("B", "F")]
+        write_project(self.path, items)
+        self.assertEqual(rpp_core.render({"input": self.path, "pack_layers": True}),
+                         rpp_core.render({"input": self.path}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import unittest
+import importlib.util
+
+import rpp_core
+
+
+def varlen(value):
+    out = [value & 0x7F]
+    value >>= 7
+    while value:
+        out.append(0x80 | (value & 0x7F))
+        value >>= 7
+    return bytes(reversed(out))
+
+
+def track_chunk(events):
+    # events: (経過tick, イベントのバイト列) のリスト
+    data = b"".join(varlen(delta) + body for delta, body in events) + b"\x00\xff\x2f\x00"
+    return b"MTrk" + len(data).to_bytes(4, "big") + data
+
+
+def write_smf(path, tracks, division=480):
+    with open(path, "wb") as f:
+        f.write(b"MThd" + (6).to_bytes(4, "big") + (1).to_bytes(2, "big")
+                + len(tracks).to_bytes(2, "big") + division.to_bytes(2, "big"))
+        for events in tracks:
+            f.write(track_chunk(events))
+
+
+def tempo(bpm):
+    return b"\xff\x51\x03" + round(6e7 / bpm).to_bytes(3, "big")
+
+
+def track_name(raw):
+    return b"\xff\x03" + varlen(len(raw)) + raw
+
+
+# 1トラック目にテンポ変化(120 → 80 → 150)、2・3トラック目にノート
+TEMPO_TRACK = [(0, tempo(120)), (960, tempo(80)), (720, tempo(150))]
+PIANO = [(0, track_name(b"Piano")), (0, b"\x90\x3c\x64"), (480, b"\x80\x3c\x00"),
+         (240, b"\x90\x3e\x64"), (720, b"\x80\x3e\x00"), (0, b"\x90\x40\x64"), (1000, b"\x80\x40\x00")]
+BASS = [(0, track_name("ベース".encode("cp932"))), (0, b"\xc1\x21"), (100, b"\x91\x24\x64"),
+        (1800, b"\x91\x24\x00"), (300, b"\x91\x26\x64"), (333, b"\x81\x26\x00")]
+
+
+@unittest.skipUnless(importlib.util.find_spec("numpy"), "numpy is not installed")
+class MidiFileTest(unittest.TestCase):
+    """.mid を独自リーダーで読んだ結果の確認"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "song.mid")
+        write_smf(self.path, [TEMPO_TRACK, PIANO, BASS])
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_cp932_track_name(self):
+        _, names = rpp_core._parse_midi_native(self.path)
+        self.assertEqual(names, ["Piano", "ベース"])
+
+    def test_tempo_changes(self):
+        items, _ = rpp_core._parse_midi_native(self.path)
+        pos, length = rpp_core.sort_items(items)[:2]
+        # 960 tick までは 120BPM(1tick = 1/960秒)、1680 tick までは 80BPM(1/640秒)、以降は 150BPM(1/1200秒)
+        want_pos = [0.0, 720 / 960, 1.0 + 480 / 640, 100 / 960, 2.125 + 520 / 1200]
+        want_end = [0.5, 1.0 + 480 / 640, 2.125 + 760 / 1200, 2.125 + 220 / 1200, 2.125 + 853 / 1200]
+        for got, want in zip(pos.tolist(), want_pos):
+            self.assertAlmostEqual(got, want)
+        for got, start, end in zip(length.tolist(), want_pos, want_end):
+            self.assertAlmostEqual(got, end - start)
+
+    @unittest.skipUnless(importlib.util.find_spec("pretty_midi"), "pretty_midi is not installed")
+    def test_same_as_pretty_midi(self):
+        native, native_names = rpp_core._parse_midi_native(self.path)
+        pretty, pretty_names = rpp_core._parse_midi_pretty(self.path)
+        # pretty_midi(mido)はトラック名をlatin1で読むので、名前は英字のトラックだけ比べる
+        self.assertEqual(native_names[0], pretty_names[0])
+        self.assertEqual(sorted(native.ids), sorted(pretty.ids))
+        for a, b in zip(rpp_core.sort_items(native)[:3], rpp_core.sort_items(pretty)[:3]):
+            for x, y in zip(a.tolist(), b.tolist()):
+                self.assertAlmostEqual(x, y, places=9)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from rpp_core import OutputWriter
+
+
+class OutputWriterTest(unittest.TestCase):
+    """出力ファイルを内容が変わったときだけ置き換え、一時ファイルを残さないことの確認"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "out.object")
+        with open(self.path, "wb") as f:
+            f.write(b"abc")
+        os.chmod(self.path, 0o640)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def read(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def test_unchanged(self):
+        with OutputWriter(self.path) as f:
+            f.write(b"abc")
+        self.assertFalse(f.changed)
+        self.assertEqual(os.listdir(self.dir), ["out.object"])
+
+    def test_replace(self):
+        with OutputWriter(self.path) as f:
+            f.write(b"ab")
+            f.write(b"d")
+        self.assertTrue(f.changed)
+        self.assertEqual(self.read(), b"abd")
+        self.assertEqual(os.listdir(self.dir), ["out.object"])
+        if os.name == "posix":
+            self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o640)
+
+    @unittest.skipUnless(os.name == "posix", "file modes are POSIX only")
+    def test_new_file_mode(self):
+        # 新しく作るファイルは、通常の open と同じ権限(0o666 から umask を引いたもの)になる
+        path = os.path.join(self.dir, "new.object")
+        with open(os.path.join(self.dir, "ref"), "wb"):
+            pass
+        with OutputWriter(path) as f:
+            f.write(b"abc")
+        self.assertEqual(os.stat(path).st_mode & 0o777, os.stat(os.path.join(self.dir, "ref")).st_mode & 0o777)
+
+    def test_failure_keeps_original(self):
+        with self.assertRaises(RuntimeError):
+            with OutputWriter(self.path) as f:
+                f.write(b"xyz")
+                raise RuntimeError
+        self.assertEqual(self.read(), b"abc")
+        self.assertEqual(os.listdir(self.dir), ["out.object"])
+
+    def test_concurrent_writers(self):
+        # 同じ出力先への書き込みが重なっても、一時ファイルは別々なので後に置き換えた方の内容になる
+        first = OutputWriter(self.path)
+        second = OutputWriter(self.path)
+        first.write(b"first")
+        second.write(b"second")
+        first.commit()
+        second.commit()
+        self.assertEqual(self.read(), b"second")
+        self.assertEqual(os.listdir(self.dir), ["out.object"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import os
+import shutil
+import tempfile
+import unittest
+import importlib.util
+
+from rpp_cache import ParseCache
+from rpp_items import ItemTable
+
+
+@unittest.skipUnless(importlib.util.find_spec("numpy"), "numpy is not installed")
+class ParseCacheTest(unittest.TestCase):
+    """解析キャッシュの記録と、元ファイルが変わったときに使われないことの確認"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "project.rpp")
+        self.write("<REAPER_PROJECT\n>\n")
+        self.cache = ParseCache(os.path.join(self.dir, "cache"))
+        self.items = ItemTable([0.0, 1.0], [1.0, 2.0], [1, 1], ["a", "b"])
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def write(self, text):
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def test_round_trip(self):
+        self.cache.put(self.path, "rpp", self.items, ["Track 1"], ParseCache.stamp(self.path))
+        items, names = self.cache.get(self.path, "rpp")
+        self.assertEqual(names, ["Track 1"])
+        self.assertEqual(items.columns()[0].tolist(), [0.0, 1.0])
+
+    def test_saved_while_parsing(self):
+        # 解析の途中で保存されたら、解析結果は保存前の内容として記録され、次回は使われない
+        stamp = ParseCache.stamp(self.path)
+        self.write("<REAPER_PROJECT\n  <TRACK\n  >\n>\n")
+        self.cache.put(self.path, "rpp", self.items, ["Track 1"], stamp)
+        self.assertIsNone(self.cache.get(self.path, "rpp"))
+
+
+if __name__ == "__main__":
+    unittest.main()
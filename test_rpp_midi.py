@@ -0,0 +1,142 @@
+import os
+import shutil
+import tempfile
+import unittest
+import importlib.util
+
+import rpp_core
+
+# REAPER が書き出す形の <SOURCE MIDI。EVTFILTER など E で始まるイベント以外の行も含める
+PROJECT = """<REAPER_PROJECT 0.1 "7.0" 1700000000
+  TEMPO 120 4 4
+  <TRACK {00000000-0000-0000-0000-000000000001}
+    NAME "Piano"
+    <ITEM
+      POSITION 2
+      LENGTH 4
+      LOOP 0
+      IGUID {00000000-0000-0000-0000-0000000000A1}
+      <SOURCE MIDI
+        HASDATA 1 960 QN
+        CCINTERP 32
+        POOLEDEVTS {00000000-0000-0000-0000-0000000000B1}
+        E 0 90 3c 60
+        E 0 90 40 60
+        e 0 90 3c 60
+        E 960 80 3c 00
+        E 0 80 40 00
+        e 0 80 3c 00
+        Em 0 90 43 60
+        E 960 80 43 00
+        E 1920 b0 7b 00
+        CCINTERP 32
+        CHASE_CC_TAKEOFFS 1
+        GUID {00000000-0000-0000-0000-0000000000C1}
+        IGNTEMPO 0 120 4 0
+        SRCCOLOR 0
+        VELLANE -1 100 0
+        CFGEDITVIEW 0 0.1 60 12 0 0 0 0 0 0.5
+        KEYSNAP 0
+        TRACKSEL 0
+        EVTFILTER 0 -1 -1 -1 -1 0 0 0 0 -1 -1 -1 -1 0 -1 0 -1 -1
+      >
+    >
+  >
+  <TRACK {00000000-0000-0000-0000-000000000002}
+    NAME "Audio"
+    <ITEM
+      POSITION 0
+      LENGTH 1
+      <SOURCE WAVE
+        FILE "a.wav"
+        <X
+        >
+      >
+    >
+    <ITEM
+      POSITION 0
+      LENGTH 1
+      <SOURCE WAVE
+        FILE "a.wav"
+      >
+    >
+  >
+>
+"""
+
+# ノートの間にシステムエクスクルーシブ(<X ブロック)とテキストイベント(X 行)がある
+SYSEX_PROJECT = """<REAPER_PROJECT 0.1 "7.0" 1700000000
+  TEMPO 120 4 4
+  <TRACK
+    <ITEM
+      POSITION 0
+      LENGTH 8
+      <SOURCE MIDI
+        HASDATA 1 960 QN
+        E 0 90 3c 60
+        E 480 80 3c 00
+        <X 480 0
+          8AAAAAAAAAAA9w==
+        >
+        E 960 90 3e 60
+        E 480 80 3e 00
+        X 480 0 ff 01 04 74 65 78 74
+        E 960 90 40 60
+        E 480 80 40 00
+      >
+    >
+  >
+>
+"""
+
+
+@unittest.skipUnless(importlib.util.find_spec("numpy"), "numpy is not installed")
+class RppMidiNotesTest(unittest.TestCase):
+    """RPP内の <SOURCE MIDI をノート単位のアイテムに分ける処理の確認"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "project.rpp")
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(PROJECT)
+        self.cfg = rpp_core.normalize_settings({"input": self.path, "midi_notes": True})
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_notes_ignore_non_event_lines(self):
+        items, names = rpp_core.load_rpp(self.path, midi_notes=True)
+        self.assertEqual(names, ["Piano", "Audio"])
+        pos, length, track, _, note = rpp_core.sort_items(items)
+        # E/e/Em の行から3音 + 同じ開始・長さの重複ノート1つ、2トラック目は音声アイテム2つ
+        self.assertEqual(track.tolist(), [1, 1, 1, 1, 2, 2])
+        self.assertEqual(note.tolist(), [True, True, True, True, False, False])
+        self.assertEqual(pos.tolist()[:4], [2.0, 2.0, 2.0, 2.5])
+        self.assertEqual(length.tolist()[:4], [0.5, 0.5, 0.5, 0.5])
+
+    def test_notes_dedup_like_midi_file(self):
+        items, _ = rpp_core.load_rpp(self.path, midi_notes=True)
+        frames = rpp_core.compute_frames(items, self.cfg, False)
+        # ノートの行は .mid と同じく同じ開始・長さを1つにまとめ、音声アイテムはそのまま残す
+        self.assertEqual(frames["track"].tolist(), [1, 1, 2, 2])
+        notes = rpp_core.compute_frames(items.select_tracks({1}), self.cfg, False)
+        as_midi = rpp_core.compute_frames(items.select_tracks({1}), self.cfg, True)
+        for key in ("track", "start", "end", "count"):
+            self.assertEqual(notes[key].tolist(), as_midi[key].tolist())
+
+    def test_non_note_events_advance_ticks(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(SYSEX_PROJECT)
+        items, _ = rpp_core.load_rpp(self.path, midi_notes=True)
+        pos, length = rpp_core.sort_items(items)[:2]
+        # 960 tick = 0.5秒。<X と X の経過tickも足して 0 / 1.0 / 2.0 秒
+        self.assertEqual(pos.tolist(), [0.0, 1.0, 2.0])
+        self.assertEqual(length.tolist(), [0.25, 0.25, 0.25])
+
+    def test_without_midi_notes(self):
+        items, _ = rpp_core.load_rpp(self.path)
+        self.assertEqual(rpp_core.sort_items(items)[0].tolist(), [2.0, 0.0, 0.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
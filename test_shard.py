@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+import unittest
+import importlib.util
+
+import rpp_core
+from rpp_cache import ParseCache
+from test_incremental import write_project
+
+
+@unittest.skipUnless(importlib.util.find_spec("numpy"), "numpy is not installed")
+class ShardOutputTest(unittest.TestCase):
+    """分割出力のファイル分けと、不要になった分割ファイルの削除の確認"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.input = os.path.join(self.dir, "project.rpp")
+        self.output = os.path.join(self.dir, "out.object")
+        self.cache = ParseCache(os.path.join(self.dir, "cache"))
+        self.items = [(1 + n % 3, n * 0.5, f"G{n}") for n in range(30)]
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def convert(self, items, cache=True, **settings):
+        write_project(self.input, items)
+        st = os.stat(self.input)
+        os.utime(self.input, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+        settings = dict(settings, input=self.input, output=self.output)
+        return rpp_core.convert(settings, cache=self.cache if cache else None)
+
+    def shard(self, n):
+        return os.path.join(self.dir, f"out_{n:03}.object")
+
+    def layers(self, path):
+        counts = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("layer="):
+                    counts[line.strip()] = counts.get(line.strip(), 0) + 1
+        return counts
+
+    def test_shard_tracks(self):
+        whole = self.convert(self.items)
+        result = self.convert(self.items, shard_tracks=2)
+        self.assertEqual(result["shards"], [self.shard(1), self.shard(2)])
+        self.assertEqual(result["objects"], whole["objects"])
+        # 1・2トラック目が1つ目、3トラック目が2つ目のファイルに入る
+        self.assertEqual(self.layers(self.shard(1)), {"layer=1": 10, "layer=2": 10})
+        self.assertEqual(self.layers(self.shard(2)), {"layer=3": 10})
+
+    def test_shard_minutes(self):
+        items = [(1, n * 20.0, f"G{n}") for n in range(9)]
+        result = self.convert(items, shard_minutes=1)
+        # 0〜40秒、60〜100秒、120〜160秒の3つに分かれる
+        self.assertEqual(result["shards"], [self.shard(1), self.shard(2), self.shard(3)])
+        self.assertEqual(result["objects"], 9)
+
+    def test_remove_stale_shards(self):
+        self.convert(self.items, shard_tracks=1)
+        # 記録に無いだけで名前が似ているファイルは消さない
+        other = self.shard(99)
+        with open(other, "w", encoding="utf-8") as f:
+            f.write("keep")
+        result = self.convert([item for item in self.items if item[0] != 3], shard_tracks=1)
+        self.assertEqual(result["shards"], [self.shard(1), self.shard(2)])
+        self.assertFalse(os.path.exists(self.shard(3)))
+        self.assertTrue(os.path.exists(other))
+
+    def test_no_cache_keeps_files(self):
+        self.convert(self.items, shard_tracks=1)
+        self.convert([item for item in self.items if item[0] != 3], cache=False, shard_tracks=1)
+        # キャッシュを使わないときは前回の記録が読めないので、何も消さない
+        self.assertTrue(os.path.exists(self.shard(3)))
+
+
+if __name__ == "__main__":
+    unittest.main()
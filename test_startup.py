@@ -0,0 +1,17 @@
+import unittest
+import importlib.util
+
+import benchmark
+
+
+@unittest.skipUnless(importlib.util.find_spec("PyQt6"), "PyQt6 is not installed")
+class StartupImportTest(unittest.TestCase):
+    """起動時に重いモジュール(benchmark.HEAVY_MODULES)を読み込まないことの確認。時間の予算は benchmark.py startup で見る"""
+
+    def test_no_heavy_modules(self):
+        result = benchmark.measure_startup(repeat=1)
+        self.assertEqual(result["heavy_at_startup"], [])
+
+
+if __name__ == "__main__":
+    unittest.main()